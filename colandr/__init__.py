@@ -46,6 +46,7 @@ from .api.resources.citation_screenings import ns as citation_screenings_ns
 from .api.resources.fulltexts import ns as fulltexts_ns
 from .api.resources.fulltext_uploads import ns as fulltext_uploads_ns
 from .api.resources.fulltext_screenings import ns as fulltext_screenings_ns
+from .api.resources.uploads import ns as uploads_ns
 from .api.resources.data_extractions import ns as data_extractions_ns
 
 
@@ -56,6 +57,8 @@ def create_app(config_name):
     config.init_app(app)
     os.makedirs(config.FULLTEXT_UPLOADS_DIR, exist_ok=True)
     os.makedirs(config.RANKING_MODELS_DIR, exist_ok=True)
+    os.makedirs(config.CITATION_IMPORT_UPLOADS_DIR, exist_ok=True)
+    os.makedirs(config.UPLOAD_SESSIONS_DIR, exist_ok=True)
 
     app.logger.addHandler(
         get_rotating_file_handler(os.path.join(config.LOGS_DIR, config.LOG_FILENAME)))
@@ -87,6 +90,7 @@ def create_app(config_name):
     api_.add_namespace(fulltexts_ns)
     api_.add_namespace(fulltext_uploads_ns)
     api_.add_namespace(fulltext_screenings_ns)
+    api_.add_namespace(uploads_ns)
     api_.add_namespace(data_extractions_ns)
 
     @app.route('/fulltexts/<int:id>/upload', methods=['GET'])
@@ -64,6 +64,12 @@ def validation_error(message):
     return response
 
 
+def conflict_error(message):
+    response = jsonify({'message': message})
+    response.status_code = 409
+    return response
+
+
 def db_integrity_error(message):
     response = jsonify({'message': message})
     response.status_code = 422
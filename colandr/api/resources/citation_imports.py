@@ -1,5 +1,8 @@
+import os
+
 from flask import g, current_app
 from flask_restplus import Resource
+from werkzeug.utils import secure_filename
 
 from marshmallow import fields as ma_fields
 from marshmallow import ValidationError
@@ -10,11 +13,13 @@ from sqlalchemy import create_engine
 
 from colandr import api_
 from ...lib import constants
-from ...lib.parsers import BibTexFile, RisFile
-from ...models import db, Citation, DataSource, Fulltext, Import, Review, Study
-from ...tasks import deduplicate_citations, get_citations_text_content_vectors
+from ...lib.imports import (close_citations_file, get_citations_file,
+                            import_citations, iter_citation_records)
+from ...models import db, DataSource, Import, Review
+from ...tasks import (deduplicate_citations, get_citations_text_content_vectors,
+                      process_citations_import)
 from ..errors import not_found_error, forbidden_error, validation_error
-from ..schemas import CitationSchema, DataSourceSchema, ImportSchema
+from ..schemas import DataSourceSchema, ImportSchema
 from ..authentication import auth
 
 
@@ -62,7 +67,7 @@ class CitationsImportsResource(Resource):
     @ns.doc(
         params={
             'uploaded_file': {'in': 'formData', 'type': 'file', 'required': True,
-                              'description': 'file containing one or many citations in a standard format (.ris or .bib)'},
+                              'description': 'file containing one or many citations in a standard format (.ris, .bib, or PubMed or EndNote .xml), optionally compressed (.gz, .bz2 or .xz) or archived with others (.zip)'},
             'review_id': {'in': 'query', 'type': 'integer', 'required': True,
                           'description': 'unique identifier for review for which citations will be imported'},
             'source_type': {'in': 'query', 'type': 'string',
@@ -75,11 +80,16 @@ class CitationsImportsResource(Resource):
             'status': {'in': 'query', 'type': 'string',
                        'enum': ['not_screened', 'included', 'excluded'],
                        'description': 'known screening status of citations, if anything'},
+            'skip_duplicates': {'in': 'query', 'type': 'boolean', 'default': False,
+                                'description': 'if True, citations that exactly duplicate one already in the review (same DOI, title, year, and first author) will be skipped'},
+            'background': {'in': 'query', 'type': 'boolean', 'default': False,
+                           'description': 'if True, citations will be imported by a background job, whose progress may be polled via its import id'},
             'test': {'in': 'query', 'type': 'boolean', 'default': False,
                      'description': 'if True, request will be validated but no data will be affected'},
             },
         responses={
             200: 'successfully imported citations in bulk',
+            202: 'successfully started background job to import citations in bulk',
             403: 'current app user forbidden to import citations for this review',
             404: 'no review with matching id was found'
             }
@@ -97,10 +107,13 @@ class CitationsImportsResource(Resource):
             missing=None, validate=[URL(relative=False), Length(max=500)]),
         'status': ma_fields.Str(
             missing=None, validate=OneOf(['not_screened', 'included', 'excluded'])),
+        'skip_duplicates': ma_fields.Boolean(missing=False),
+        'background': ma_fields.Boolean(missing=False),
         'test': ma_fields.Boolean(missing=False)
         })
     def post(self, uploaded_file, review_id,
-             source_type, source_name, source_url, status, test):
+             source_type, source_name, source_url, status, skip_duplicates,
+             background, test):
         """import citations in bulk for a review"""
         review = db.session.query(Review).get(review_id)
         if not review:
@@ -109,12 +122,10 @@ class CitationsImportsResource(Resource):
             return forbidden_error(
                 '{} forbidden to add citations to this review'.format(g.current_user))
         fname = uploaded_file.filename
-        if fname.endswith('.bib'):
-            citations_file = BibTexFile(uploaded_file.stream)
-        elif fname.endswith('.ris') or fname.endswith('.txt'):
-            citations_file = RisFile(uploaded_file.stream)
-        else:
-            return validation_error('unknown file type: "{}"'.format(fname))
+        try:
+            citations_file = get_citations_file(fname, uploaded_file.stream)
+        except ValueError as e:
+            return validation_error(str(e))
 
         # upsert the data source
         try:
@@ -124,11 +135,7 @@ class CitationsImportsResource(Resource):
                  'source_url': source_url})
         except ValidationError as e:
             return validation_error(e.messages)
-        data_source = db.session.query(DataSource)\
-            .filter_by(source_type=source_type, source_name=source_name).one_or_none()
-        if data_source is None:
-            data_source = DataSource(source_type, source_name, source_url=source_url)
-            db.session.add(data_source)
+        data_source = upsert_data_source(source_type, source_name, source_url)
         if test is False:
             db.session.commit()
             current_app.logger.info('inserted %s', data_source)
@@ -136,82 +143,166 @@ class CitationsImportsResource(Resource):
         else:
             data_source_id = 0
 
-        # TODO: make this an async task?
-        engine = create_engine(current_app.config['SQLALCHEMY_DATABASE_URI'])
-        # parse and iterate over imported citations
-        # create lists of study and citation dicts to insert
-        citation_schema = CitationSchema()
-        citations_to_insert = []
-        # rather than doing it in a for loop, we've switched to a while loop
-        # so that parsing errors on individual citations can be caught and logged
-        # for record in citations_file.parse():
-        #     record['review_id'] = review_id
-        #     citations_to_insert.append(citation_schema.load(record).data)
-        records = citations_file.parse()
-        while True:
-            try:
-                record = next(records)
-                record['review_id'] = review_id
-                citations_to_insert.append(citation_schema.load(record).data)
-            except StopIteration:
-                break
-            except Exception as e:
-                current_app.logger.warning('parsing error: %s', e)
-        n_citations = len(citations_to_insert)
-
         user_id = g.current_user.id
-        if status is None:
-            studies_to_insert = [
-                {'user_id': user_id,
-                 'review_id': review_id,
-                 'data_source_id': data_source_id}
-                for i in range(n_citations)]
-        else:
-            studies_to_insert = [
-                {'user_id': user_id,
-                 'review_id': review_id,
-                 'data_source_id': data_source_id,
-                 'citation_status': status}
-                for i in range(n_citations)]
+
+        # persist the uploaded file to disk, and hand it off to a background job
+        # that parses and inserts citations and reports its progress as it goes
+        if background is True and test is False:
+            # the file is only checked here; it's parsed later, by the import job
+            close_citations_file(citations_file)
+            # reading a compressed file's or zip archive's contents moved the stream's position
+            uploaded_file.stream.seek(0)
+            citations_import = start_citations_import(
+                review, user_id, data_source_id, fname, uploaded_file.save,
+                status=status, skip_duplicates=skip_duplicates)
+            return ImportSchema().dump(citations_import).data, 202
+
+        # parse and validate imported citations lazily, one at a time,
+        # collecting per-record errors rather than failing on the first one
+        errors = []
+        records = iter_citation_records(
+            citations_file, review_id, errors=errors,
+            n_jobs=current_app.config['CITATION_IMPORT_N_JOBS'],
+            shard_size=current_app.config['CITATION_IMPORT_SHARD_SIZE'])
 
         if test is True:
+            for _ in records:  # still parse and validate, just don't insert
+                pass
             db.session.rollback()
-            return
-
-        # insert studies, and get their primary keys _back_
-        stmt = db.insert(Study).values(studies_to_insert).returning(Study.id)
-        with engine.connect() as conn:
-            study_ids = [result[0] for result in conn.execute(stmt)]
-
-        # add study ids to citations as their primary keys
-        # then bulk insert as mappings
-        # this method is required because not all citations have all fields
-        for study_id, citation in zip(study_ids, citations_to_insert):
-            citation['id'] = study_id
-        db.session.bulk_insert_mappings(Citation, citations_to_insert)
-
-        # if citations' status is "included", we have to bulk insert
-        # the corresponding fulltexts, since bulk operations won't trigger
-        # the fancy events defined in models.py
-        if status == 'included':
-            with engine.connect() as conn:
-                conn.execute(
-                    Fulltext.__table__.insert(),
-                    [{'id': study_id, 'review_id': review_id}
-                     for study_id in study_ids]
-                    )
-
-        # don't forget about a record of the import
+            return {'num_errors': len(errors),
+                    'errors': errors[:constants.MAX_IMPORT_ERRORS_STORED]}
+
+        # insert studies and citations in fixed-size chunks, so that memory use
+        # stays flat regardless of the number of records in the uploaded file
+        engine = create_engine(current_app.config['SQLALCHEMY_DATABASE_URI'])
+        with engine.begin() as conn:
+            n_citations = import_citations(
+                conn, records, user_id, review_id, data_source_id,
+                status=status,
+                chunk_size=current_app.config['CITATION_IMPORT_CHUNK_SIZE'],
+                loader=current_app.config['CITATION_IMPORT_LOADER'],
+                skip_duplicates=skip_duplicates)
+
+        # don't forget about a record of the import, including any records skipped
         citations_import = Import(
             review_id, user_id, data_source_id, 'citation', n_citations,
             status=status)
+        citations_import.num_records_inserted = n_citations
+        citations_import.num_errors = len(errors)
+        citations_import.errors = errors[:constants.MAX_IMPORT_ERRORS_STORED]
         db.session.add(citations_import)
         db.session.commit()
         current_app.logger.info(
-            'imported %s citations from file "%s" into %s',
-            n_citations, fname, review)
+            'imported %s citations (%s errors) from file "%s" into %s',
+            n_citations, len(errors), fname, review)
 
         # lastly, don't forget to deduplicate the citations and get their word2vecs
         deduplicate_citations.apply_async(args=[review_id], countdown=60)
         get_citations_text_content_vectors.apply_async(
             args=[review_id], countdown=60)
+
+        return ImportSchema().dump(citations_import).data
+
+
+@ns.route('/<int:id>')
+@ns.doc(
+    summary='get the status of a single citation import',
+    produces=['application/json'],
+    )
+class CitationsImportResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        responses={
+            200: 'successfully got citation import status',
+            403: 'current app user forbidden to get citation import status',
+            404: 'no citation import with matching id was found',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        })
+    def get(self, id):
+        """get status of a citation import, including background job progress"""
+        citations_import = db.session.query(Import).get(id)
+        if not citations_import or citations_import.record_type != 'citation':
+            return not_found_error('<Import(id={})> not found'.format(id))
+        if (g.current_user.is_admin is False and
+                g.current_user.reviews.filter_by(id=citations_import.review_id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to get this review\'s citation imports'.format(g.current_user))
+        return ImportSchema().dump(citations_import).data
+
+
+def upsert_data_source(source_type, source_name, source_url):
+    """
+    Get the data source matching ``source_type`` and ``source_name``,
+    adding it to the db session if it doesn't exist yet.
+
+    Returns:
+        :class:`DataSource`
+    """
+    data_source = db.session.query(DataSource)\
+        .filter_by(source_type=source_type, source_name=source_name).one_or_none()
+    if data_source is None:
+        data_source = DataSource(source_type, source_name, source_url=source_url)
+        db.session.add(data_source)
+    return data_source
+
+
+def start_citations_import(review, user_id, data_source_id, fname, save_file,
+                           status=None, skip_duplicates=False):
+    """
+    Persist a citations file to disk, and hand it off to a background job
+    that parses and inserts citations and reports its progress as it goes.
+
+    Args:
+        review (:class:`Review`)
+        user_id (int)
+        data_source_id (int)
+        fname (str): name of the citations file, as uploaded by the user
+        save_file (callable): function that saves the citations file
+            to the path on disk given as its only argument
+        status (str): known screening status of citations, if any
+        skip_duplicates (bool)
+
+    Returns:
+        :class:`Import`
+
+    Raises:
+        Exception: if the file couldn't be saved or the job couldn't be started,
+            in which case the import is marked as failed, with the error
+    """
+    citations_import = Import(
+        review.id, user_id, data_source_id, 'citation', 0,
+        status=status, job_status='pending')
+    db.session.add(citations_import)
+    db.session.commit()
+    upload_dir = os.path.join(
+        current_app.config['CITATION_IMPORT_UPLOADS_DIR'], str(review.id))
+    filepath = os.path.join(
+        upload_dir,
+        '{}_{}'.format(citations_import.id, secure_filename(fname)))
+    # don't leave a pending import behind that no job will ever pick up
+    try:
+        os.makedirs(upload_dir, exist_ok=True)
+        save_file(filepath)
+        process_citations_import.apply_async(
+            args=[citations_import.id, filepath, skip_duplicates])
+    except Exception as e:
+        current_app.logger.exception(
+            'unable to start background import of citations from file "%s"', fname)
+        citations_import.job_status = 'failed'
+        citations_import.num_errors = 1
+        citations_import.errors = [str(e)]
+        db.session.commit()
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+        raise
+    current_app.logger.info(
+        'started background import of citations from file "%s" into %s',
+        fname, review)
+    return citations_import
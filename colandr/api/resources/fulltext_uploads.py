@@ -83,26 +83,7 @@ class FulltextUploadResource(Resource):
         if test is False:
             # save file content to disk
             uploaded_file.save(filepath)
-            # extract content from disk, depending on type
-            if ext == '.txt':
-                with io.open(filepath, mode='rb') as f:
-                    text_content = f.read()
-            elif ext == '.pdf':
-                extract_text_script = os.path.join(
-                    current_app.config['COLANDR_APP_DIR'],
-                    'pdfestrian/bin/extractText.sh')
-                text_content = subprocess.check_output(
-                    [extract_text_script, '--filename', filepath],
-                    stderr=subprocess.STDOUT)
-            fulltext.text_content = fix_bad_unicode(
-                text_content.decode(errors='ignore'))
-            db.session.commit()
-            current_app.logger.info(
-                'uploaded "%s" for %s', fulltext.original_filename, fulltext)
-
-            # parse the fulltext text content and get its word2vec vector
-            get_fulltext_text_content_vector.apply_async(
-                args=[fulltext.review_id, id], countdown=5)
+            process_fulltext_upload(fulltext, filepath)
 
         return FulltextSchema().dump(fulltext).data
 
@@ -155,3 +136,40 @@ class FulltextUploadResource(Resource):
             return '', 204
         else:
             return '', 200
+
+
+def process_fulltext_upload(fulltext, filepath):
+    """
+    Extract text content from a fulltext's uploaded file, already saved to disk
+    at ``filepath``, then start a background job to get its word2vec vector.
+
+    Args:
+        fulltext (:class:`Fulltext`)
+        filepath (str)
+
+    Raises:
+        ValueError: if the file's type isn't one of ``ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS``
+    """
+    _, ext = os.path.splitext(filepath)
+    # extract content from disk, depending on type
+    if ext == '.txt':
+        with io.open(filepath, mode='rb') as f:
+            text_content = f.read()
+    elif ext == '.pdf':
+        extract_text_script = os.path.join(
+            current_app.config['COLANDR_APP_DIR'],
+            'pdfestrian/bin/extractText.sh')
+        text_content = subprocess.check_output(
+            [extract_text_script, '--filename', filepath],
+            stderr=subprocess.STDOUT)
+    else:
+        raise ValueError('invalid fulltext upload file type: "{}"'.format(ext))
+    fulltext.text_content = fix_bad_unicode(
+        text_content.decode(errors='ignore'))
+    db.session.commit()
+    current_app.logger.info(
+        'uploaded "%s" for %s', fulltext.original_filename, fulltext)
+
+    # parse the fulltext text content and get its word2vec vector
+    get_fulltext_text_content_vector.apply_async(
+        args=[fulltext.review_id, fulltext.id], countdown=5)
@@ -1,3 +1,4 @@
+import collections
 from operator import itemgetter
 import os
 import random
@@ -363,13 +364,26 @@ class StudiesResource(Resource):
             filepath = os.path.join(
                 current_app.config['RANKING_MODELS_DIR'], str(review_id), fname)
             if os.path.isfile(filepath):
-                clf = joblib.load(filepath)
-                X = np.vstack(
-                    tuple(result.citation.text_content_vector_rep
-                          for result in results
-                          if result.citation.text_content_vector_rep)
-                    )
-                scores = clf.decision_function(X).tolist()
+                clfs = joblib.load(filepath)
+                # one model per vector space; models saved before that were english-only
+                if not isinstance(clfs, dict):
+                    clfs = {'en': clfs}
+                space_idxs = collections.defaultdict(list)
+                for idx, result in enumerate(results):
+                    citation = result.citation
+                    if (citation.text_content_vector_rep is not None and
+                            citation.text_content_vector_space in clfs):
+                        space_idxs[citation.text_content_vector_space].append(idx)
+                # citations with no model for their vector space get the lowest score
+                if space_idxs:
+                    scores = [float('-inf')] * len(results)
+                    for vector_space, idxs in space_idxs.items():
+                        X = np.vstack(
+                            tuple(results[idx].citation.text_content_vector_rep
+                                  for idx in idxs))
+                        space_scores = clfs[vector_space].decision_function(X)
+                        for idx, score in zip(idxs, space_scores):
+                            scores[idx] = float(score)
 
             # next best option: both positive and negative keyterms
             if not scores:
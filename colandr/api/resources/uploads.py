@@ -0,0 +1,484 @@
+import datetime
+import hashlib
+import io
+import os
+import shutil
+
+from flask import current_app, g, request
+from flask_restplus import Resource
+from werkzeug.utils import secure_filename
+
+from marshmallow import fields as ma_fields
+from marshmallow import ValidationError
+from marshmallow.validate import Length, OneOf, Range, URL
+from webargs.flaskparser import use_kwargs
+
+from colandr import api_
+from ...lib import constants
+from ...lib.imports import (check_citations_file_type, close_citations_file,
+                             get_citations_file)
+from ...models import db, Fulltext, Review, UploadSession
+from ..errors import conflict_error, forbidden_error, not_found_error, validation_error
+from ..schemas import DataSourceSchema, FulltextSchema, ImportSchema, UploadSessionSchema
+from ..authentication import auth
+from .citation_imports import start_citations_import, upsert_data_source
+from .fulltext_uploads import process_fulltext_upload
+
+
+ns = api_.namespace(
+    'uploads', path='/uploads',
+    description='upload large citation and fulltext files in resumable chunks')
+
+# number of bytes copied between request, disk, and checksum at a time
+BLOCK_SIZE = 1024 * 1024
+
+
+@ns.route('')
+@ns.doc(
+    summary='start a resumable, chunked file upload',
+    produces=['application/json'],
+    )
+class UploadSessionsResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        params={
+            'upload_type': {'in': 'query', 'type': 'string', 'required': True,
+                            'enum': ['citation_import', 'fulltext'],
+                            'description': 'whether the file contains citations to import into a review or the content of a single fulltext'},
+            'filename': {'in': 'query', 'type': 'string', 'required': True,
+                         'description': 'name of the file to be uploaded, whose extension determines how it will be processed'},
+            'total_size': {'in': 'query', 'type': 'integer', 'required': True,
+                           'description': 'total size of the file to be uploaded, in bytes'},
+            'checksum': {'in': 'query', 'type': 'string',
+                         'description': 'hex-encoded SHA-256 digest of the file to be uploaded, checked once all chunks are received'},
+            'review_id': {'in': 'query', 'type': 'integer',
+                          'description': 'unique identifier for review for which citations will be imported; required if `upload_type` is "citation_import"'},
+            'fulltext_id': {'in': 'query', 'type': 'integer',
+                            'description': 'unique identifier for fulltext whose content file will be uploaded; required if `upload_type` is "fulltext"'},
+            'source_type': {'in': 'query', 'type': 'string',
+                            'enum': ['database', 'gray literature'],
+                            'description': 'type of source through which citations were found'},
+            'source_name': {'in': 'query', 'type': 'string',
+                            'description': 'name of source through which citations were found'},
+            'source_url': {'in': 'query', 'type': 'string', 'format': 'url',
+                           'description': 'url of source through which citations were found'},
+            'status': {'in': 'query', 'type': 'string',
+                       'enum': ['not_screened', 'included', 'excluded'],
+                       'description': 'known screening status of citations, if anything'},
+            'skip_duplicates': {'in': 'query', 'type': 'boolean', 'default': False,
+                                'description': 'if True, citations that exactly duplicate one already in the review will be skipped'},
+            'test': {'in': 'query', 'type': 'boolean', 'default': False,
+                     'description': 'if True, request will be validated but no data will be affected'},
+            },
+        responses={
+            200: 'successfully started upload session',
+            403: 'current app user forbidden to upload files for this review',
+            404: 'no review or fulltext with matching id was found',
+            422: 'invalid upload file type or size',
+            }
+        )
+    @use_kwargs({
+        'upload_type': ma_fields.Str(
+            required=True, validate=OneOf(constants.UPLOAD_SESSION_TYPES)),
+        'filename': ma_fields.Str(
+            required=True, validate=Length(min=1, max=500)),
+        'total_size': ma_fields.Int(
+            required=True, validate=Range(min=1, max=constants.MAX_BIGINT)),
+        'checksum': ma_fields.Str(
+            missing=None, validate=Length(equal=64)),
+        'review_id': ma_fields.Int(
+            missing=None, validate=Range(min=1, max=constants.MAX_INT)),
+        'fulltext_id': ma_fields.Int(
+            missing=None, validate=Range(min=1, max=constants.MAX_BIGINT)),
+        'source_type': ma_fields.Str(
+            missing=None, validate=OneOf(['database', 'gray literature'])),
+        'source_name': ma_fields.Str(
+            missing=None, validate=Length(max=100)),
+        'source_url': ma_fields.Str(
+            missing=None, validate=[URL(relative=False), Length(max=500)]),
+        'status': ma_fields.Str(
+            missing=None, validate=OneOf(['not_screened', 'included', 'excluded'])),
+        'skip_duplicates': ma_fields.Boolean(missing=False),
+        'test': ma_fields.Boolean(missing=False)
+        })
+    def post(self, upload_type, filename, total_size, checksum, review_id, fulltext_id,
+             source_type, source_name, source_url, status, skip_duplicates, test):
+        """start a resumable upload of a large citations or fulltext file"""
+        if total_size > current_app.config['MAX_UPLOAD_SIZE']:
+            return validation_error(
+                'upload size of {} bytes exceeds the maximum of {} bytes'.format(
+                    total_size, current_app.config['MAX_UPLOAD_SIZE']))
+        if upload_type == 'fulltext':
+            if fulltext_id is None:
+                return validation_error('`fulltext_id` is required for fulltext uploads')
+            fulltext = db.session.query(Fulltext).get(fulltext_id)
+            if not fulltext:
+                return not_found_error('<Fulltext(id={})> not found'.format(fulltext_id))
+            if g.current_user.reviews.filter_by(id=fulltext.review_id).one_or_none() is None:
+                return forbidden_error(
+                    '{} forbidden to upload fulltext files to this review'.format(
+                        g.current_user))
+            _, ext = os.path.splitext(filename)
+            if ext not in current_app.config['ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS']:
+                return validation_error('invalid fulltext upload file type: "{}"'.format(ext))
+            review_id = fulltext.review_id
+            params = {}
+        else:
+            if review_id is None or source_type is None:
+                return validation_error(
+                    '`review_id` and `source_type` are required for citation imports')
+            review = db.session.query(Review).get(review_id)
+            if not review:
+                return not_found_error('<Review(id={})> not found'.format(review_id))
+            if g.current_user.reviews.filter_by(id=review_id).one_or_none() is None:
+                return forbidden_error(
+                    '{} forbidden to add citations to this review'.format(g.current_user))
+            try:
+                check_citations_file_type(filename)
+            except ValueError as e:
+                return validation_error(str(e))
+            try:
+                DataSourceSchema().validate(
+                    {'source_type': source_type,
+                     'source_name': source_name,
+                     'source_url': source_url})
+            except ValidationError as e:
+                return validation_error(e.messages)
+            data_source = upsert_data_source(source_type, source_name, source_url)
+            if test is False:
+                db.session.commit()
+            params = {'data_source_id': data_source.id,
+                      'status': status,
+                      'skip_duplicates': skip_duplicates}
+
+        upload_session = UploadSession(
+            g.current_user.id, review_id, upload_type, filename, total_size,
+            fulltext_id=fulltext_id, checksum=checksum.lower() if checksum else None,
+            params=params)
+        if test is False:
+            _remove_expired_upload_sessions()
+            db.session.add(upload_session)
+            db.session.commit()
+            current_app.logger.info(
+                'started %s for "%s" (%s bytes)', upload_session, filename, total_size)
+        else:
+            db.session.rollback()
+        return UploadSessionSchema().dump(upload_session).data
+
+
+@ns.route('/<int:id>')
+@ns.doc(
+    summary='get the status of, upload chunks to, or cancel a resumable file upload',
+    produces=['application/json'],
+    )
+class UploadSessionResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        responses={
+            200: 'successfully got upload session, including number of bytes received so far',
+            403: 'current app user forbidden to get this upload session',
+            404: 'no upload session with matching id was found',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        })
+    def get(self, id):
+        """get upload session status, e.g. to know where to resume an interrupted upload"""
+        upload_session, error = _get_upload_session(id)
+        if error is not None:
+            return error
+        return UploadSessionSchema().dump(upload_session).data
+
+    @ns.doc(
+        params={
+            'Content-Range': {'in': 'header', 'type': 'string', 'required': True,
+                              'description': 'byte range of the file in the request body, as "bytes {start}-{end}/{total_size}"; chunks must be uploaded in order, each starting where the last one ended'},
+            'test': {'in': 'query', 'type': 'boolean', 'default': False,
+                     'description': 'if True, request will be validated but no data will be affected'},
+            },
+        responses={
+            200: 'successfully received chunk',
+            403: 'current app user forbidden to upload to this upload session',
+            404: 'no upload session with matching id was found',
+            409: 'chunk does not start where the previously received chunk ended',
+            422: 'invalid or incomplete chunk',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        'test': ma_fields.Boolean(missing=False)
+        })
+    def put(self, id, test):
+        """upload the next chunk of a file, as raw bytes in the request body"""
+        upload_session, error = _get_upload_session(id, for_update=True)
+        if error is not None:
+            return error
+        if upload_session.status != 'pending':
+            return conflict_error('{} is already finished'.format(upload_session))
+        content_range = request.content_range
+        if content_range is None or content_range.units != 'bytes' or content_range.start is None:
+            return validation_error(
+                'a "Content-Range: bytes {start}-{end}/{total_size}" header is required')
+        if (content_range.length not in (None, upload_session.total_size) or
+                content_range.stop > upload_session.total_size):
+            return validation_error(
+                'Content-Range {} is outside of file size {}'.format(
+                    content_range, upload_session.total_size))
+        start, stop = content_range.start, content_range.stop
+        # the response to a previous request for this chunk may have been lost,
+        # in which case the client will retry it; it's already safely on disk
+        if stop <= upload_session.received_size:
+            return UploadSessionSchema().dump(upload_session).data
+        if start != upload_session.received_size:
+            return conflict_error(
+                'next chunk must start at byte {}, not byte {}'.format(
+                    upload_session.received_size, start))
+        if test is True:
+            db.session.rollback()
+            return UploadSessionSchema().dump(upload_session).data
+
+        filepath = _get_upload_filepath(upload_session)
+        with io.open(filepath, mode='r+b' if os.path.exists(filepath) else 'wb') as f:
+            # drop any bytes left over from an earlier, interrupted chunk
+            f.seek(start)
+            f.truncate()
+            n_bytes = _copy_stream(request.stream, f, stop - start)
+            if n_bytes != stop - start:
+                f.seek(start)
+                f.truncate()
+        if n_bytes != stop - start:
+            db.session.rollback()
+            return validation_error(
+                'chunk ended after {} of {} bytes; retry it from byte {}'.format(
+                    n_bytes, stop - start, start))
+        upload_session.received_size = stop
+        # the db doesn't update this on its own, and expiry is measured from it
+        upload_session.last_updated = datetime.datetime.utcnow()
+        db.session.commit()
+        current_app.logger.debug(
+            'received bytes %s-%s of %s for %s',
+            start, stop - 1, upload_session.total_size, upload_session)
+        return UploadSessionSchema().dump(upload_session).data
+
+    @ns.doc(
+        params={
+            'test': {'in': 'query', 'type': 'boolean', 'default': False,
+                     'description': 'if True, request will be validated but no data will be affected'},
+            },
+        responses={
+            200: 'request was valid, but upload session not deleted because `test=False`',
+            204: 'successfully cancelled upload session',
+            403: 'current app user forbidden to cancel this upload session',
+            404: 'no upload session with matching id was found',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        'test': ma_fields.Boolean(missing=False)
+        })
+    def delete(self, id, test):
+        """cancel an upload session, discarding whatever has been uploaded"""
+        upload_session, error = _get_upload_session(id)
+        if error is not None:
+            return error
+        if test is False:
+            _remove_upload_file(upload_session)
+            db.session.delete(upload_session)
+            db.session.commit()
+            current_app.logger.info('deleted %s', upload_session)
+            return '', 204
+        else:
+            return '', 200
+
+
+@ns.route('/<int:id>/finalize')
+@ns.doc(
+    summary='finish a resumable file upload and process the uploaded file',
+    produces=['application/json'],
+    )
+class UploadSessionFinalizeResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        params={
+            'test': {'in': 'query', 'type': 'boolean', 'default': False,
+                     'description': 'if True, request will be validated but no data will be affected'},
+            },
+        responses={
+            200: 'successfully uploaded fulltext file',
+            202: 'successfully started background job to import citations in bulk',
+            403: 'current app user forbidden to finalize this upload session',
+            404: 'no upload session with matching id was found',
+            409: 'upload session is already finished',
+            422: 'upload is incomplete, or its checksum does not match',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        'test': ma_fields.Boolean(missing=False)
+        })
+    def post(self, id, test):
+        """verify a fully-uploaded file, then import its citations or save its fulltext content"""
+        upload_session, error = _get_upload_session(id, for_update=True)
+        if error is not None:
+            return error
+        if upload_session.status != 'pending':
+            return conflict_error('{} is already finished'.format(upload_session))
+        if upload_session.received_size != upload_session.total_size:
+            return validation_error(
+                'upload is incomplete: received {} of {} bytes'.format(
+                    upload_session.received_size, upload_session.total_size))
+        filepath = _get_upload_filepath(upload_session)
+        if upload_session.checksum is not None:
+            checksum = _get_file_checksum(filepath)
+            if checksum != upload_session.checksum:
+                # the assembled file is corrupt, so it has to be uploaded again
+                if test is False:
+                    _remove_upload_file(upload_session)
+                    upload_session.received_size = 0
+                    upload_session.last_updated = datetime.datetime.utcnow()
+                    db.session.commit()
+                return validation_error(
+                    'SHA-256 checksum of uploaded file "{}" does not match expected "{}"; '
+                    'upload must be restarted'.format(checksum, upload_session.checksum))
+
+        if upload_session.upload_type == 'citation_import':
+            try:
+                citations_file = get_citations_file(upload_session.filename, filepath)
+            except ValueError as e:
+                return validation_error(str(e))
+            # the file is only checked here; it's parsed later, by the import job
+            close_citations_file(citations_file)
+            if test is True:
+                db.session.rollback()
+                return UploadSessionSchema().dump(upload_session).data
+            review = db.session.query(Review).get(upload_session.review_id)
+            params = upload_session.params
+            citations_import = start_citations_import(
+                review, upload_session.user_id, params['data_source_id'],
+                upload_session.filename, lambda path: shutil.move(filepath, path),
+                status=params.get('status'),
+                skip_duplicates=params.get('skip_duplicates', False))
+            upload_session.import_id = citations_import.id
+            upload_session.status = 'finished'
+            db.session.commit()
+            return ImportSchema().dump(citations_import).data, 202
+
+        fulltext = db.session.query(Fulltext).get(upload_session.fulltext_id)
+        if not fulltext:
+            return not_found_error(
+                '<Fulltext(id={})> not found'.format(upload_session.fulltext_id))
+        if test is True:
+            db.session.rollback()
+            return FulltextSchema().dump(fulltext).data
+        _, ext = os.path.splitext(upload_session.filename)
+        fulltext.filename = '{}{}'.format(fulltext.id, ext)
+        fulltext.original_filename = secure_filename(upload_session.filename)
+        fulltext_filepath = os.path.join(
+            current_app.config['FULLTEXT_UPLOADS_DIR'],
+            str(fulltext.review_id),
+            fulltext.filename)
+        os.makedirs(os.path.dirname(fulltext_filepath), exist_ok=True)
+        shutil.move(filepath, fulltext_filepath)
+        try:
+            process_fulltext_upload(fulltext, fulltext_filepath)
+        except Exception:
+            # put the file back, so the session may be finished again later
+            db.session.rollback()
+            shutil.move(fulltext_filepath, filepath)
+            current_app.logger.exception(
+                'unable to process uploaded fulltext file for %s', upload_session)
+            raise
+        upload_session.status = 'finished'
+        db.session.commit()
+        return FulltextSchema().dump(fulltext).data
+
+
+def _get_upload_session(id, for_update=False):
+    """
+    Get the upload session with ``id``, if it exists and belongs to the current user.
+
+    Returns:
+        Tuple[:class:`UploadSession`, :class:`flask.Response`]: upload session,
+        or None and an error response
+    """
+    query = db.session.query(UploadSession).filter_by(id=id)
+    if for_update is True:
+        # lock the row, so that concurrent requests can't interleave chunks
+        query = query.with_for_update()
+    upload_session = query.one_or_none()
+    if not upload_session:
+        return None, not_found_error('<UploadSession(id={})> not found'.format(id))
+    if upload_session.user_id != g.current_user.id:
+        db.session.rollback()
+        return None, forbidden_error(
+            '{} forbidden to access this upload session'.format(g.current_user))
+    return upload_session, None
+
+
+def _get_upload_filepath(upload_session):
+    return os.path.join(
+        current_app.config['UPLOAD_SESSIONS_DIR'],
+        '{}.part'.format(upload_session.id))
+
+
+def _remove_upload_file(upload_session):
+    try:
+        os.remove(_get_upload_filepath(upload_session))
+    except FileNotFoundError:
+        pass
+
+
+def _remove_expired_upload_sessions():
+    """Remove unfinished upload sessions, and their files, that haven't been updated in a while."""
+    expired_at = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=current_app.config['UPLOAD_SESSION_EXPIRATION'])
+    expired_sessions = db.session.query(UploadSession)\
+        .filter(UploadSession.status == 'pending')\
+        .filter(UploadSession.last_updated < expired_at)\
+        .all()
+    for upload_session in expired_sessions:
+        _remove_upload_file(upload_session)
+        db.session.delete(upload_session)
+    if expired_sessions:
+        current_app.logger.info('removed %s expired upload sessions', len(expired_sessions))
+
+
+def _copy_stream(src, dst, n_bytes):
+    """
+    Copy up to ``n_bytes`` from ``src`` to ``dst`` stream, one block at a time.
+
+    Returns:
+        int: number of bytes actually copied
+    """
+    n_copied = 0
+    while n_copied < n_bytes:
+        block = src.read(min(BLOCK_SIZE, n_bytes - n_copied))
+        if not block:
+            break
+        dst.write(block)
+        n_copied += len(block)
+    return n_copied
+
+
+def _get_file_checksum(filepath):
+    """Get the hex-encoded SHA-256 digest of the file at ``filepath``."""
+    sha256 = hashlib.sha256()
+    with io.open(filepath, mode='rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
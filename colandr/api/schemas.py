@@ -63,6 +63,8 @@ class ReviewSchema(Schema):
         validate=Range(min=1, max=2))
     num_fulltext_screening_reviewers = fields.Int(
         validate=Range(min=1, max=2))
+    dedupe_blocking_engine = fields.Str(
+        allow_none=True, validate=OneOf(constants.DEDUPE_BLOCKING_ENGINES))
 
     class Meta:
         strict = True
@@ -161,6 +163,38 @@ class ReviewPlanSchema(Schema):
         strict = True
 
 
+class UploadSessionSchema(Schema):
+    id = fields.Int(
+        dump_only=True)
+    created_at = fields.DateTime(
+        dump_only=True, format='iso')
+    last_updated = fields.DateTime(
+        dump_only=True, format='iso')
+    user_id = fields.Int(
+        dump_only=True)
+    review_id = fields.Int(
+        required=True, validate=Range(min=1, max=constants.MAX_INT))
+    upload_type = fields.Str(
+        required=True, validate=OneOf(constants.UPLOAD_SESSION_TYPES))
+    fulltext_id = fields.Int(
+        validate=Range(min=1, max=constants.MAX_BIGINT))
+    import_id = fields.Int(
+        dump_only=True)
+    filename = fields.Str(
+        required=True, validate=Length(min=1, max=500))
+    total_size = fields.Int(
+        required=True, validate=Range(min=1, max=constants.MAX_BIGINT))
+    received_size = fields.Int(
+        dump_only=True)
+    checksum = fields.Str(
+        validate=Length(equal=64))
+    status = fields.Str(
+        dump_only=True, validate=OneOf(constants.UPLOAD_SESSION_STATUSES))
+
+    class Meta:
+        strict = True
+
+
 class ImportSchema(Schema):
     id = fields.Int(
         dump_only=True)
@@ -178,6 +212,17 @@ class ImportSchema(Schema):
         required=True, validate=Range(min=1, max=constants.MAX_INT))
     status = fields.Str(
         validate=OneOf(constants.IMPORT_STATUSES))
+    job_status = fields.Str(
+        dump_only=True,
+        validate=OneOf(constants.IMPORT_JOB_STATUSES))
+    num_records_parsed = fields.Int(
+        dump_only=True)
+    num_records_inserted = fields.Int(
+        dump_only=True)
+    num_errors = fields.Int(
+        dump_only=True)
+    errors = fields.List(
+        fields.Str(), dump_only=True)
     data_source = fields.Nested(
         DataSourceSchema)
     user = fields.Nested(
@@ -30,6 +30,18 @@ class Config(object):
     CELERY_TASK_SERIALIZER = 'json'
     CELERY_RESULT_SERIALIZER = 'json'
     CELERYD_LOG_COLOR = False
+    # celery's default prefork pool runs tasks in daemonic processes, which can't
+    # start process pools of their own, so tasks that do (see CITATION_IMPORT_N_JOBS,
+    # DEDUPE_NUM_CORES, and NLP_VECTORIZE_N_JOBS) fall back to a single process there;
+    # if this is set, those tasks are routed to this queue instead, which must be
+    # consumed by a worker with a non-daemonic pool, e.g.
+    # `celery worker --app=celery_worker.celery --queues=multiprocess --pool=solo`
+    CELERY_MULTIPROCESS_QUEUE = os.environ.get('COLANDR_CELERY_MULTIPROCESS_QUEUE')
+    CELERY_ROUTES = {
+        'colandr.tasks.process_citations_import': {'queue': CELERY_MULTIPROCESS_QUEUE},
+        'colandr.tasks.deduplicate_citations': {'queue': CELERY_MULTIPROCESS_QUEUE},
+        'colandr.tasks.get_citations_text_content_vectors': {'queue': CELERY_MULTIPROCESS_QUEUE},
+        } if CELERY_MULTIPROCESS_QUEUE else {}
 
     # sql db config
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
@@ -49,10 +61,46 @@ class Config(object):
         COLANDR_APP_DIR, 'colandr_data', 'ranking_models')
     CITATIONS_DIR = os.path.join(
         COLANDR_APP_DIR, 'colandr_data', 'citations')
+    CITATION_IMPORT_UPLOADS_DIR = os.path.join(
+        COLANDR_APP_DIR, 'colandr_data', 'citation_imports')
     FULLTEXT_UPLOADS_DIR = os.path.join(
         COLANDR_APP_DIR, 'colandr_data', 'fulltexts')
     ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS = {'.txt', '.pdf'}
-    MAX_CONTENT_LENGTH = 40 * 1024 * 1024  # 40MB file upload limit
+    MAX_CONTENT_LENGTH = 40 * 1024 * 1024  # 40MB limit per request, incl. upload chunks
+    UPLOAD_SESSIONS_DIR = os.path.join(
+        COLANDR_APP_DIR, 'colandr_data', 'upload_sessions')
+    MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024  # 2GB limit on resumable, chunked uploads
+    UPLOAD_SESSION_EXPIRATION = 7 * 24 * 3600  # unfinished uploads removed after 7 days
+
+    # citation imports config
+    CITATION_IMPORT_CHUNK_SIZE = 1000  # max records held in memory per insert
+    CITATION_IMPORT_LOADER = 'copy'  # or 'insert', for parameter-bound INSERTs
+    CITATION_IMPORT_N_JOBS = 1  # if > 1, records are parsed in a pool of processes
+    CITATION_IMPORT_SHARD_SIZE = 500  # records parsed per process per task
+
+    # citation deduplication config
+    DEDUPE_INCREMENTAL = True  # only block and compare citations added since last dedupe
+    DEDUPE_INCREMENTAL_MAX_FRACTION = 0.5  # dedupe from scratch if more new citations than this
+    DEDUPE_NUM_CORES = int(os.environ.get('COLANDR_DEDUPE_NUM_CORES', 1))  # per worker host
+    DEDUPE_MATCH_CHUNK_SIZE = 1000  # max candidate rows buffered in memory while matching
+    DEDUPE_BLOCKING_MAP_BATCH_SIZE = 10000  # max blocking map rows held in memory per COPY
+    DEDUPE_THRESHOLD_SAMPLE_SIZE = 20000  # citations sampled to set similarity threshold
+    DEDUPE_THRESHOLD_MAX_GROWTH = 0.25  # recompute threshold once review has grown this much
+    DEDUPE_IN_MEMORY_MAX_CITATIONS = 20000  # reviews this small skip the blocking tables
+    DEDUPE_KEEP_BLOCKING_TABLES = True  # keep blocking tables after runs, for incremental runs
+    DEDUPE_BLOCKING_ENGINE = 'dedupe'  # or 'minhash'; reviews may override this
+    DEDUPE_MINHASH_NUM_PERM = 128  # length of minhash signatures
+    DEDUPE_MINHASH_NUM_BANDS = 32  # LSH bands per signature; more finds less-similar pairs
+    DEDUPE_MINHASH_MAX_BLOCK_SIZE = 100  # larger minhash blocks are split into chunks
+
+    # citation text vectorization config
+    NLP_VECTORIZE_BATCH_SIZE = 256  # docs passed through spacy's pipeline together
+    NLP_VECTORIZE_CHUNK_SIZE = 5000  # docs read from db (and sent to a process) at a time
+    NLP_VECTORIZE_N_JOBS = int(os.environ.get('COLANDR_NLP_VECTORIZE_N_JOBS', 1))  # per worker host
+    NLP_VECTOR_DIM = 300  # length of text vectors; models with other lengths use fallback vectors
+    NLP_MODEL_CACHE_MAX_MODELS = 2  # spacy models kept loaded per worker process
+    NLP_MODEL_CACHE_MAX_MEMORY_MB = 2048  # least recently used models evicted past this
+    NLP_PRELOAD_LANGS = []  # spacy models loaded when each worker process starts, e.g. ['en']
 
     # email server config
     MAIL_SERVER = 'smtp.gmail.com'
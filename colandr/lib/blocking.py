@@ -0,0 +1,208 @@
+"""
+Block citation records for deduplication entirely in memory, producing candidate
+duplicates for :meth:`dedupe.StaticDedupe.matchBlocks()` under Kolb et al.'s
+redundancy-free comparison scheme, without any of the blocking tables. Also,
+an alternative to dedupe's learned blocking predicates, based on MinHash-LSH.
+"""
+import collections
+import itertools
+import zlib
+
+import numpy as np
+
+from .utils import normalize_text
+
+
+# mersenne prime modulus of minhash's universal hash functions, small enough that
+# (shingle mod prime) * a + b can't overflow 64 bits and hashes fit in 32 bits
+_MINHASH_PRIME = np.uint64(2 ** 31 - 1)
+
+
+def index_records(deduper, records):
+    """
+    If ``deduper`` learned any index predicates, index all values of their fields
+    in ``records`` (dict), which must be done before blocking them.
+    """
+    for field in deduper.blocker.index_fields:
+        field_data = {record.get(field) for record in records.values()}
+        deduper.blocker.index(field_data, field)
+
+
+def get_blocks(blocker, records):
+    """
+    Block ``records``, keeping only block keys shared by multiple records,
+    i.e. plural blocks, whose ids are assigned in block key order.
+
+    Args:
+        blocker (callable): given (citation id, record) pairs, yields
+            (block key, citation id) pairs, e.g. ``deduper.blocker``
+            or a :class:`MinHashBlocker`
+        records (dict): mapping of citation id to immutable record
+
+    Returns:
+        Tuple[:class:`collections.OrderedDict`, dict]: mapping of block id to the ids
+        of citations in it, and of citation id to (sorted) ids of the blocks it's in
+    """
+    block_key_cids = collections.defaultdict(set)
+    for block_key, citation_id in blocker(records.items()):
+        block_key_cids[block_key].add(citation_id)
+    block_cids = collections.OrderedDict()
+    covered_block_ids = collections.defaultdict(list)
+    plural_keys = sorted(key for key, cids in block_key_cids.items() if len(cids) > 1)
+    for block_id, block_key in enumerate(plural_keys, start=1):
+        cids = sorted(block_key_cids[block_key])
+        block_cids[block_id] = cids
+        for cid in cids:
+            covered_block_ids[cid].append(block_id)
+    return block_cids, covered_block_ids
+
+
+def iter_candidate_dupes(block_cids, covered_block_ids, records, max_citation_id=None):
+    """
+    Get blocks of candidate duplicates, each record paired with the ids of
+    the blocks it's in that are smaller than the current block's id, so that
+    each pair of records is only compared once. If ``max_citation_id`` is specified,
+    citations with ids up to and including it have already been deduped, so they
+    all share a sentinel "block" and only pairs including a new citation get compared.
+
+    Args:
+        block_cids (:class:`collections.OrderedDict`)
+        covered_block_ids (dict)
+        records (dict)
+        max_citation_id (int)
+
+    Yields:
+        List[Tuple[int, dict, frozenset]]
+    """
+    old_sentinel = frozenset([-1])
+    for block_id, cids in block_cids.items():
+        block = []
+        for cid in cids:
+            smaller_ids = frozenset(
+                itertools.takewhile(lambda id_: id_ < block_id, covered_block_ids[cid]))
+            if max_citation_id is not None and cid <= max_citation_id:
+                smaller_ids = smaller_ids | old_sentinel
+            block.append((cid, records[cid], smaller_ids))
+        yield block
+
+
+def count_comparisons(blocks):
+    """
+    Count the pairs of records that are actually compared across ``blocks``,
+    as produced by :func:`iter_candidate_dupes()`.
+
+    Returns:
+        int
+    """
+    n_comparisons = 0
+    for block in blocks:
+        for (_, _, smaller_ids_1), (_, _, smaller_ids_2) in itertools.combinations(block, 2):
+            if smaller_ids_1.isdisjoint(smaller_ids_2):
+                n_comparisons += 1
+    return n_comparisons
+
+
+class MinHashBlocker(object):
+    """
+    Block citation records by MinHash signatures of their title's character shingles
+    and abstract's word shingles, split into bands for locality-sensitive hashing:
+    records whose signatures match in any band share that band's block key.
+    Unlike dedupe's learned predicates, block sizes are bounded: records in
+    too-large blocks are sorted by signature and split into adjacent chunks.
+    Like ``deduper.blocker``, a blocker instance is called on (citation id, record)
+    pairs and yields (block key, citation id) pairs, but it needs no indexing.
+
+    Args:
+        num_perm (int): number of hash permutations, i.e. signature length
+        num_bands (int): number of LSH bands into which signatures are split;
+            more bands (of fewer rows) finds less-similar candidate pairs
+        max_block_size (int): max number of records per block
+        title_shingle_size (int): number of characters per title shingle
+        abstract_shingle_size (int): number of words per abstract shingle
+        max_abstract_words (int): max number of (leading) words shingled per abstract
+        seed (int): random seed for hash permutations; block keys are only
+            comparable between blockers with the same seed and parameters
+    """
+
+    def __init__(self, num_perm=128, num_bands=32, max_block_size=100,
+                 title_shingle_size=5, abstract_shingle_size=2, max_abstract_words=100,
+                 seed=42):
+        if num_perm % num_bands != 0:
+            raise ValueError('num_perm must be a multiple of num_bands')
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows_per_band = num_perm // num_bands
+        self.max_block_size = max_block_size
+        self.title_shingle_size = title_shingle_size
+        self.abstract_shingle_size = abstract_shingle_size
+        self.max_abstract_words = max_abstract_words
+        rand = np.random.RandomState(seed)
+        self.perm_a = rand.randint(1, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+        self.perm_b = rand.randint(0, _MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+
+    def __call__(self, data):
+        cids = []
+        signatures = []
+        for cid, record in data:
+            signature = self.get_signature(record)
+            if signature is not None:
+                cids.append(cid)
+                signatures.append(signature)
+        if not signatures:
+            return
+        signatures = np.vstack(signatures)
+        for band in range(self.num_bands):
+            band_sigs = signatures[:, band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            buckets = collections.defaultdict(list)
+            for idx, band_sig in enumerate(band_sigs):
+                buckets[band_sig.tobytes()].append(idx)
+            for band_key, idxs in buckets.items():
+                if len(idxs) < 2:
+                    continue
+                block_key = 'mh{}:{}'.format(band, band_key.hex())
+                if len(idxs) <= self.max_block_size:
+                    for idx in idxs:
+                        yield block_key, cids[idx]
+                else:
+                    # neighbors in signature order are most alike, so keep them together
+                    idxs.sort(key=lambda idx: signatures[idx].tobytes())
+                    for start in range(0, len(idxs), self.max_block_size):
+                        chunk_key = '{}:{}'.format(block_key, start // self.max_block_size)
+                        for idx in idxs[start:start + self.max_block_size]:
+                            yield chunk_key, cids[idx]
+
+    def get_shingles(self, record):
+        """
+        Get the set of hashed shingles for ``record``'s title and abstract.
+
+        Returns:
+            :class:`numpy.ndarray`
+        """
+        shingles = set()
+        title = normalize_text(record.get('title') or '')
+        if title:
+            k = self.title_shingle_size
+            shingles.update('t:' + title[i:i + k] for i in range(max(len(title) - k + 1, 1)))
+        abstract = (record.get('abstract') or '').split()[:self.max_abstract_words]
+        abstract = normalize_text(' '.join(abstract)).split()
+        if abstract:
+            k = self.abstract_shingle_size
+            shingles.update('a:' + ' '.join(abstract[i:i + k])
+                            for i in range(max(len(abstract) - k + 1, 1)))
+        return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                           dtype=np.uint64, count=len(shingles))
+
+    def get_signature(self, record):
+        """
+        Get the MinHash signature of ``record``'s shingles.
+
+        Returns:
+            :class:`numpy.ndarray`: of length ``num_perm``, or None if ``record``
+            has neither a title nor an abstract
+        """
+        shingles = self.get_shingles(record)
+        if shingles.size == 0:
+            return None
+        shingles = shingles % _MINHASH_PRIME
+        hashes = (shingles[:, np.newaxis] * self.perm_a + self.perm_b) % _MINHASH_PRIME
+        return hashes.min(axis=0).astype(np.uint32)
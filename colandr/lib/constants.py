@@ -13,8 +13,13 @@ DEDUPE_FIELDS = [
 CITATION_RANKING_MODEL_FNAME = 'citation_ranking_model_review_{review_id}.pkl'
 
 IMPORT_STATUSES = ('not_screened', 'included', 'excluded')
+IMPORT_JOB_STATUSES = ('pending', 'running', 'finished', 'failed')
+MAX_IMPORT_ERRORS_STORED = 100
+UPLOAD_SESSION_TYPES = ('citation_import', 'fulltext')
+UPLOAD_SESSION_STATUSES = ('pending', 'finished')
 REVIEW_STATUSES = ('active', 'frozen')
 DEDUPE_STATUSES = ('not_duplicate', 'duplicate')
+DEDUPE_BLOCKING_ENGINES = ('dedupe', 'minhash')
 SCREENING_STATUSES = ('not_screened', 'screened_once', 'conflict', 'included', 'excluded')
 USER_SCREENING_STATUSES = ('pending', 'awaiting_coscreener', 'conflict', 'included', 'excluded')
 EXTRACTION_STATUSES = ('not_started', 'started', 'finished')
@@ -0,0 +1,75 @@
+"""
+Rules for resolving clusters of duplicate citations, and for deciding how much
+of a review's deduplication must be redone as citations are added to it,
+kept apart from the db queries that feed them.
+"""
+import collections
+
+
+def get_canonical_citation_id(cids, incl_excl_cids, n_null_cols):
+    """
+    Get the canonical citation in a cluster of duplicate citation ids: the
+    included/excluded citation with the lowest id, if any, otherwise the one
+    with the fewest null columns (and the lowest id, among ties).
+
+    Args:
+        cids (Iterable[int])
+        incl_excl_cids (Set[int]): ids of included/excluded citations
+        n_null_cols (Dict[int, int]): number of null columns per citation id;
+            citations missing from it are counted as having none
+
+    Returns:
+        int
+    """
+    incl_excl_cluster_cids = incl_excl_cids.intersection(cids)
+    if incl_excl_cluster_cids:
+        return min(incl_excl_cluster_cids)
+    return min(cids, key=lambda cid: (n_null_cols.get(cid, 0), cid))
+
+
+def get_existing_canonical_citation_id(cids, max_citation_id, existing_canonicals):
+    """
+    Get the canonical citation of the existing cluster that a cluster of duplicate
+    citation ids found in an incremental run joins: of the clusters its existing
+    citations (those with ids <= ``max_citation_id``) already belong to, the one
+    with the most members in this cluster (and the lowest canonical id, among ties).
+
+    Args:
+        cids (Iterable[int])
+        max_citation_id (int): highest citation id deduplicated by the previous run
+        existing_canonicals (Dict[int, int]): canonical citation id of each existing
+            citation already marked a duplicate; others are their own canonical
+
+    Returns:
+        int: canonical citation id, or None if all citations in ``cids`` are new
+    """
+    old_canonicals = collections.Counter(
+        existing_canonicals.get(cid, cid) for cid in cids if cid <= max_citation_id)
+    if not old_canonicals:
+        return None
+    return min(old_canonicals, key=lambda cid: (-old_canonicals[cid], cid))
+
+
+def can_reuse_dedupe_threshold(threshold, threshold_review_size, n_citations, max_growth):
+    """
+    Check if a similarity threshold computed for a review of ``threshold_review_size``
+    citations may be reused now that it has ``n_citations``, i.e. if it hasn't
+    grown by more than a fraction ``max_growth`` since.
+
+    Returns:
+        bool
+    """
+    return (threshold is not None and bool(threshold_review_size) and
+            n_citations <= (1 + max_growth) * threshold_review_size)
+
+
+def can_dedupe_incrementally(n_new, n_old, max_fraction):
+    """
+    Check if ``n_new`` citations may be deduplicated against ``n_old`` already
+    deduplicated ones incrementally, rather than deduplicating all from scratch,
+    i.e. if there are no more than a fraction ``max_fraction`` as many new as old.
+
+    Returns:
+        bool
+    """
+    return n_new <= max_fraction * n_old
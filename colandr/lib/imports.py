@@ -0,0 +1,512 @@
+import bz2
+import collections
+import gzip
+import io
+import itertools
+import lzma
+import multiprocessing
+import os
+import zipfile
+
+from ..models import db, Citation, Fulltext, Study
+from .bulk_load import copy_rows, reserve_ids
+from .parsers import BibTexFile, EndNoteXmlFile, PubMedXmlFile, RisFile
+from .utils import get_citation_fingerprint, get_console_logger
+from .validation import CitationBatchValidator
+
+
+logger = get_console_logger(__name__)
+
+
+DECOMPRESSORS = {
+    '.bz2': bz2.open,
+    '.gz': gzip.open,
+    '.xz': lzma.open,
+    }
+XML_FILE_TYPES = (PubMedXmlFile, EndNoteXmlFile)
+# number of bytes at the start of an XML file checked for its format
+XML_SNIFF_SIZE = 64 * 1024
+
+
+def get_citations_file(fname, path_or_stream):
+    """
+    Get the appropriate citations file parser for ``fname``, based on its extension.
+    The format of .xml files (PubMed or EndNote) is sniffed from their content.
+    Compressed (.gz, .bz2, .xz) files are decompressed as a stream while being
+    parsed, as are the members of .zip archives, which may hold several files.
+
+    Args:
+        fname (str): name of the citations file, e.g. as uploaded by the user
+        path_or_stream (str or io stream): citations file's path on disk
+            or stream of data
+
+    Returns:
+        :class:`RisFile` or :class:`BibTexFile` or :class:`PubMedXmlFile`
+        or :class:`EndNoteXmlFile` or :class:`CitationsFileChain`
+
+    Raises:
+        ValueError: if file type is unknown
+    """
+    root, ext = os.path.splitext(fname)
+    ext = ext.lower()
+    if ext in DECOMPRESSORS:
+        _get_citations_file_type(root)  # fail fast if the inner file is unknown
+        stream = DECOMPRESSORS[ext](path_or_stream, mode='rb')
+        try:
+            return CitationsFileChain([get_citations_file(root, stream)], source=stream)
+        except ValueError:
+            stream.close()
+            raise
+    elif ext == '.zip':
+        try:
+            zip_file = zipfile.ZipFile(path_or_stream)
+        except zipfile.BadZipFile:
+            raise ValueError('invalid zip file: "{}"'.format(fname))
+        members = []
+        for member in zip_file.infolist():
+            member_fname = member.filename
+            if member_fname.endswith('/') or member_fname.startswith('__MACOSX/') or \
+                    os.path.basename(member_fname).startswith('.'):
+                continue
+            try:
+                _get_citations_file_type(member_fname)
+            except ValueError:
+                logger.warning(
+                    'skipping file "%s" of unknown type in "%s"', member_fname, fname)
+                continue
+            members.append(member)
+        if not members:
+            zip_file.close()
+            raise ValueError('no citations files found in zip file: "{}"'.format(fname))
+        return CitationsFileChain(
+            _iter_zipped_citations_files(zip_file, members), source=zip_file)
+    else:
+        return _get_citations_file_type(fname)(path_or_stream)
+
+
+def close_citations_file(citations_file):
+    """
+    Close any streams opened by :func:`get_citations_file()` for ``citations_file``,
+    e.g. if it was only checked and won't be parsed. A stream passed in by the caller
+    is left open, so it may still be read from (or saved) afterwards.
+    """
+    if isinstance(citations_file, CitationsFileChain):
+        citations_file.close()
+
+
+def check_citations_file_type(fname):
+    """
+    Check that ``fname`` is a known type of citations file, based only on
+    its extension, e.g. before the file itself has been fully uploaded.
+
+    Raises:
+        ValueError: if file type is unknown
+    """
+    _, ext = os.path.splitext(fname)
+    if ext.lower() != '.zip':
+        _get_citations_file_type(fname)
+
+
+def _get_citations_file_type(fname):
+    """
+    Get the parser class for (the possibly compressed) file ``fname``,
+    or for XML files, a function that sniffs out the right one.
+
+    Raises:
+        ValueError: if file type is unknown
+    """
+    root, ext = os.path.splitext(fname)
+    ext = ext.lower()
+    if ext in DECOMPRESSORS:
+        return _get_citations_file_type(root)
+    elif ext == '.bib':
+        return BibTexFile
+    elif ext == '.ris' or ext == '.txt':
+        return RisFile
+    elif ext == '.xml':
+        return _get_xml_citations_file
+    else:
+        raise ValueError('unknown file type: "{}"'.format(fname))
+
+
+def _get_xml_citations_file(path_or_stream):
+    """
+    Get the parser for XML citations file ``path_or_stream``, based on the
+    elements at its start; a stream is rewound to where it was afterwards.
+
+    Raises:
+        ValueError: if XML file format is unknown
+    """
+    if isinstance(path_or_stream, (bytes, str)):
+        with io.open(path_or_stream, mode='rb') as f:
+            head = f.read(XML_SNIFF_SIZE)
+    else:
+        try:
+            pos = path_or_stream.tell()
+            head = path_or_stream.read(XML_SNIFF_SIZE)
+            path_or_stream.seek(pos)
+        except (AttributeError, io.UnsupportedOperation):
+            raise ValueError('unable to detect format of XML citations file')
+    if isinstance(head, bytes):
+        head = head.decode('utf-8', errors='ignore')
+    for file_cls in XML_FILE_TYPES:
+        if file_cls.sniff(head):
+            return file_cls(path_or_stream)
+    raise ValueError('unknown XML citations file format; expected PubMed or EndNote XML')
+
+
+def _iter_zipped_citations_files(zip_file, members):
+    """Open ``members`` of ``zip_file`` as citations files lazily, one at a time."""
+    with zip_file:
+        for member in members:
+            yield get_citations_file(member.filename, zip_file.open(member))
+
+
+class CitationsFileChain(object):
+    """
+    Parse several citations files one after another, as if they were one,
+    e.g. the members of a zip archive, or a decompressed file and its stream.
+
+    Args:
+        citations_files (Iterable[:class:`RisFile` or :class:`BibTexFile` or :class:`XmlFile`])
+        source (file-like): if specified, the files' shared source, e.g. a zip archive,
+            closed along with this chain
+    """
+
+    def __init__(self, citations_files, source=None):
+        self.citations_files = citations_files
+        self.source = source
+
+    def __iter__(self):
+        for citations_file in self.citations_files:
+            if isinstance(citations_file, CitationsFileChain):
+                for inner_file in citations_file:
+                    yield inner_file
+            else:
+                yield citations_file
+
+    def close(self):
+        """Stop iterating over the files, and close their shared source, if any."""
+        close = getattr(self.citations_files, 'close', None)
+        if close is not None:
+            close()
+        if self.source is not None:
+            self.source.close()
+
+    def parse(self):
+        """
+        Yields:
+            dict: next parsed citation record, from each file in turn
+        """
+        for citations_file in self:
+            for record in citations_file.parse():
+                yield record
+
+
+def iter_citation_records(citations_file, review_id, errors=None,
+                          n_jobs=1, shard_size=500):
+    """
+    Parse and validate citation records from ``citations_file``, in order,
+    collecting (and skipping) any records that fail.
+
+    Args:
+        citations_file (:class:`RisFile` or :class:`BibTexFile` or :class:`PubMedXmlFile`
+            or :class:`EndNoteXmlFile` or :class:`CitationsFileChain`)
+        review_id (int)
+        errors (list): if specified, messages for records that failed,
+            prefixed by the line number at which they start, are appended to it
+        n_jobs (int): number of processes in which to parse and validate records;
+            if 1, records are parsed and validated in this process
+        shard_size (int): number of records parsed and validated together as a shard
+
+    Yields:
+        dict: next validated citation record, ready for insertion
+    """
+    if isinstance(citations_file, CitationsFileChain):
+        for inner_file in citations_file:
+            records = iter_citation_records(
+                inner_file, review_id, errors=errors,
+                n_jobs=n_jobs, shard_size=shard_size)
+            for record in records:
+                yield record
+        return
+
+    # records are parsed and validated shard by shard, whether here or in a pool,
+    # so that failures are collected per record, with line numbers, either way
+    shards = citations_file.iter_shards(shard_size)
+    if n_jobs > 1:
+        loaded_shards = _iter_loaded_shards_parallel(
+            shards, type(citations_file), review_id, n_jobs)
+    else:
+        validator = CitationBatchValidator()
+        loaded_shards = (_load_shard(shard, citations_file, validator, review_id)
+                         for shard in shards)
+    for records, shard_errors in loaded_shards:
+        for lineno, msg in shard_errors:
+            logger.warning('parsing error: line %s: %s', lineno + 1, msg)
+            if errors is not None:
+                errors.append('line {}: {}'.format(lineno + 1, msg))
+        for record in records:
+            yield record
+
+
+def _iter_loaded_shards_parallel(shards, file_cls, review_id, n_jobs):
+    """
+    Parse and validate ``shards`` of a citations file in a pool of ``n_jobs``
+    processes. At most ``2 * n_jobs`` shards are in flight at a time,
+    so memory use is bounded regardless of file size.
+    """
+    initargs = (file_cls, review_id)
+    with multiprocessing.Pool(n_jobs, initializer=_init_parse_worker, initargs=initargs) as pool:
+        pending = collections.deque()
+        while True:
+            for shard in itertools.islice(shards, 2 * n_jobs - len(pending)):
+                pending.append(pool.apply_async(_load_shard_in_worker, (shard,)))
+            if not pending:
+                break
+            yield pending.popleft().get()
+
+
+# state of a process in a parallel parsing pool, set by its initializer
+_parse_worker = {}
+
+
+def _init_parse_worker(file_cls, review_id):
+    _parse_worker['parser'] = file_cls(io.StringIO())
+    _parse_worker['validator'] = CitationBatchValidator()
+    _parse_worker['review_id'] = review_id
+
+
+def _load_shard_in_worker(shard):
+    return _load_shard(
+        shard, _parse_worker['parser'], _parse_worker['validator'], _parse_worker['review_id'])
+
+
+def _load_shard(shard, parser, validator, review_id):
+    """
+    Parse and validate all records in ``shard``, as split by ``parser.iter_shards()``.
+
+    Returns:
+        Tuple[List[dict], List[Tuple[int, str]]]: validated citation records,
+        and (line number, message) pairs for records that failed
+    """
+    linenos = []
+    records = []
+    errors = []
+    try:
+        for lineno, record in parser.parse_shard(*shard, errors=errors):
+            record['review_id'] = review_id
+            linenos.append(lineno)
+            records.append(record)
+    except Exception as e:
+        errors.append((shard[1], str(e)))
+    validated_records, validation_errors = validator.validate(records)
+    errors.extend((linenos[idx], msg) for idx, msg in validation_errors)
+    return validated_records, sorted(errors, key=lambda error: error[0])
+
+
+def iter_batches(iterable, batch_size):
+    """
+    Split ``iterable`` into lists of at most ``batch_size`` items, lazily.
+
+    Args:
+        iterable (iterable)
+        batch_size (int)
+
+    Yields:
+        list
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_citations(conn, citations, user_id, review_id, data_source_id,
+                     status=None):
+    """
+    Insert a batch of ``citations`` and their corresponding studies (and, if
+    ``status`` is "included", fulltexts) into the database via ``conn``.
+
+    Args:
+        conn (:class:`sqlalchemy.engine.Connection`)
+        citations (List[dict]): validated citation records; modified in-place
+            to include their study ids as primary keys
+        user_id (int)
+        review_id (int)
+        data_source_id (int)
+        status (str): known screening status of citations, if any
+
+    Returns:
+        List[int]: ids of the inserted studies, in the same order as ``citations``
+    """
+    study = {'user_id': user_id,
+             'review_id': review_id,
+             'data_source_id': data_source_id}
+    if status is not None:
+        study['citation_status'] = status
+
+    # insert studies, and get their primary keys _back_
+    stmt = db.insert(Study)\
+        .values([study for _ in range(len(citations))])\
+        .returning(Study.id)
+    study_ids = [result[0] for result in conn.execute(stmt)]
+
+    # add study ids to citations as their primary keys, then insert them
+    # in groups with the same set of fields, since not all citations have
+    # all fields and executemany requires them to be consistent
+    for study_id, citation in zip(study_ids, citations):
+        citation['id'] = study_id
+    for _, group in itertools.groupby(
+            sorted(citations, key=_sorted_keys), key=_sorted_keys):
+        conn.execute(Citation.__table__.insert(), list(group))
+
+    # if citations' status is "included", we have to bulk insert
+    # the corresponding fulltexts, since bulk operations won't trigger
+    # the fancy events defined in models.py
+    if status == 'included':
+        conn.execute(
+            Fulltext.__table__.insert(),
+            [{'id': study_id, 'review_id': review_id}
+             for study_id in study_ids])
+
+    return study_ids
+
+
+def copy_citations(conn, citations, user_id, review_id, data_source_id,
+                   status=None):
+    """
+    Load a batch of ``citations`` and their corresponding studies (and, if
+    ``status`` is "included", fulltexts) into the database via Postgres' COPY,
+    which is considerably faster than :func:`insert_citations` for large batches.
+
+    Args:
+        conn (:class:`sqlalchemy.engine.Connection`)
+        citations (List[dict]): validated citation records; modified in-place
+            to include their study ids as primary keys
+        user_id (int)
+        review_id (int)
+        data_source_id (int)
+        status (str): known screening status of citations, if any
+
+    Returns:
+        List[int]: ids of the loaded studies, in the same order as ``citations``
+    """
+    # COPY can't return generated primary keys, so reserve them up front
+    study_ids = reserve_ids(conn, Study.__table__, len(citations))
+    study = {'user_id': user_id,
+             'review_id': review_id,
+             'data_source_id': data_source_id}
+    if status is not None:
+        study['citation_status'] = status
+    copy_rows(
+        conn, Study.__table__,
+        [dict(study, id=study_id) for study_id in study_ids])
+
+    for study_id, citation in zip(study_ids, citations):
+        citation['id'] = study_id
+    copy_rows(conn, Citation.__table__, citations)
+
+    if status == 'included':
+        copy_rows(
+            conn, Fulltext.__table__,
+            [{'id': study_id, 'review_id': review_id}
+             for study_id in study_ids])
+
+    return study_ids
+
+
+CITATION_LOADERS = {
+    'copy': copy_citations,
+    'insert': insert_citations,
+    }
+
+
+def import_citations(conn, records, user_id, review_id, data_source_id,
+                     status=None, chunk_size=1000, progress_callback=None,
+                     loader='copy', skip_duplicates=False):
+    """
+    Insert citation ``records`` into the database in fixed-size chunks, so that
+    no more than ``chunk_size`` records are held in memory at once. Each citation
+    gets a fingerprint (see :func:`get_citation_fingerprint`), by which exact
+    duplicates are found cheaply, before any probabilistic deduplication.
+
+    Args:
+        conn (:class:`sqlalchemy.engine.Connection`)
+        records (Iterable[dict]): validated citation records, e.g. as yielded
+            by :func:`iter_citation_records`
+        user_id (int)
+        review_id (int)
+        data_source_id (int)
+        status (str): known screening status of citations, if any
+        chunk_size (int): max number of records inserted per batch
+        progress_callback (callable): if specified, called with the number of
+            records parsed so far and the number inserted so far, both after
+            each chunk has been parsed and after it has been inserted
+        loader (str): method by which chunks are written to the database,
+            either "copy" (see :func:`copy_citations`) or "insert"
+            (see :func:`insert_citations`)
+        skip_duplicates (bool): if True, records that are exact duplicates of
+            a citation already in the review (or earlier in ``records``)
+            are skipped rather than inserted
+
+    Returns:
+        int: total number of citations inserted
+    """
+    load_citations = CITATION_LOADERS[loader]
+    n_parsed = 0
+    n_citations = 0
+    for batch in iter_batches(records, chunk_size):
+        n_parsed += len(batch)
+        if progress_callback is not None:
+            progress_callback(n_parsed, n_citations)
+        for record in batch:
+            record['fingerprint'] = get_citation_fingerprint(record)
+        if skip_duplicates is True:
+            n_records = len(batch)
+            batch = _drop_exact_duplicates(conn, batch, review_id)
+            if len(batch) < n_records:
+                logger.info(
+                    '<Review(id=%s)>: skipped %s exact duplicate citations',
+                    review_id, n_records - len(batch))
+        if batch:
+            load_citations(
+                conn, batch, user_id, review_id, data_source_id, status=status)
+        n_citations += len(batch)
+        if progress_callback is not None:
+            progress_callback(n_parsed, n_citations)
+        logger.debug(
+            '<Review(id=%s)>: inserted batch of %s citations (%s total)',
+            review_id, len(batch), n_citations)
+    return n_citations
+
+
+def _drop_exact_duplicates(conn, records, review_id):
+    """
+    Drop ``records`` whose fingerprints match a citation already in the review,
+    including any inserted earlier in this same transaction, or another record
+    earlier in ``records``.
+    """
+    fingerprints = {record['fingerprint'] for record in records
+                    if record['fingerprint'] is not None}
+    if not fingerprints:
+        return records
+    stmt = db.select([Citation.fingerprint])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.fingerprint.in_(fingerprints))
+    seen = {result[0] for result in conn.execute(stmt)}
+    unique_records = []
+    for record in records:
+        fingerprint = record['fingerprint']
+        if fingerprint is not None:
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+        unique_records.append(record)
+    return unique_records
+
+
+def _sorted_keys(record):
+    return tuple(sorted(record.keys()))
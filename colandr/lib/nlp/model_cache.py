@@ -0,0 +1,106 @@
+import collections
+import gc
+import os
+import resource
+import threading
+
+import textacy
+
+from ..utils import get_console_logger
+
+
+logger = get_console_logger(__name__)
+
+# process-level cache of loaded spacy pipelines, keyed by lang,
+# in order from least to most recently used
+_SPACY_MODELS = collections.OrderedDict()
+_SPACY_MODELS_LOCK = threading.Lock()
+
+
+def get_spacy_model(lang, max_models=None, max_memory_mb=None):
+    """
+    Get a spacy pipeline for ``lang`` suitable for vectorizing documents, loading
+    it on first use and reusing it thereafter. Once more than ``max_models`` are
+    loaded, or their estimated memory use exceeds ``max_memory_mb``, the least
+    recently used models are evicted from the cache.
+
+    Args:
+        lang (str): language code, e.g. 'en'
+        max_models (int): max number of models held in memory; if None, no limit
+        max_memory_mb (int): max memory held by models, estimated as the growth
+            in this process's RSS while loading each; if None, no limit
+
+    Returns:
+        :class:`spacy.Language`
+
+    Raises:
+        RuntimeError: if no spacy model is available for ``lang``
+    """
+    with _SPACY_MODELS_LOCK:
+        cached = _SPACY_MODELS.get(lang)
+        if cached is not None:
+            _SPACY_MODELS.move_to_end(lang)
+            return cached['nlp']
+        rss_mb = _get_rss_mb()
+        nlp = textacy.load_spacy(
+            lang, tagger=False, parser=False, entity=False, matcher=False)
+        size_mb = max(_get_rss_mb() - rss_mb, 0.0)
+        logger.info('loaded spacy lang "%s" model (~%.0f MB)', lang, size_mb)
+        _SPACY_MODELS[lang] = {'nlp': nlp, 'size_mb': size_mb}
+        _evict_spacy_models(max_models, max_memory_mb)
+        return nlp
+
+
+def preload_spacy_models(langs, max_models=None, max_memory_mb=None):
+    """
+    Load spacy pipelines for each of ``langs`` into the cache ahead of their first use,
+    e.g. when a worker process starts. Languages without a model are skipped.
+    """
+    for lang in langs:
+        try:
+            get_spacy_model(lang, max_models=max_models, max_memory_mb=max_memory_mb)
+        except RuntimeError:
+            logger.warning('unable to preload spacy lang "%s" model', lang)
+
+
+def evict_spacy_model(lang):
+    """Evict the spacy pipeline for ``lang`` from the cache, if loaded."""
+    with _SPACY_MODELS_LOCK:
+        cached = _SPACY_MODELS.pop(lang, None)
+    if cached is not None:
+        logger.info(
+            'evicted spacy lang "%s" model (~%.0f MB) from cache', lang, cached['size_mb'])
+        del cached
+        gc.collect()
+
+
+def clear_spacy_models():
+    """Evict all spacy pipelines from the cache."""
+    with _SPACY_MODELS_LOCK:
+        _SPACY_MODELS.clear()
+    gc.collect()
+
+
+def _evict_spacy_models(max_models, max_memory_mb):
+    # the most recently used model is never evicted, since it's about to be used
+    evicted = False
+    while len(_SPACY_MODELS) > 1:
+        total_mb = sum(cached['size_mb'] for cached in _SPACY_MODELS.values())
+        if ((max_models is None or len(_SPACY_MODELS) <= max_models) and
+                (max_memory_mb is None or total_mb <= max_memory_mb)):
+            break
+        lang, cached = _SPACY_MODELS.popitem(last=False)
+        logger.info(
+            'evicted spacy lang "%s" model (~%.0f MB) from cache', lang, cached['size_mb'])
+        evicted = True
+    if evicted is True:
+        gc.collect()
+
+
+def _get_rss_mb():
+    # current RSS is only available from /proc; elsewhere, fall back on peak RSS
+    try:
+        with open('/proc/self/statm', mode='rt') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (IOError, OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,190 @@
+import collections
+import itertools
+import multiprocessing
+import re
+import zlib
+
+import numpy as np
+import textacy
+
+from ..imports import iter_batches
+from ..utils import get_console_logger
+from .model_cache import get_spacy_model
+
+
+logger = get_console_logger(__name__)
+
+WORD_RE = re.compile(r'\w+', flags=re.UNICODE)
+# vector space of documents vectorized by :func:`get_fallback_vector`
+FALLBACK_VECTOR_SPACE = 'fallback'
+
+
+def iter_text_content_langs(rows, chunk_size=5000, n_jobs=1):
+    """
+    Detect the language of many documents, in chunks read lazily from ``rows``.
+
+    Args:
+        rows (Iterable[Tuple[int, str]]): (id, text content) pairs, e.g. streamed
+            from a server-side cursor
+        chunk_size (int): number of documents read from ``rows`` (and, if ``n_jobs``
+            is greater than 1, sent to a worker process) at a time
+        n_jobs (int): number of processes in which to detect languages;
+            if 1, languages are detected in this process
+
+    Yields:
+        List[Tuple[int, str]]: per chunk, (id, detected lang) pairs
+    """
+    return _imap_chunks(_detect_chunk_langs, iter_batches(rows, chunk_size), n_jobs)
+
+
+def iter_text_content_vectors(rows, vector_space='en', batch_size=256, chunk_size=5000,
+                              n_jobs=1, vector_dim=300, max_models=None, max_memory_mb=None):
+    """
+    Vectorize the text content of many documents, in chunks read lazily from ``rows``.
+    Unless ``vector_space`` is :data:`FALLBACK_VECTOR_SPACE`, it's the documents'
+    language, and they're batched through that language's spaCy ``nlp.pipe()``;
+    otherwise, documents are vectorized by :func:`get_fallback_vector`.
+
+    Args:
+        rows (Iterable[Tuple[int, str]]): (id, text content) pairs, e.g. streamed
+            from a server-side cursor
+        vector_space (str): as given by :func:`get_vector_space`
+        batch_size (int): number of documents spaCy processes together
+        chunk_size (int): number of documents read from ``rows`` (and, if ``n_jobs``
+            is greater than 1, sent to a worker process) at a time
+        n_jobs (int): number of processes in which to vectorize documents;
+            if 1, documents are vectorized in this process
+        vector_dim (int): length of document vectors
+        max_models (int): max number of spacy models cached per process
+        max_memory_mb (int): max memory held by spacy models cached per process
+
+    Yields:
+        List[Tuple[int, :class:`numpy.ndarray`]]: per chunk, (id, vector) pairs
+        for vectorized documents
+    """
+    initargs = (vector_space, batch_size, vector_dim, max_models, max_memory_mb)
+    return _imap_chunks(
+        _vectorize_chunk, iter_batches(rows, chunk_size), n_jobs,
+        initializer=_init_vectorize_worker, initargs=initargs)
+
+
+def get_vector_space(lang, vector_dim, max_models=None, max_memory_mb=None):
+    """
+    Get the vector space in which documents in ``lang`` are vectorized: ``lang``
+    itself, if a spaCy model for it is available and has word vectors of length
+    ``vector_dim``, in which case it's loaded into the process-level cache
+    (and inherited by worker processes forked later); otherwise,
+    :data:`FALLBACK_VECTOR_SPACE`. Vectors in different spaces aren't comparable.
+
+    Returns:
+        str
+    """
+    try:
+        nlp = get_spacy_model(lang, max_models=max_models, max_memory_mb=max_memory_mb)
+    except RuntimeError:
+        logger.warning(
+            'no spacy lang "%s" model available, using fallback vectors', lang)
+        return FALLBACK_VECTOR_SPACE
+    if getattr(nlp.vocab, 'vectors_length', 0) != vector_dim:
+        logger.warning(
+            'spacy lang "%s" model has no word vectors of length %s, using fallback vectors',
+            lang, vector_dim)
+        return FALLBACK_VECTOR_SPACE
+    return lang
+
+
+def get_fallback_vector(text_content, vector_dim=300):
+    """
+    Get a language-agnostic vector for ``text_content`` by hashing its words'
+    character trigrams into ``vector_dim`` buckets with random signs, then
+    scaling the result to unit length.
+
+    Args:
+        text_content (str)
+        vector_dim (int)
+
+    Returns:
+        :class:`numpy.ndarray`
+    """
+    hashes = np.fromiter(
+        (zlib.crc32(ngram.encode('utf-8'))
+         for word in WORD_RE.findall(text_content.lower())
+         for ngram in _iter_char_ngrams(' {} '.format(word), 3)),
+        dtype=np.uint32)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    vector = np.bincount(hashes % vector_dim, weights=signs, minlength=vector_dim)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.astype(np.float32)
+
+
+def _iter_char_ngrams(text, n):
+    for i in range(max(len(text) - n + 1, 1)):
+        yield text[i: i + n]
+
+
+def _imap_chunks(func, chunks, n_jobs, initializer=None, initargs=()):
+    if n_jobs > 1:
+        with multiprocessing.Pool(n_jobs, initializer=initializer, initargs=initargs) as pool:
+            # at most 2 * n_jobs chunks are in flight at a time, to bound memory use
+            pending = collections.deque()
+            while True:
+                for chunk in itertools.islice(chunks, 2 * n_jobs - len(pending)):
+                    pending.append(pool.apply_async(func, (chunk,)))
+                if not pending:
+                    break
+                yield pending.popleft().get()
+    else:
+        if initializer is not None:
+            initializer(*initargs)
+        for chunk in chunks:
+            yield func(chunk)
+
+
+def _detect_chunk_langs(chunk):
+    return [(id_, textacy.text_utils.detect_language(text_content))
+            for id_, text_content in chunk]
+
+
+# state of a process that vectorizes documents, set by its initializer
+_vectorize_worker = {}
+
+
+def _init_vectorize_worker(vector_space, batch_size, vector_dim, max_models, max_memory_mb):
+    if vector_space == FALLBACK_VECTOR_SPACE:
+        _vectorize_worker['nlp'] = None
+    else:
+        _vectorize_worker['nlp'] = get_spacy_model(
+            vector_space, max_models=max_models, max_memory_mb=max_memory_mb)
+    _vectorize_worker['batch_size'] = batch_size
+    _vectorize_worker['vector_dim'] = vector_dim
+
+
+def _vectorize_chunk(chunk):
+    """
+    Vectorize the documents in ``chunk`` with the worker's model,
+    or its fallback if the worker has none.
+
+    Returns:
+        List[Tuple[int, :class:`numpy.ndarray`]]
+    """
+    nlp = _vectorize_worker['nlp']
+    if nlp is None:
+        vector_dim = _vectorize_worker['vector_dim']
+        return [(id_, get_fallback_vector(text_content, vector_dim=vector_dim))
+                for id_, text_content in chunk]
+    try:
+        docs = nlp.pipe(
+            (text_content for _, text_content in chunk),
+            batch_size=_vectorize_worker['batch_size'])
+        vectors = [(id_, doc.vector) for (id_, _), doc in zip(chunk, docs)]
+    except Exception:
+        # fall back to one document at a time, so one bad document doesn't spoil the rest
+        vectors = []
+        for id_, text_content in chunk:
+            try:
+                vectors.append((id_, nlp(text_content).vector))
+            except Exception:
+                logger.exception('unable to tokenize text content for id=%s', id_)
+    return vectors
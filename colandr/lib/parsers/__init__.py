@@ -1,2 +1,4 @@
 from .bibtex import BibTexFile
+from .endnote import EndNoteXmlFile
+from .pubmed import PubMedXmlFile
 from .ris import RisFile
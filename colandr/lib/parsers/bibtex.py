@@ -3,8 +3,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import io
 import re
 
-import bibtexparser
-from bibtexparser.bparser import BibTexParser
 from bibtexparser.customization import convert_to_unicode, getnames
 
 from .. import utils
@@ -14,6 +12,15 @@ from .. import utils
 logger = utils.get_console_logger(__name__)
 
 WHITESPACE_RE = re.compile(r'\s+')
+ENTRY_START_RE = re.compile(r'^[ \t]*@[ \t]*(\w*)', flags=re.MULTILINE)
+ENTRY_HEAD_RE = re.compile(r'\s*@\s*([A-Za-z]+)\s*([{(])')
+BLOCK_TOKEN_RE = re.compile(r'^[ \t]*@|[{}()"]', flags=re.MULTILINE)
+FIELD_NAME_RE = re.compile(r'\s*([\w\-().+]+)\s*=\s*')
+STRING_NAME_RE = re.compile(r'[\w\-:]+')
+BRACE_RE = re.compile(r'[{}]')
+QUOTE_OR_BRACE_RE = re.compile(r'["{}]')
+NON_RECORD_ENTRY_TYPES = {'comment', 'preamble', 'string'}
+CHUNK_SIZE = 1024 * 1024
 _MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
               'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
               'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
@@ -98,9 +105,11 @@ class BibTexFile(object):
         value_sanitizers (dict or bool): mapping of default BibTex tags to functions
             that sanitize their associated values; if None (default), default sanitizers
             will be used; if False, no sanitization will be performed
+        chunk_size (int): number of characters read from the file at a time
     """
 
-    def __init__(self, path_or_stream, key_map=None, value_sanitizers=None):
+    def __init__(self, path_or_stream, key_map=None, value_sanitizers=None,
+                 chunk_size=CHUNK_SIZE):
         if isinstance(path_or_stream, io.TextIOBase):  # io.StringIO):
             self.path = None
             self.stream = path_or_stream
@@ -110,40 +119,357 @@ class BibTexFile(object):
         elif isinstance(path_or_stream, (bytes, str)):
             self.path = path_or_stream
             self.stream = None
-        self.parser = BibTexParser()
-        self.parser.ignore_nonstandard_types = False
-        self.parser.homogenize_fields = False
-        self.parser.customization = _sanitize_record
         self.key_map = (key_map if key_map is not None
                         else KEY_MAP)
         self.value_sanitizers = (value_sanitizers if value_sanitizers is not None
                                  else VALUE_SANITIZERS)
+        self.chunk_size = chunk_size
 
     def parse(self):
         """
+        Scan the file one entry at a time, so that neither memory use nor
+        time to first record grows with the size of the file.
+
         Yields:
             dict: next parsed citation record
         """
-        if not self.stream:
-            self.stream = io.open(self.path, mode='rt')
-        with self.stream as f:
-            parsed_data = bibtexparser.load(f, parser=self.parser)
-        for record in parsed_data.entries:
-            if self.value_sanitizers:
-                for key, value in record.items():
-                    try:
-                        record[key] = self.value_sanitizers[key](value)
-                    except KeyError:
-                        pass
-                    except TypeError:
-                        logger.exception(
-                            'value sanitization error: key=%s, value=%s',
-                            key, value)
-            if self.key_map:
-                for key, rekey in self.key_map.items():
-                    try:
-                        record[rekey] = record.pop(key)
-                    except KeyError:
-                        pass
-
+        strings = {}
+        for lineno, record in self._iter_records(self._iter_blocks(), strings):
             yield record
+
+    def iter_shards(self, shard_size):
+        """
+        Split the file into shards of up to ``shard_size`` complete entries,
+        each of which may be parsed independently (e.g. in another process)
+        by :meth:`BibTexFile.parse_shard()`. Since entries may refer to ``@string``
+        macros defined anywhere earlier in the file, all such definitions
+        are passed along with each shard.
+
+        Args:
+            shard_size (int)
+
+        Yields:
+            Tuple[str, int, str]: shard's text, line number in file at which
+            it starts, and the text of all ``@string`` definitions preceding it
+        """
+        macros = []
+        texts = []
+        n_entries = 0
+        shard_lineno = 0
+        for lineno, text in self._iter_blocks():
+            if not texts:
+                shard_lineno = lineno
+                shard_macros = ''.join(macros)
+            texts.append(text)
+            match = ENTRY_START_RE.match(text)
+            if match is None:
+                continue
+            entry_type = match.group(1).lower()
+            if entry_type == 'string':
+                macros.append(text)
+            elif entry_type not in NON_RECORD_ENTRY_TYPES:
+                n_entries += 1
+                if n_entries >= shard_size:
+                    yield ''.join(texts), shard_lineno, shard_macros
+                    texts = []
+                    n_entries = 0
+        if texts:
+            yield ''.join(texts), shard_lineno, shard_macros
+
+    def parse_shard(self, text, lineno=0, macros='', errors=None):
+        """
+        Parse the entries in a shard of this file, as split by :meth:`BibTexFile.iter_shards()`.
+
+        Args:
+            text (str)
+            lineno (int): line number in file at which ``text`` starts
+            macros (str): text of ``@string`` definitions used by entries in ``text``
+            errors (list): if specified, (line number, message) pairs for
+                entries that failed to parse are appended to it
+
+        Yields:
+            Tuple[int, dict]: line number in file at which an entry starts, and the record
+        """
+        strings = {}
+        for _ in self._iter_records(_split_blocks(macros, 0), strings):
+            pass
+        for item in self._iter_records(_split_blocks(text, lineno), strings, errors=errors):
+            yield item
+
+    def _iter_blocks(self):
+        """
+        Read the file in large chunks and split its text into blocks,
+        each starting with an "@" at the beginning of a line (or the start of the file).
+
+        Yields:
+            Tuple[int, str]: line number at which a block starts, and its text
+        """
+        stream = self.stream or io.open(self.path, mode='rt')
+        lineno = 0
+        buf = ''
+        with stream as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if lineno == 0 and not buf and chunk.startswith('\ufeff'):
+                    chunk = chunk[1:]
+                buf += chunk
+                if not chunk:
+                    break
+                # only the last block may be incomplete, so hold on to it
+                end_idx = _find_block_starts(buf)[-1]
+                if end_idx > 0:
+                    for block_lineno, text in _split_blocks(buf[:end_idx], lineno):
+                        yield block_lineno, text
+                    lineno += buf.count('\n', 0, end_idx)
+                    buf = buf[end_idx:]
+        if buf:
+            for block_lineno, text in _split_blocks(buf, lineno):
+                yield block_lineno, text
+
+    def _iter_records(self, blocks, strings, errors=None):
+        """
+        Parse ``blocks`` of text into citation records, skipping comments,
+        preambles and anything else that isn't an entry and adding ``@string``
+        definitions to ``strings`` as they're encountered.
+
+        Args:
+            blocks (Iterable[Tuple[int, str]])
+            strings (dict): mapping of (lowercased) macro name to its value
+            errors (list): if specified, (line number, message) pairs for
+                entries that failed to parse are appended to it
+
+        Yields:
+            Tuple[int, dict]: line number at which an entry starts, and the record
+        """
+        for lineno, text in blocks:
+            try:
+                record = _parse_block(text, strings)
+                if record is not None:
+                    record = self._sanitize_and_map(_sanitize_record(record))
+            except ValueError as e:
+                # leading whitespace counts toward the block, so find the "@"
+                lineno += text.count('\n', 0, text.find('@'))
+                logger.warning('bibtex parsing error: line %s: %s', lineno + 1, e)
+                if errors is not None:
+                    errors.append((lineno, str(e)))
+                continue
+            if record is not None:
+                lineno += text.count('\n', 0, text.find('@'))
+                yield lineno, record
+
+    def _sanitize_and_map(self, record):
+        """Sanitize values in and rekey a single parsed ``record``, in-place."""
+        if self.value_sanitizers:
+            for key, value in record.items():
+                try:
+                    record[key] = self.value_sanitizers[key](value)
+                except KeyError:
+                    pass
+                except TypeError:
+                    logger.exception(
+                        'value sanitization error: key=%s, value=%s',
+                        key, value)
+        if self.key_map:
+            for key, rekey in self.key_map.items():
+                try:
+                    record[rekey] = record.pop(key)
+                except KeyError:
+                    pass
+        return record
+
+
+def _split_blocks(text, lineno):
+    """
+    Split ``text`` into blocks that each start with an "@" at the beginning of a line
+    outside of any entry; any text before the first such line is its own block.
+
+    Yields:
+        Tuple[int, str]: line number at which a block starts, and its text
+    """
+    starts = _find_block_starts(text)
+    for start_idx, end_idx in zip(starts, starts[1:] + [len(text)]):
+        if end_idx > start_idx:
+            yield lineno, text[start_idx:end_idx]
+            lineno += text.count('\n', start_idx, end_idx)
+
+
+def _find_block_starts(text):
+    """
+    Find the positions in ``text`` at which blocks start: its beginning, plus
+    each line starting with an "@" that isn't inside a braced or quoted value
+    of the entry before it, i.e. braces and quotes are balanced up to there.
+
+    Returns:
+        List[int]
+    """
+    starts = [0]
+    closer = None  # closing delimiter of the entry being scanned, if any
+    head_end = 0
+    depth = 0
+    in_quote = False
+    for match in BLOCK_TOKEN_RE.finditer(text):
+        token = match.group()
+        if token[-1] == '@':
+            if closer is None:
+                if match.start() > 0:
+                    starts.append(match.start())
+                head = ENTRY_HEAD_RE.match(text, match.start())
+                if head is not None:
+                    closer = '}' if head.group(2) == '{' else ')'
+                    head_end = head.end()
+                    depth = 0
+                    in_quote = False
+        elif closer is None or match.start() < head_end:
+            continue
+        elif token == '{':
+            depth += 1
+        elif token == '}':
+            if depth > 0:
+                depth -= 1
+            elif closer == '}':
+                closer = None
+        elif token == '"':
+            # quotes only delimit values outside of braces; within them, they're literal
+            if depth == 0:
+                in_quote = not in_quote
+        elif token == ')':
+            if closer == ')' and depth == 0 and in_quote is False:
+                closer = None
+    return starts
+
+
+def _parse_block(text, strings):
+    """
+    Parse a single block of text, as split by :func:`_split_blocks()`.
+
+    Args:
+        text (str)
+        strings (dict): mapping of (lowercased) macro name to its value,
+            which is updated if ``text`` is a ``@string`` definition
+
+    Returns:
+        dict: raw entry, with lowercased field names plus "ENTRYTYPE" and "ID"
+        keys, or None if ``text`` isn't an entry
+
+    Raises:
+        ValueError: if ``text`` is a badly-formed entry
+    """
+    match = ENTRY_HEAD_RE.match(text)
+    if match is None:
+        return None  # just an implicit comment
+    entry_type = match.group(1).lower()
+    if entry_type in ('comment', 'preamble'):
+        return None
+    closer = '}' if match.group(2) == '{' else ')'
+    pos = match.end()
+
+    if entry_type == 'string':
+        name_match = FIELD_NAME_RE.match(text, pos)
+        if name_match is None or not STRING_NAME_RE.fullmatch(name_match.group(1)):
+            raise ValueError('badly-formed @string definition')
+        value, pos = _parse_value(text, name_match.end(), strings, False)
+        _expect(text, pos, closer)
+        strings[name_match.group(1).lower()] = value
+        return None
+
+    # everything up to the first comma is the entry's id
+    key_end = text.find(',', pos)
+    if key_end < 0:
+        raise ValueError('no fields found in @{} entry'.format(entry_type))
+    key = text[pos:key_end].strip()
+    if not key or WHITESPACE_RE.search(key):
+        raise ValueError('invalid key in @{} entry: "{}"'.format(entry_type, key))
+    entry = {}
+    pos = key_end + 1
+    while True:
+        field_match = FIELD_NAME_RE.match(text, pos)
+        if field_match is None:
+            break
+        value, pos = _parse_value(text, field_match.end(), strings, True)
+        # if a field is given more than once, its first value wins
+        field = field_match.group(1).lower()
+        if field not in entry:
+            entry[field] = value if value != '{}' else ''
+        pos = _skip_whitespace(text, pos)
+        if text.startswith(',', pos):
+            pos += 1
+        else:
+            break
+    _expect(text, pos, closer)
+    entry['ENTRYTYPE'] = entry_type
+    entry['ID'] = key
+    return entry
+
+
+def _parse_value(text, pos, strings, strip_lines):
+    """
+    Parse a field value starting at ``pos`` in ``text``: one or more braced,
+    quoted, numeric or macro values concatenated by "#".
+
+    Returns:
+        Tuple[str, int]: value, and position in ``text`` just past it
+    """
+    pieces = []
+    while True:
+        pos = _skip_whitespace(text, pos)
+        char = text[pos:pos + 1]
+        if char == '{' or char == '"':
+            end = _find_closing(text, pos + 1, char)
+            piece = text[pos + 1:end]
+            if strip_lines is True:
+                piece = _strip_after_newlines(piece)
+        else:
+            match = STRING_NAME_RE.match(text, pos)
+            if match is None:
+                raise ValueError('expected a value at position {}'.format(pos))
+            end = match.end() - 1
+            name = match.group()
+            # undefined macros (e.g. month abbreviations) are kept as-is
+            piece = name if name.isdigit() else strings.get(name.lower(), name)
+        pieces.append(piece)
+        pos = _skip_whitespace(text, end + 1)
+        if text.startswith('#', pos):
+            pos += 1
+        else:
+            return ''.join(pieces), pos
+
+
+def _find_closing(text, pos, opener):
+    """
+    Find the index of the brace or quote closing a value whose ``opener``
+    precedes ``pos`` in ``text``, accounting for nested braces.
+    """
+    depth = 0
+    for match in (BRACE_RE if opener == '{' else QUOTE_OR_BRACE_RE).finditer(text, pos):
+        char = match.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if depth == 0:
+                if opener == '{':
+                    return match.start()
+                break
+            depth -= 1
+        elif depth == 0:
+            return match.start()
+    raise ValueError('unbalanced braces or quotes in value at position {}'.format(pos))
+
+
+def _skip_whitespace(text, pos):
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _expect(text, pos, closer):
+    pos = _skip_whitespace(text, pos)
+    if not text.startswith(closer, pos):
+        raise ValueError('expected "{}" at position {}'.format(closer, pos))
+
+
+def _strip_after_newlines(value):
+    """Strip leading whitespace from all but the first line in ``value``."""
+    lines = value.splitlines()
+    if len(lines) > 1:
+        lines = [lines[0]] + [line.lstrip() for line in lines[1:]]
+    return '\n'.join(lines)
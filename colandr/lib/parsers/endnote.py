@@ -0,0 +1,170 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import re
+
+from .xml_base import XmlFile, get_text, get_texts, parse_month, parse_year
+
+
+# EndNote XML, as exported from EndNote via File > Export... > XML
+SNIFF_RE = re.compile(r'<xml>\s*<records>|<records>\s*<record[\s>]')
+ISSN_RE = re.compile(r'\b\d{4}-?\d{3}[\dXx]\b')
+
+KEY_MAP = {
+    'titles/title': 'title',
+    'titles/secondary-title': 'secondary_title',
+    'titles/tertiary-title': 'tertiary_title',
+    'titles/alt-title': 'alt_title',
+    'titles/short-title': 'short_title',
+    'titles/translated-title': 'translated_title',
+    'periodical/full-title': 'journal_name',
+    'periodical/abbr-1': 'journal_name_abbr',
+    'abstract': 'abstract',
+    'accession-num': 'accession_number',
+    'call-num': 'call_number',
+    'custom1': 'custom_1',
+    'custom2': 'custom_2',
+    'custom3': 'custom_3',
+    'custom4': 'custom_4',
+    'custom5': 'custom_5',
+    'custom6': 'custom_6',
+    'custom7': 'custom_7',
+    'edition': 'edition',
+    'electronic-resource-num': 'doi',
+    'label': 'label',
+    'language': 'language',
+    'num-vols': 'number_of_volumes',
+    'orig-pub': 'original_publication',
+    'pages': 'pages',
+    'pub-location': 'place_published',
+    'publisher': 'publisher',
+    'remote-database-name': 'name_of_database',
+    'remote-database-provider': 'database_provider',
+    'research-notes': 'research_notes',
+    'section': 'section',
+    'volume': 'volume',
+    'work-type': 'type_of_work',
+    }
+
+CONTRIBUTORS_KEY_MAP = {
+    'contributors/authors/author': 'authors',
+    'contributors/secondary-authors/author': 'secondary_authors',
+    'contributors/tertiary-authors/author': 'tertiary_authors',
+    'contributors/subsidiary-authors/author': 'subsidiary_authors',
+    'contributors/translated-authors/author': 'translated_author',
+    }
+
+# EndNote reference type names, mapped to the same values as RIS reference types
+REFERENCE_TYPES_MAPPING = {
+    'Aggregated Database': 'aggregated database',
+    'Ancient Text': 'ancient text',
+    'Artwork': 'art work',
+    'Audiovisual Material': 'audiovisual material',
+    'Bill': 'bill/resolution',
+    'Blog': 'blog',
+    'Book': 'book',
+    'Book Section': 'book chapter',
+    'Case': 'case',
+    'Catalog': 'catalog',
+    'Chart or Table': 'chart',
+    'Classical Work': 'classical cork',
+    'Computer Program': 'computer program',
+    'Conference Paper': 'conference paper',
+    'Conference Proceedings': 'conference proceeding',
+    'Dataset': 'data file',
+    'Dictionary': 'dictionary',
+    'Edited Book': 'edited book',
+    'Electronic Article': 'electronic article',
+    'Electronic Book': 'electronic book',
+    'Electronic Book Section': 'electronic book chapter',
+    'Encyclopedia': 'encyclopedia',
+    'Equation': 'equation',
+    'Figure': 'figure',
+    'Film or Broadcast': 'motion picture',
+    'Generic': 'generic',
+    'Government Document': 'government document',
+    'Grant': 'grant',
+    'Hearing': 'hearing',
+    'Journal Article': 'journal',
+    'Legal Rule or Regulation': 'legal rule or regulation',
+    'Magazine Article': 'magazine article',
+    'Manuscript': 'manuscript',
+    'Map': 'map',
+    'Music': 'music score',
+    'Newspaper Article': 'newspaper',
+    'Online Database': 'online database',
+    'Online Multimedia': 'online multimedia',
+    'Pamphlet': 'pamphlet',
+    'Patent': 'patent',
+    'Personal Communication': 'personal communication',
+    'Report': 'report',
+    'Serial': 'serial publication',
+    'Standard': 'standard',
+    'Statute': 'statute',
+    'Thesis': 'thesis/dissertation',
+    'Unpublished Work': 'unpublished work',
+    'Unused 1': 'generic',
+    'Web Page': 'web page',
+    }
+
+
+class EndNoteXmlFile(XmlFile):
+    """
+    Parse EndNote XML files (``<xml><records>``) into the same records
+    as :class:`RisFile` gives for equivalent RIS files.
+
+    Args:
+        path_or_stream (str or io stream): EndNote XML file to be parsed, either as its
+            path on disk or as a stream of data
+        chunk_size (int): number of characters (or bytes) read from the file at a time
+    """
+
+    RECORD_TAGS = ('record',)
+    SNIFF_RE = SNIFF_RE
+
+    def _parse_record(self, elem):
+        record = {key: get_text(elem, path) for path, key in KEY_MAP.items()}
+        for path, key in CONTRIBUTORS_KEY_MAP.items():
+            record[key] = tuple(sorted(get_texts(elem, path)))
+
+        ref_type = elem.find('ref-type')
+        if ref_type is not None and ref_type.get('name'):
+            name = ref_type.get('name')
+            record['type_of_reference'] = REFERENCE_TYPES_MAPPING.get(name, name.lower())
+
+        # for journal articles, EndNote puts the issue in "number"
+        record['issue_number'] = get_text(elem, 'number') or get_text(elem, 'issue')
+        record['pub_year'] = parse_year(get_text(elem, 'dates/year'))
+        date = get_text(elem, 'dates/pub-dates/date')
+        if date:
+            record['date'] = date
+            record['pub_month'] = parse_month(date.split(' ')[0].split('-')[0])
+        record['keywords'] = tuple(sorted(get_texts(elem, 'keywords/keyword')))
+        notes = get_text(elem, 'notes')
+        if notes:
+            record['notes'] = (notes,)
+        address = get_text(elem, 'auth-address')
+        if address:
+            record['author_addresses'] = tuple(sorted(line.strip() for line in address.split('\n')
+                                                      if line.strip()))
+        urls = get_texts(elem, 'urls/related-urls/url')
+        if urls:
+            record['url'] = urls[0]
+        pdf_urls = get_texts(elem, 'urls/pdf-urls/url')
+        if pdf_urls:
+            record['link_to_pdf'] = pdf_urls[0]
+
+        # EndNote keeps both ISSNs and ISBNs in "isbn"
+        isbn = get_text(elem, 'isbn')
+        if isbn:
+            match = ISSN_RE.search(isbn)
+            if match and record.get('type_of_reference') == 'journal':
+                record['issn'] = match.group(0)
+            else:
+                record['isbn'] = isbn
+
+        if not record.get('journal_name'):
+            record['journal_name'] = record.get('journal_name_abbr')
+        if not record.get('journal_name') and record.get('type_of_reference') == 'journal':
+            record['journal_name'] = record.get('secondary_title')
+
+        return {key: value for key, value in record.items() if value}
@@ -0,0 +1,157 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import re
+
+from .xml_base import XmlFile, get_text, get_texts, parse_month, parse_year
+
+
+# PubMed/MEDLINE XML, as exported from pubmed.gov or fetched via E-utilities
+SNIFF_RE = re.compile(r'<!DOCTYPE\s+PubmedArticleSet|<Pubmed(?:Book)?Article(?:Set)?[\s>]')
+
+
+def _get_author(elem):
+    name = get_text(elem, 'CollectiveName')
+    if name:
+        return name
+    last_name = get_text(elem, 'LastName')
+    if not last_name:
+        return None
+    name_parts = [last_name]
+    first_name = get_text(elem, 'ForeName') or get_text(elem, 'Initials')
+    if first_name:
+        name_parts.append(first_name)
+    suffix = get_text(elem, 'Suffix')
+    if suffix:
+        name_parts.append(suffix)
+    return ', '.join(name_parts)
+
+
+def _get_abstract(elem):
+    """Join an abstract's (possibly labeled) sections, e.g. "BACKGROUND: ...", into one."""
+    sections = []
+    for section in elem.iterfind('Abstract/AbstractText'):
+        text = get_text(section)
+        if not text:
+            continue
+        label = section.get('Label')
+        sections.append('{}: {}'.format(label, text) if label else text)
+    return ' '.join(sections) or None
+
+
+def _get_article_ids(elem):
+    return {item.get('IdType'): get_text(item)
+            for item in elem.iterfind('ArticleIdList/ArticleId')}
+
+
+class PubMedXmlFile(XmlFile):
+    """
+    Parse PubMed XML files (``<PubmedArticleSet>``) into the same records
+    as :class:`RisFile` gives for equivalent RIS files.
+
+    Args:
+        path_or_stream (str or io stream): PubMed XML file to be parsed, either as its
+            path on disk or as a stream of data
+        chunk_size (int): number of characters (or bytes) read from the file at a time
+    """
+
+    RECORD_TAGS = ('PubmedArticle', 'PubmedBookArticle')
+    SNIFF_RE = SNIFF_RE
+
+    def _parse_record(self, elem):
+        if elem.tag == 'PubmedBookArticle':
+            return self._parse_book_record(elem)
+        citation = elem.find('MedlineCitation')
+        if citation is None:
+            return None
+        article = citation.find('Article')
+        if article is None:
+            return None
+        record = {'type_of_reference': 'journal'}
+
+        pmid = get_text(citation, 'PMID')
+        if pmid and pmid.isdigit():
+            record['pubmed_id'] = int(pmid)
+        record['title'] = get_text(article, 'ArticleTitle') or get_text(article, 'VernacularTitle')
+        record['abstract'] = _get_abstract(article)
+        record['authors'] = tuple(sorted(
+            author for author in (_get_author(item) for item in article.iterfind('AuthorList/Author')
+                                  if item.get('ValidYN') != 'N')
+            if author))
+
+        journal = article.find('Journal')
+        if journal is not None:
+            record['journal_name'] = get_text(journal, 'Title')
+            record['journal_name_abbr'] = get_text(journal, 'ISOAbbreviation')
+            record['issn'] = get_text(journal, 'ISSN')
+            record['volume'] = get_text(journal, 'JournalIssue/Volume')
+            record['issue_number'] = get_text(journal, 'JournalIssue/Issue')
+            pub_date = journal.find('JournalIssue/PubDate')
+            if pub_date is not None:
+                medline_date = get_text(pub_date, 'MedlineDate')
+                record['pub_year'] = parse_year(get_text(pub_date, 'Year') or medline_date)
+                month = get_text(pub_date, 'Month')
+                if not month and medline_date:
+                    month = medline_date[4:].strip().split(' ')[0]
+                record['pub_month'] = parse_month(month)
+        if not record.get('pub_year'):
+            record['pub_year'] = parse_year(get_text(article, 'ArticleDate/Year'))
+
+        record['pages'] = get_text(article, 'Pagination/MedlinePgn')
+        record['language'] = get_text(article, 'Language')
+        record['publication_type'] = tuple(get_texts(article, 'PublicationTypeList/PublicationType'))
+        record['keywords'] = tuple(sorted(set(
+            get_texts(citation, 'KeywordList/Keyword') +
+            get_texts(citation, 'MeshHeadingList/MeshHeading/DescriptorName'))))
+
+        article_ids = {}
+        pubmed_data = elem.find('PubmedData')
+        if pubmed_data is not None:
+            article_ids = _get_article_ids(pubmed_data)
+        record['doi'] = article_ids.get('doi')
+        if not record['doi']:
+            for location_id in article.iterfind('ELocationID'):
+                if location_id.get('EIdType') == 'doi':
+                    record['doi'] = get_text(location_id)
+                    break
+        record['pmc_id'] = article_ids.get('pmc')
+
+        return {key: value for key, value in record.items() if value}
+
+    def _parse_book_record(self, elem):
+        document = elem.find('BookDocument')
+        if document is None:
+            return None
+        book = document.find('Book')
+        chapter_title = get_text(document, 'ArticleTitle')
+        book_title = get_text(book, 'BookTitle')
+        record = {'type_of_reference': 'book chapter' if chapter_title else 'book'}
+
+        pmid = get_text(document, 'PMID')
+        if pmid and pmid.isdigit():
+            record['pubmed_id'] = int(pmid)
+        record['title'] = chapter_title or book_title
+        if chapter_title:
+            record['secondary_title'] = book_title
+        record['abstract'] = _get_abstract(document)
+        record['authors'] = tuple(sorted(
+            author for author in (_get_author(item) for item in document.iterfind('AuthorList/Author'))
+            if author))
+        if book is not None:
+            record['editors'] = tuple(sorted(
+                author for author in (_get_author(item) for item in book.iterfind('AuthorList/Author'))
+                if author))
+            record['publisher'] = get_text(book, 'Publisher/PublisherName')
+            record['place_published'] = get_text(book, 'Publisher/PublisherLocation')
+            record['pub_year'] = parse_year(get_text(book, 'PubDate/Year'))
+            record['pub_month'] = parse_month(get_text(book, 'PubDate/Month'))
+            record['isbn'] = get_text(book, 'Isbn')
+        record['language'] = get_text(document, 'Language')
+        record['keywords'] = tuple(sorted(set(get_texts(document, 'KeywordList/Keyword'))))
+
+        article_ids = _get_article_ids(document)
+        pubmed_data = elem.find('PubmedBookData')
+        if pubmed_data is not None:
+            article_ids.update(_get_article_ids(pubmed_data))
+        record['doi'] = article_ids.get('doi')
+
+        return {key: value for key, value in record.items() if value}
@@ -1,5 +1,8 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import codecs
+import datetime
+import functools
 import io
 import re
 
@@ -201,6 +204,18 @@ TITLE_TAGS = ('T1', 'T2', 'T3', 'ST', 'TT')
 TAGv1_RE = re.compile(r'^(?P<tag>[A-Z][A-Z0-9])(  - )')
 TAGv2_RE = re.compile(r'^(?P<tag>[A-Z][A-Z0-9])( )|^(?P<endtag>E[FR])(\s?$)')
 ISSN_RE = re.compile(r'^[\w-]+$|(?<=\b)([\w-]+)(?=\s\(ISSN\))', flags=re.IGNORECASE)
+DATE_RE = re.compile(r'^(\d{4})[/-](\d{1,2})[/-](\d{1,2})$')
+
+# single-pass line scanners for each tag format, which split every line into
+# (full line, tag, end tag, value); tag and end tag are empty for untagged lines
+LINEv1_RE = re.compile(r'^((?:([A-Z][A-Z0-9])  -(?: |$))?()(.*))$', flags=re.MULTILINE)
+LINEv2_RE = re.compile(r'^((?:([A-Z][A-Z0-9]) |(E[FR])(?=\s?$))?(.*))$', flags=re.MULTILINE)
+# end-of-record lines for each tag format, used to split text into raw records
+ENDv1_RE = re.compile(r'^ER  -(?: [^\n]*)?\n', flags=re.MULTILINE)
+ENDv2_RE = re.compile(r'^ER(?: [^\n]*|[ \t\f\v]?)\n', flags=re.MULTILINE)
+
+# number of characters read from file at a time
+CHUNK_SIZE = 1024 * 1024
 
 _MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
               'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
@@ -238,8 +253,39 @@ def _check_isbn_value(value):
         return num % 10 == 0
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_date(value):
+    """
+    Parse ``value`` into a datetime, with a fast path for the common
+    YYYY/MM/DD and YYYY-MM-DD shapes; results are memoized, since the same
+    dates recur over and over again in exported files.
+    """
+    match = DATE_RE.match(value)
+    if match:
+        try:
+            return datetime.datetime(*(int(item) for item in match.groups()))
+        except ValueError:
+            pass
+    return parse_date(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _sanitize_da_tag(value):
+    return _parse_date(value).strftime('%Y-%m-%d')
+
+
+@functools.lru_cache(maxsize=4096)
+def _sanitize_y1_tag(value):
+    return _parse_date('-'.join(item if item else '01' for item in value[:-1].split('/')))
+
+
+@functools.lru_cache(maxsize=4096)
+def _sanitize_y2_tag(value):
+    return min(_parse_date(val) for val in value.split(' through '))
+
+
 VALUE_SANITIZERS = {
-    'DA': lambda x: parse_date(x).strftime('%Y-%m-%d'),
+    'DA': _sanitize_da_tag,
     'PD': _sanitize_pd_tag,
     'M3': lambda x: x.lower(),
     'PM': int,
@@ -247,8 +293,8 @@ VALUE_SANITIZERS = {
     'SN': _sanitize_sn_tag,
     'TC': int,
     'TY': lambda x: REFERENCE_TYPES_MAPPING.get(x, x),
-    'Y1': lambda x: parse_date('-'.join(item if item else '01' for item in x[:-1].split('/'))),
-    'Y2': lambda x: min(parse_date(val) for val in x.split(' through ')),
+    'Y1': _sanitize_y1_tag,
+    'Y2': _sanitize_y2_tag,
     }
 
 
@@ -262,17 +308,16 @@ class RisFile(object):
         value_sanitizers (dict or bool): mapping of short RIS tags to functions
             that sanitize their associated values; if None (default), default
             sanitizers will be used; if False, no sanitization will be performed
+        chunk_size (int): number of characters (or bytes) read from the file at a time
     """
 
     def __init__(self, path_or_stream,
                  key_map=None,
-                 value_sanitizers=None):
-        if isinstance(path_or_stream, io.TextIOBase):  # io.StringIO):
+                 value_sanitizers=None,
+                 chunk_size=CHUNK_SIZE):
+        if isinstance(path_or_stream, io.IOBase):  # text or binary stream
             self.path = None
             self.stream = path_or_stream
-        elif isinstance(path_or_stream, io.IOBase):  # (io.BytesIO, io.BufferedRandom)):
-            self.path = None
-            self.stream = io.TextIOWrapper(path_or_stream)  # , encoding='utf8')
         elif isinstance(path_or_stream, (bytes, str)):
             self.path = path_or_stream
             self.stream = None
@@ -282,6 +327,7 @@ class RisFile(object):
                         else KEY_MAP)
         self.value_sanitizers = (value_sanitizers if value_sanitizers is not None
                                  else VALUE_SANITIZERS)
+        self.chunk_size = chunk_size
         if self.key_map:
             self.multi_keys = {self.key_map.get(tag, tag) for tag in MULTI_TAGS}
             self.split_keys = {self.key_map.get(tag, tag) for tag in ('SC', 'WC')}
@@ -296,7 +342,9 @@ class RisFile(object):
             self.title_keys = TITLE_TAGS
         self.in_record = False
         self.tag_re = None
-        self.prev_line_len = None
+        self.line_re = None
+        self.end_re = None
+        self.prev_line_len = 0
         self.prev_tag = None
         self.record = {}
 
@@ -308,194 +356,361 @@ class RisFile(object):
         Raises:
             IOError
         """
-        if not self.stream:
-            self.stream = io.open(self.path, mode='rt')
-        with self.stream as f:
-            for i, line in enumerate(f):
+        for lineno, text in self._iter_raw_records():
+            record = self._parse_record(text, lineno)
+            if record is not None:
+                yield record
 
-                # get rid of byte order mark (BOM)
-                if i == 0 and line.startswith('\ufeff'):
-                    line = line[1:]
+    def iter_shards(self, shard_size):
+        """
+        Split the file into shards of up to ``shard_size`` complete records,
+        each of which may be parsed independently (e.g. in another process)
+        by :meth:`RisFile.parse_shard()`.
 
-                # skip empty lines
-                if not line.strip():
-                    continue
+        Args:
+            shard_size (int)
 
-                # automatically detect regex needed for this RIS file
-                if self.tag_re is None:
-                    if TAGv1_RE.match(line):
-                        self.tag_re = TAGv1_RE
-                    elif TAGv2_RE.match(line):
-                        self.tag_re = TAGv2_RE
-                    else:
-                        msg = 'tags in file {}, lineno {}, line {} not formatted as expected!'.format(self.path, i, line)
-                        logger.error(msg)
-                        raise IOError(msg)
+        Yields:
+            Tuple[str, int]: shard's text, and line number in file at which it starts
 
-                tag_match = self.tag_re.match(line)
-                # lines starts with a tag
-                if tag_match:
+        Raises:
+            IOError
+        """
+        texts = []
+        shard_lineno = 0
+        for lineno, text in self._iter_raw_records():
+            if not texts:
+                shard_lineno = lineno
+            texts.append(text)
+            if len(texts) >= shard_size:
+                yield ''.join(texts), shard_lineno
+                texts = []
+        if texts:
+            yield ''.join(texts), shard_lineno
+
+    def parse_shard(self, text, lineno=0, errors=None):
+        """
+        Parse the records in a shard of this file, as split by :meth:`RisFile.iter_shards()`.
+        Unlike :meth:`RisFile.parse()`, a badly-formed record is skipped
+        rather than stopping the parse of all subsequent records.
 
-                    tag = tag_match.group('tag') or tag_match.group('endtag')
+        Args:
+            text (str)
+            lineno (int): line number in file at which ``text`` starts
+            errors (list): if specified, (line number, message) pairs for
+                records that failed to parse are appended to it
 
-                    if tag in IGNORE_TAGS:
-                        self._stash_prev_info(tag, len(line))
-                        continue
+        Yields:
+            Tuple[int, dict]: line number in file at which a record starts, and the record
 
-                    elif tag == END_TAG:
-                        if self.in_record is False:
-                            msg = 'found end tag, but not in a record!\nline: {} {}'.format(i, line.strip())
-                            logger.error(msg)
-                            raise IOError(msg)
+        Raises:
+            IOError: if the file's tag format can't be detected from ``text``
+        """
+        if self.tag_re is None:
+            self._detect_tag_format(text + '\n')
+        start_idx = 0
+        end_idxs = [match.end() for match in self.end_re.finditer(text)]
+        if not end_idxs or end_idxs[-1] < len(text):
+            end_idxs.append(len(text))
+        for end_idx in end_idxs:
+            record_text = text[start_idx:end_idx]
+            # skip over any leading blank lines to where the record actually starts
+            record_lineno = lineno + record_text[:len(record_text) - len(record_text.lstrip())].count('\n')
+            try:
+                record = self._parse_record(record_text, lineno)
+            except IOError as e:
+                self.in_record = False
+                self.prev_tag = None
+                self.record = {}
+                if errors is not None:
+                    errors.append((record_lineno, str(e)))
+            else:
+                if record is not None:
+                    yield record_lineno, record
+            lineno += record_text.count('\n')
+            start_idx = end_idx
+
+    def _iter_text_chunks(self):
+        """
+        Read the file in large chunks, decoding bytes as needed.
 
-                        self._sort_multi_values()
-                        self._sanitize_record()
-                        yield self.record  # record is complete! spit it out here
+        Yields:
+            str
+        """
+        stream = self.stream or io.open(self.path, mode='rb')
+        decoder = None
+        with stream as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                if isinstance(chunk, bytes):
+                    if decoder is None:
+                        decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+                    chunk = decoder.decode(chunk)
+                yield chunk
+            if decoder is not None:
+                chunk = decoder.decode(b'', final=True)
+                if chunk:
+                    yield chunk
+
+    def _iter_raw_records(self):
+        """
+        Split the file's text into raw records on end tag lines, in bulk,
+        detecting the file's tag format along the way.
 
-                        self.in_record = False
-                        self.record = {}
-                        self._stash_prev_info(tag, len(line))
-                        continue
+        Yields:
+            Tuple[int, str]: line number at which a raw record starts, and its text
+                (including any preceding non-record lines) up through its end tag
+        """
+        lineno = 0
+        buf = ''
+        for i, chunk in enumerate(self._iter_text_chunks()):
+            # get rid of byte order mark (BOM), and normalize newlines
+            if i == 0 and chunk.startswith('\ufeff'):
+                chunk = chunk[1:]
+            buf += chunk
+            if buf.endswith('\r'):  # hold on, this may be the first half of '\r\n'
+                buf, carry = buf[:-1], '\r'
+            else:
+                carry = ''
+            if '\r' in buf:
+                buf = buf.replace('\r\n', '\n').replace('\r', '\n')
+            if self.tag_re is None and self._detect_tag_format(buf) is False:
+                buf += carry
+                continue
+            end_idx = self._rfind_record_end(buf)
+            if end_idx > 0:
+                records_text, buf = buf[:end_idx], buf[end_idx:]
+                start_idx = 0
+                for match in self.end_re.finditer(records_text):
+                    text = records_text[start_idx:match.end()]
+                    yield lineno, text
+                    lineno += text.count('\n')
+                    start_idx = match.end()
+            buf += carry
+        if buf.strip():
+            if self.tag_re is None:
+                self._detect_tag_format(buf + '\n')
+            yield lineno, buf.replace('\r', '\n')
+
+    def _detect_tag_format(self, text):
+        """
+        Automatically detect the tag format of this RIS file from the first
+        non-empty line in ``text``, and set the regexes needed to parse it.
 
-                    elif tag in START_TAGS:
-                        if self.in_record is True:
-                            msg = 'found start tag, but already in a record!\nline: {} {}'.format(i, line.strip())
-                            logger.error(msg)
-                            raise IOError(msg)
-                        self.in_record = True
-                        self._add_tag_line(tag, line, tag_match.end())
-                        self._stash_prev_info(tag, len(line))
-                        continue
+        Returns:
+            bool: True if format was detected, False if there were no complete,
+            non-empty lines in ``text`` to detect it from
 
-                    if self.in_record is False:
-                        msg = 'start/end tag mismatch!\nline: {} {}'.format(i, line.strip())
-                        logger.error(msg)
-                        raise IOError(msg)
+        Raises:
+            IOError: if the first non-empty line is not formatted as expected
+        """
+        for i, line in enumerate(text.split('\n')[:-1]):
+            if not line.strip():
+                continue
+            if TAGv1_RE.match(line):
+                self.tag_re, self.line_re, self.end_re = TAGv1_RE, LINEv1_RE, ENDv1_RE
+            elif TAGv2_RE.match(line):
+                self.tag_re, self.line_re, self.end_re = TAGv2_RE, LINEv2_RE, ENDv2_RE
+            else:
+                msg = 'tags in file {}, lineno {}, line {} not formatted as expected!'.format(self.path, i, line)
+                logger.error(msg)
+                raise IOError(msg)
+            return True
+        return False
+
+    def _rfind_record_end(self, text):
+        """
+        Get the index in ``text`` just past the last complete end tag line,
+        or -1 if no such line exists.
+        """
+        idx = len(text)
+        while True:
+            idx = text.rfind('\nER', 0, idx)
+            if idx < 0:
+                return -1
+            match = self.end_re.match(text, idx + 1)
+            if match:
+                return match.end()
+
+    def _parse_record(self, text, lineno=0):
+        """
+        Parse the lines in a single raw record's ``text``, as split by
+        :meth:`RisFile._iter_raw_records()`.
 
-                    if self.key_map and tag in self.key_map:
-                        self._add_tag_line(tag, line, tag_match.end())
-                        self._stash_prev_info(tag, len(line))
-                        continue
+        Args:
+            text (str)
+            lineno (int): line number in file at which ``text`` starts
 
-                    # multi-value tag line happens to start with a tag-compliant string
-                    if self.prev_tag in MULTI_TAGS:
-                        self._add_tag_line(self.prev_tag, line, 0)
-                        continue
+        Returns:
+            dict: complete citation record, or None if ``text`` doesn't end one
 
-                    # no idea what this is, but might as well save it
-                    logger.debug('unknown tag: tag=%s, line=%s "%s"', tag, i, line.strip())
-                    self.record[tag] = line[tag_match.end():].strip()
-                    self._stash_prev_info(tag, len(line))
+        Raises:
+            IOError
+        """
+        key_map = self.key_map
+        value_sanitizers = self.value_sanitizers or {}
+        in_record = self.in_record
+        prev_tag = self.prev_tag
+        prev_line_len = self.prev_line_len
+        record = self.record
+        complete_record = None
+
+        for i, (line, tag, endtag, value) in enumerate(self.line_re.findall(text), lineno):
+
+            # line starts with a tag
+            if tag or endtag:
+                tag = tag or endtag
+
+                if tag in IGNORE_TAGS:
+                    prev_tag, prev_line_len = tag, len(line) + 1
                     continue
 
-                # subsequent line belonging to a multi-value tag
-                elif self.prev_tag in MULTI_TAGS:
-                    self._add_tag_line(self.prev_tag, line, 0)
+                elif tag == END_TAG:
+                    if in_record is False:
+                        msg = 'found end tag, but not in a record!\nline: {} {}'.format(i, line.strip())
+                        logger.error(msg)
+                        raise IOError(msg)
+                    self._sort_multi_values(record)
+                    self._sanitize_record(record)
+                    complete_record = record  # record is complete! spit it out below
+                    in_record = False
+                    record = {}
+                    prev_tag, prev_line_len = tag, len(line) + 1
                     continue
 
-                # single-value tag split across multiple lines, ugh
-                elif line.startswith('   ') or self.prev_line_len > 70:
-                    key = (self.key_map.get(self.prev_tag, self.prev_tag) if self.key_map
-                           else self.prev_tag)
-                    self.record[key] += ' ' + line.strip()
-
-                # HACK: badly formed SN tags that also contain an isbn
-                elif self.prev_tag == 'SN'and _check_isbn_value(line.strip()) is True:
-                    self.record['BN'] = line.strip()
+                elif tag in START_TAGS:
+                    if in_record is True:
+                        msg = 'found start tag, but already in a record!\nline: {} {}'.format(i, line.strip())
+                        logger.error(msg)
+                        raise IOError(msg)
+                    in_record = True
 
-                else:
-                    logger.error(
-                        'bad line: prev_tag=%s, line=%s "%s"',
-                        self.prev_tag, i, line.strip())
+                elif in_record is False:
+                    msg = 'start/end tag mismatch!\nline: {} {}'.format(i, line.strip())
+                    logger.error(msg)
+                    raise IOError(msg)
 
-    def _add_tag_line(self, tag, line, start_idx):
-        """
-        Args:
-            tag (str)
-            line (str)
-            start_idx (int)
-        """
-        key = (self.key_map[tag] if self.key_map
-               else tag)
-        value = line[start_idx:].strip()
-        # try to sanitize value, but don't sweat failure
-        try:
-            value = self.value_sanitizers[tag](value)
-        except KeyError:
-            pass
-        except Exception:
-            logger.exception(
-                'value sanitization error: key=%s, value=%s',
-                key, value)
-        # for multi-value tags, append to a list
-        if tag in MULTI_TAGS:
-            try:
-                self.record[key].append(value)
-            except KeyError:
-                self.record[key] = [value]
-        # otherwise, add key:value to record
-        else:
-            if key in self.record:
-                logger.error('duplicate key error: key=%s, value=%s', key, value)
-            self.record[key] = value
+                elif not (key_map and tag in key_map):
+                    # multi-value tag line happens to start with a tag-compliant string
+                    if prev_tag in MULTI_TAGS:
+                        tag = None
+                    # no idea what this is, but might as well save it
+                    else:
+                        logger.debug('unknown tag: tag=%s, line=%s "%s"', tag, i, line.strip())
+                        record[tag] = value.strip()
+                        prev_tag, prev_line_len = tag, len(line) + 1
+                        continue
 
-    def _stash_prev_info(self, tag, line_len):
-        """
-        Args:
-            tag (str)
-            line_len (int)
-        """
-        self.prev_tag = tag
-        self.prev_line_len = line_len
+            # skip empty lines
+            elif not line.strip():
+                continue
 
-    def _sort_multi_values(self):
+            # single-value tag split across multiple lines, ugh
+            elif prev_tag not in MULTI_TAGS and (line.startswith('   ') or prev_line_len > 70):
+                key = key_map.get(prev_tag, prev_tag) if key_map else prev_tag
+                try:
+                    record[key] += ' ' + line.strip()
+                except (KeyError, TypeError):
+                    logger.error(
+                        'bad line: prev_tag=%s, line=%s "%s"', prev_tag, i, line.strip())
+                continue
+
+            # HACK: badly formed SN tags that also contain an isbn
+            elif prev_tag == 'SN' and _check_isbn_value(line.strip()) is True:
+                record['BN'] = line.strip()
+                continue
+
+            elif prev_tag not in MULTI_TAGS:
+                logger.error(
+                    'bad line: prev_tag=%s, line=%s "%s"', prev_tag, i, line.strip())
+                continue
+
+            # subsequent line belonging to a multi-value tag
+            if not tag:
+                tag = prev_tag
+                value = line
+            else:
+                prev_tag, prev_line_len = tag, len(line) + 1
+
+            # add tag's value to record, after trying to sanitize it
+            key = key_map[tag] if key_map else tag
+            value = value.strip()
+            sanitize_value = value_sanitizers.get(tag)
+            if sanitize_value is not None:
+                # don't sweat failure
+                try:
+                    value = sanitize_value(value)
+                except Exception:
+                    logger.exception(
+                        'value sanitization error: key=%s, value=%s', key, value)
+            # for multi-value tags, append to a list
+            if tag in MULTI_TAGS:
+                try:
+                    record[key].append(value)
+                except KeyError:
+                    record[key] = [value]
+            # otherwise, add key:value to record
+            else:
+                if key in record:
+                    logger.error('duplicate key error: key=%s, value=%s', key, value)
+                record[key] = value
+
+        self.in_record = in_record
+        self.prev_tag = prev_tag
+        self.prev_line_len = prev_line_len
+        self.record = record
+        return complete_record
+
+    def _sort_multi_values(self, record):
         for key in self.multi_keys:
             try:
-                self.record[key] = tuple(sorted(self.record[key]))
+                record[key] = tuple(sorted(record[key]))
             except KeyError:
                 pass
             except Exception:
                 logger.exception(
                     'multi-value sort error: key=%s, value=%s',
-                    key, self.record[key])
+                    key, record[key])
 
-    def _sanitize_record(self):
+    def _sanitize_record(self, record):
         for key in self.split_keys:
             try:
-                self.record[key] = tuple(sorted(self.record[key].split('; ')))
+                record[key] = tuple(sorted(record[key].split('; ')))
             except KeyError:
                 pass
             except Exception:
                 logger.exception(
                     'record sanitization error: key=%s, value=%s',
-                    key, self.record[key])
-        if not self.record.get('journal_name'):
+                    key, record[key])
+        if not record.get('journal_name'):
             for key in self.journal_keys:
                 try:
-                    self.record['journal_name'] = self.record[key]
+                    record['journal_name'] = record[key]
                     break
                 except KeyError:
                     continue
-        if not self.record.get('authors'):
+        if not record.get('authors'):
             for key in self.author_keys:
                 try:
-                    self.record['authors'] = self.record[key]
+                    record['authors'] = record[key]
                     break
                 except KeyError:
                     continue
-        if not self.record.get('title'):
+        if not record.get('title'):
             for key in self.title_keys:
                 try:
-                    self.record['title'] = self.record[key]
+                    record['title'] = record[key]
                     break
                 except KeyError:
                     continue
-        if not self.record.get('pub_year'):
+        if not record.get('pub_year'):
             y1_key = self.key_map.get('Y1', 'Y1')
             try:
-                if self.record.get(y1_key):
-                    self.record['pub_year'] = self.record[y1_key].year
+                if record.get(y1_key):
+                    record['pub_year'] = record[y1_key].year
             except Exception:
                 logger.exception(
                     'record sanitization error: key=%s, value=%s',
-                    y1_key, self.record[y1_key])
+                    y1_key, record[y1_key])
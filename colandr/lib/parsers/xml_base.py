@@ -0,0 +1,254 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import codecs
+import io
+import re
+
+from defusedxml import ElementTree
+
+from .. import utils
+
+
+logger = utils.get_console_logger(__name__)
+
+WHITESPACE_RE = re.compile(r'\s+')
+YEAR_RE = re.compile(r'\b(\d{4})\b')
+# number of characters (or bytes) read from file at a time
+CHUNK_SIZE = 1024 * 1024
+_MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
+              'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+              'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+
+def get_text(elem, path=None):
+    """
+    Get all text within ``elem`` (or its first descendant matching ``path``),
+    including that of any nested markup elements, stripped of surrounding whitespace.
+
+    Returns:
+        str: or None, if no such element or it has no text
+    """
+    if path is not None and elem is not None:
+        elem = elem.find(path)
+    if elem is None:
+        return None
+    text = ''.join(elem.itertext()).strip()
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text or None
+
+
+def get_texts(elem, path):
+    """Get all non-empty texts within ``elem``'s descendants matching ``path``."""
+    if elem is None:
+        return []
+    return [text for text in (get_text(item) for item in elem.iterfind(path))
+            if text]
+
+
+def parse_year(value):
+    """Get the first 4-digit year in ``value``, e.g. "1998 Dec-1999 Jan", or None."""
+    if not value:
+        return None
+    match = YEAR_RE.search(value)
+    return int(match.group(1)) if match else None
+
+
+def parse_month(value):
+    """Get the month number of ``value``, e.g. "02", "Feb", or "Spring", or None."""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return _MONTH_MAP.get(value.strip()[:3].lower())
+
+
+class XmlFile(object):
+    """
+    Base class for streaming XML citations file parsers. Subclasses specify
+    the tag names of elements that hold individual records, and how to get
+    a record dict from such an element.
+
+    Args:
+        path_or_stream (str or io stream): XML file to be parsed, either as its
+            path on disk or as a stream of data
+        chunk_size (int): number of characters (or bytes) read from the file at a time
+    """
+
+    RECORD_TAGS = ()
+    SNIFF_RE = None
+
+    def __init__(self, path_or_stream, chunk_size=CHUNK_SIZE):
+        if isinstance(path_or_stream, io.IOBase):  # text or binary stream
+            self.path = None
+            self.stream = path_or_stream
+        elif isinstance(path_or_stream, (bytes, str)):
+            self.path = path_or_stream
+            self.stream = None
+        else:
+            raise TypeError()
+        self.chunk_size = chunk_size
+        tags = '|'.join(re.escape(tag) for tag in self.RECORD_TAGS)
+        self.record_re = re.compile(
+            r'<({})[\s>].*?</\1\s*>'.format(tags), flags=re.DOTALL)
+        self.record_end_re = re.compile(r'</(?:{})\s*>'.format(tags))
+
+    @classmethod
+    def sniff(cls, text):
+        """
+        Check if ``text``, from the start of an XML file, looks like this format.
+
+        Returns:
+            bool
+        """
+        return cls.SNIFF_RE.search(text) is not None
+
+    def parse(self):
+        """
+        Incrementally parse the file one record element at a time, discarding
+        each once it's been parsed, so memory use doesn't grow with file size.
+
+        Yields:
+            dict: next complete citation record
+
+        Raises:
+            :class:`xml.etree.ElementTree.ParseError`: if the file isn't well-formed
+            :class:`defusedxml.DefusedXmlException`: if the file declares entities
+                or references external resources, which aren't expanded or fetched
+        """
+        record_tags = frozenset(self.RECORD_TAGS)
+        stream = self.stream or io.open(self.path, mode='rb')
+        with stream as f:
+            parents = []
+            for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    parents.append(elem)
+                    continue
+                parents.pop()
+                if elem.tag in record_tags:
+                    record = self._parse_record(elem)
+                    if parents:
+                        parents[-1].remove(elem)
+                    if record:
+                        yield record
+
+    def iter_shards(self, shard_size):
+        """
+        Split the file into shards of up to ``shard_size`` complete records,
+        each of which may be parsed independently (e.g. in another process)
+        by :meth:`XmlFile.parse_shard()`. Records are split out of the raw text,
+        without parsing the XML itself.
+
+        Args:
+            shard_size (int)
+
+        Yields:
+            Tuple[str, int]: shard's text, and line number in file at which it starts
+        """
+        texts = []
+        shard_lineno = 0
+        next_lineno = 0
+        n_records = 0
+        for lineno, text in self._iter_raw_records():
+            if not texts:
+                shard_lineno = lineno
+            else:
+                # pad out the lines between records, so line numbers stay true
+                texts.append('\n' * (lineno - next_lineno))
+            texts.append(text)
+            next_lineno = lineno + text.count('\n')
+            n_records += 1
+            if n_records >= shard_size:
+                yield ''.join(texts), shard_lineno
+                texts = []
+                n_records = 0
+        if texts:
+            yield ''.join(texts), shard_lineno
+
+    def parse_shard(self, text, lineno=0, errors=None):
+        """
+        Parse the records in a shard of this file, as split by :meth:`XmlFile.iter_shards()`.
+        Unlike :meth:`XmlFile.parse()`, a badly-formed record is skipped
+        rather than stopping the parse of all subsequent records.
+
+        Args:
+            text (str)
+            lineno (int): line number in file at which ``text`` starts
+            errors (list): if specified, (line number, message) pairs for
+                records that failed to parse are appended to it
+
+        Yields:
+            Tuple[int, dict]: line number in file at which a record starts, and the record
+        """
+        idx = 0
+        for match in self.record_re.finditer(text):
+            lineno += text.count('\n', idx, match.start())
+            idx = match.start()
+            try:
+                record = self._parse_record(ElementTree.fromstring(match.group(0)))
+            except Exception as e:
+                if errors is not None:
+                    errors.append((lineno, str(e)))
+            else:
+                if record:
+                    yield lineno, record
+
+    def _iter_text_chunks(self):
+        """
+        Read the file in large chunks, decoding bytes as needed.
+
+        Yields:
+            str
+        """
+        stream = self.stream or io.open(self.path, mode='rb')
+        decoder = None
+        with stream as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                if isinstance(chunk, bytes):
+                    if decoder is None:
+                        decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+                    chunk = decoder.decode(chunk)
+                yield chunk
+            if decoder is not None:
+                chunk = decoder.decode(b'', final=True)
+                if chunk:
+                    yield chunk
+
+    def _iter_raw_records(self):
+        """
+        Split the file's text into raw record elements on their end tags, in bulk.
+
+        Yields:
+            Tuple[int, str]: line number at which a raw record starts, and its text
+        """
+        lineno = 0
+        buf = ''
+        for chunk in self._iter_text_chunks():
+            buf += chunk
+            end_idx = 0
+            for match in self.record_end_re.finditer(buf):
+                end_idx = match.end()
+            if end_idx == 0:
+                continue
+            records_text, buf = buf[:end_idx], buf[end_idx:]
+            idx = 0
+            for match in self.record_re.finditer(records_text):
+                lineno += records_text.count('\n', idx, match.start())
+                idx = match.start()
+                yield lineno, match.group(0)
+            lineno += records_text.count('\n', idx)
+
+    def _parse_record(self, elem):
+        """
+        Args:
+            elem (:class:`xml.etree.ElementTree.Element`): a record element,
+                with a tag in ``RECORD_TAGS``
+
+        Returns:
+            dict
+        """
+        raise NotImplementedError
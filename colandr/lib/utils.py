@@ -1,12 +1,26 @@
+import hashlib
 import io
 import logging
 import logging.handlers
+import multiprocessing
 import os
+import random
+import re
+import threading
+import unicodedata
 
 import dedupe
 from sqlalchemy.sql import text
 
 
+DOI_PREFIX_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', flags=re.IGNORECASE)
+NON_ALPHANUM_RE = re.compile(r'[\W_]+')
+
+# process-level cache of loaded dedupe models, keyed by settings file path
+_DEDUPE_MODELS = {}
+_DEDUPE_MODELS_LOCK = threading.Lock()
+
+
 def get_rotating_file_handler(filepath, level=logging.INFO):
     _handler = logging.handlers.RotatingFileHandler(
         filepath, maxBytes=1000000, backupCount=10, delay=False)
@@ -110,6 +124,56 @@ def load_dedupe_model(settings_path, num_cores=1):
     return deduper
 
 
+def get_dedupe_model(settings_path, num_cores=1):
+    """
+    Get a trained dedupe model from this process's cache, loading it via
+    :func:`load_dedupe_model()` only on first use or if the settings file
+    has since changed (as judged by its mtime, then its contents' hash).
+    Index predicates' per-review state is reset before the model is returned,
+    so it's safe to index another review's citations.
+
+    Args:
+        settings_path (str): path to file on disk where settings data is saved
+        num_cores (int): number of processes that deduper will use if able
+
+    Returns:
+        :class:``dedupe.StaticDedupe``
+    """
+    settings_path = os.path.abspath(settings_path)
+    mtime = os.stat(settings_path).st_mtime
+    with _DEDUPE_MODELS_LOCK:
+        cached = _DEDUPE_MODELS.get(settings_path)
+        if cached is None or cached['mtime'] != mtime:
+            with io.open(settings_path, mode='rb') as f:
+                checksum = hashlib.sha256(f.read()).hexdigest()
+            if cached is None or cached['checksum'] != checksum:
+                cached = {'deduper': load_dedupe_model(settings_path, num_cores=num_cores),
+                          'checksum': checksum}
+                _DEDUPE_MODELS[settings_path] = cached
+            cached['mtime'] = mtime
+        deduper = cached['deduper']
+    deduper.num_cores = num_cores
+    deduper.blocker.resetIndices()
+    return deduper
+
+
+def get_num_processes(n_processes):
+    """
+    Get the number of processes this process can actually use of the
+    ``n_processes`` requested: daemonic processes (e.g. workers in celery's
+    default prefork pool) can't start child processes, so they get just one.
+
+    Args:
+        n_processes (int)
+
+    Returns:
+        int
+    """
+    if n_processes > 1 and multiprocessing.current_process().daemon is True:
+        return 1
+    return n_processes
+
+
 def make_record_immutable(record):
     """
     Convert in-place the mutable components of ``record`` (dict) into their
@@ -123,3 +187,65 @@ def make_record_immutable(record):
         elif isinstance(val, set):
             record[key] = frozenset(val)
     return record
+
+
+def reservoir_sample(iterable, sample_size, random_state=None):
+    """
+    Get a uniform random sample of up to ``sample_size`` items from ``iterable``
+    in a single pass, holding no more than ``sample_size`` items in memory.
+
+    Args:
+        iterable (iterable)
+        sample_size (int)
+        random_state (:class:`random.Random`)
+
+    Returns:
+        list
+    """
+    rand = random_state or random
+    sample = []
+    for i, item in enumerate(iterable):
+        if i < sample_size:
+            sample.append(item)
+        else:
+            j = rand.randint(0, i)
+            if j < sample_size:
+                sample[j] = item
+    return sample
+
+
+def get_citation_fingerprint(record):
+    """
+    Get a fingerprint of citation ``record`` from its normalized DOI, title,
+    publication year, and first author, such that exact duplicates (e.g. the
+    same record imported twice) get the same fingerprint.
+
+    Args:
+        record (dict)
+
+    Returns:
+        int: signed 64-bit hash, or None if ``record`` has neither a DOI nor a title
+    """
+    doi = DOI_PREFIX_RE.sub('', (record.get('doi') or '').strip()).lower()
+    title = normalize_text(record.get('title') or '')
+    if title == 'untitled':  # default value for citations saved without a title
+        title = ''
+    if not doi and not title:
+        return None
+    authors = record.get('authors')
+    first_author = normalize_text(authors[0].split(',')[0]) if authors else ''
+    pub_year = record.get('pub_year')
+    key = '\x1f'.join((doi, title, str(pub_year or ''), first_author))
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def normalize_text(value):
+    """Lowercase ``value``, strip its accents, and collapse non-alphanumerics into spaces."""
+    value = value.lower()
+    try:
+        value.encode('ascii')
+    except UnicodeEncodeError:  # only non-ascii text can have accents to strip
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(char for char in value if not unicodedata.combining(char))
+    return NON_ALPHANUM_RE.sub(' ', value).strip()
@@ -0,0 +1,155 @@
+"""
+Sanitize and validate citation records in batches, one field (column) at a time,
+using a table of checks compiled once from :class:`CitationSchema`'s fields.
+Any record that doesn't pass the fast path is handed off to the schema itself,
+so results and error messages are exactly the same as ``CitationSchema().load()``.
+"""
+from marshmallow import fields as ma_fields
+from marshmallow.validate import Length, Range
+from webargs import missing
+
+from ..api.schemas import CitationSchema
+from .sanitizers import CITATION_FIELD_SANITIZERS, sanitize_type
+
+
+class CitationBatchValidator(object):
+    """
+    Args:
+        schema (:class:`CitationSchema`): if None, a default instance is used
+        sanitizers (dict): mapping of field name to sanitizer function, as applied
+            in ``schema``'s pre-load hook; if None, :data:`CITATION_FIELD_SANITIZERS`
+    """
+
+    def __init__(self, schema=None, sanitizers=None):
+        self.schema = schema or CitationSchema()
+        self.sanitizers = (sanitizers if sanitizers is not None
+                           else CITATION_FIELD_SANITIZERS)
+        load_fields = {name: field for name, field in self.schema.fields.items()
+                       if not field.dump_only}
+        self.checks = {name: _compile_check(field)
+                       for name, field in load_fields.items()}
+        self.required_keys = [name for name, field in load_fields.items()
+                              if field.required]
+
+    def validate(self, records):
+        """
+        Sanitize and validate a batch of citation ``records``.
+
+        Args:
+            records (List[dict]): parsed citation records
+
+        Returns:
+            Tuple[List[dict], List[Tuple[int, str]]]: validated records, in order,
+            and (index in ``records``, message) pairs for records that failed
+        """
+        sanitized_records = [{'other_fields': {}} for _ in records]
+        failed = set()
+
+        # gather each field's values across the batch into a column
+        columns = {}
+        for idx, record in enumerate(records):
+            for key, value in record.items():
+                if value is missing or key == 'screenings':
+                    continue
+                try:
+                    column = columns[key]
+                except KeyError:
+                    column = columns[key] = ([], [])
+                column[0].append(idx)
+                column[1].append(value)
+
+        for key, (idxs, values) in columns.items():
+            sanitize = self.sanitizers.get(key)
+            if sanitize is None:
+                for idx, value in zip(idxs, values):
+                    sanitized_records[idx]['other_fields'][key] = sanitize_type(value, str)
+                continue
+            try:
+                values = [sanitize(value) for value in values]
+            except Exception:
+                values = [_try_sanitize(sanitize, value) for value in values]
+            check = self.checks.get(key)
+            for idx, value in zip(idxs, values):
+                if value is _FAILED:
+                    failed.add(idx)
+                elif check is None:
+                    continue  # sanitized, but not a field in the schema
+                elif check(value) is True:
+                    sanitized_records[idx][key] = value
+                else:
+                    failed.add(idx)
+
+        for key in self.required_keys:
+            failed.update(idx for idx, sanitized_record in enumerate(sanitized_records)
+                          if key not in sanitized_record)
+
+        if not failed:
+            return sanitized_records, []
+        # let the schema itself have the final say on any records that failed
+        validated_records = []
+        errors = []
+        for idx, (record, sanitized_record) in enumerate(zip(records, sanitized_records)):
+            if idx not in failed:
+                validated_records.append(sanitized_record)
+                continue
+            try:
+                validated_records.append(self.schema.load(record).data)
+            except Exception as e:
+                errors.append((idx, str(e)))
+        return validated_records, errors
+
+
+_FAILED = object()
+
+
+def _try_sanitize(sanitize, value):
+    try:
+        return sanitize(value)
+    except Exception:
+        return _FAILED
+
+
+def _compile_check(field):
+    """
+    Compile a function that returns True if a (sanitized) value definitely
+    deserializes to itself and passes all of ``field``'s validators, and False
+    if the field's own deserialization and validation must be run to know for sure.
+    """
+    if isinstance(field, ma_fields.List):
+        check_item = _compile_check(field.container)
+
+        def check(value):
+            return type(value) is list and all(check_item(item) for item in value)
+
+        return check
+
+    if isinstance(field, ma_fields.Integer):
+        type_ = int
+    elif isinstance(field, ma_fields.String):
+        type_ = str
+    elif isinstance(field, ma_fields.Dict):
+        type_ = dict
+    else:
+        return lambda value: False
+
+    bounds = []
+    for validator in field.validators:
+        if isinstance(validator, Length) and getattr(validator, 'equal', None) is None:
+            bounds.append((len, validator.min, validator.max))
+        elif type(validator) is Range:
+            bounds.append((None, validator.min, validator.max))
+        else:
+            return lambda value: False
+
+    def check(value):
+        if type(value) is not type_:
+            return False
+        for get_size, min_value, max_value in bounds:
+            size = get_size(value) if get_size else value
+            if min_value is not None and size < min_value:
+                return False
+            if max_value is not None and size > max_value:
+                return False
+        return True
+
+    return check
@@ -4,7 +4,8 @@ import itertools
 from flask import current_app
 from itsdangerous import (TimedJSONWebSignatureSerializer as Serializer,
                           BadSignature, SignatureExpired)
-from sqlalchemy import event, false, text, ForeignKey
+import numpy as np
+from sqlalchemy import event, false, text, types, ForeignKey
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.hybrid import hybrid_property
 
@@ -16,6 +17,26 @@ from .lib.utils import get_console_logger
 logger = get_console_logger(__name__)
 
 
+class FloatVector(types.TypeDecorator):
+    """
+    Vector of float32 values, stored compactly as little-endian bytes in a
+    ``bytea`` column and loaded without copying as a read-only numpy array.
+    """
+
+    impl = types.LargeBinary
+    dtype = np.dtype('<f4')
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return np.asarray(value, dtype=self.dtype).tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=self.dtype)
+
+
 # association table for users-reviews many-to-many relationship
 users_reviews = db.Table(
     'users_to_reviews',
@@ -190,6 +211,8 @@ class Review(db.Model):
         db.Integer, server_default='0', nullable=False)
     num_fulltexts_excluded = db.Column(
         db.Integer, server_default='0', nullable=False)
+    dedupe_blocking_engine = db.Column(
+        db.Unicode(length=20), nullable=True)
 
     # relationships
     owner = db.relationship(
@@ -317,6 +340,16 @@ class Import(db.Model):
         db.Integer, nullable=False)
     status = db.Column(
         db.Unicode(length=20), server_default='not_screened')
+    job_status = db.Column(
+        db.Unicode(length=20), server_default='finished', nullable=False)
+    num_records_parsed = db.Column(
+        db.Integer, nullable=True)
+    num_records_inserted = db.Column(
+        db.Integer, nullable=True)
+    num_errors = db.Column(
+        db.Integer, nullable=True)
+    errors = db.Column(
+        postgresql.JSONB(none_as_null=True), server_default='[]')
 
     # relationships
     review = db.relationship(
@@ -330,18 +363,76 @@ class Import(db.Model):
         lazy='subquery')
 
     def __init__(self, review_id, user_id, data_source_id, record_type, num_records,
-                 status=None):
+                 status=None, job_status=None):
         self.review_id = review_id
         self.user_id = user_id
         self.data_source_id = data_source_id
         self.record_type = record_type
         self.num_records = num_records
         self.status = status
+        self.job_status = job_status
 
     def __repr__(self):
         return "<Import(id={})>".format(self.id)
 
 
+class UploadSession(db.Model):
+
+    __tablename__ = 'upload_sessions'
+
+    # columns
+    id = db.Column(
+        db.Integer, primary_key=True, autoincrement=True)
+    created_at = db.Column(
+        db.TIMESTAMP(timezone=False), nullable=False,
+        server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    last_updated = db.Column(
+        db.TIMESTAMP(timezone=False), nullable=False,
+        server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"),
+        server_onupdate=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    user_id = db.Column(
+        db.Integer, ForeignKey('users.id', ondelete='CASCADE'),
+        nullable=False, index=True)
+    review_id = db.Column(
+        db.Integer, ForeignKey('reviews.id', ondelete='CASCADE'),
+        nullable=False, index=True)
+    upload_type = db.Column(
+        db.Unicode(length=20), nullable=False)
+    fulltext_id = db.Column(
+        db.BigInteger, ForeignKey('fulltexts.id', ondelete='CASCADE'),
+        nullable=True)
+    import_id = db.Column(
+        db.Integer, ForeignKey('imports.id', ondelete='SET NULL'),
+        nullable=True)
+    filename = db.Column(
+        db.Unicode, nullable=False)
+    total_size = db.Column(
+        db.BigInteger, nullable=False)
+    received_size = db.Column(
+        db.BigInteger, nullable=False, server_default='0')
+    checksum = db.Column(
+        db.Unicode(length=64), nullable=True)
+    status = db.Column(
+        db.Unicode(length=20), nullable=False, server_default='pending')
+    params = db.Column(
+        postgresql.JSONB(none_as_null=True), server_default='{}')
+
+    def __init__(self, user_id, review_id, upload_type, filename, total_size,
+                 fulltext_id=None, checksum=None, params=None):
+        self.user_id = user_id
+        self.review_id = review_id
+        self.upload_type = upload_type
+        self.filename = filename
+        self.total_size = total_size
+        self.received_size = 0
+        self.fulltext_id = fulltext_id
+        self.checksum = checksum
+        self.params = params
+
+    def __repr__(self):
+        return "<UploadSession(id={})>".format(self.id)
+
+
 class Study(db.Model):
 
     __tablename__ = 'studies'
@@ -500,8 +591,12 @@ class Citation(db.Model):
     language = db.Column(db.Unicode(length=50))
     other_fields = db.Column(
         postgresql.JSONB(none_as_null=True), server_default='{}')
+    fingerprint = db.Column(
+        db.BigInteger, nullable=True, index=True)
     text_content_vector_rep = db.Column(
-        postgresql.ARRAY(db.Float), server_default='{}')
+        FloatVector, nullable=True)
+    text_content_vector_space = db.Column(
+        db.Unicode(length=20), nullable=True)
 
     @hybrid_property
     def text_content(self):
@@ -588,7 +683,9 @@ class Fulltext(db.Model):
     text_content = db.Column(
         db.UnicodeText, nullable=True)
     text_content_vector_rep = db.Column(
-        postgresql.ARRAY(db.Float), server_default='{}')
+        FloatVector, nullable=True)
+    text_content_vector_space = db.Column(
+        db.Unicode(length=20), nullable=True)
 
     @hybrid_property
     def exclude_reasons(self):
@@ -769,11 +866,52 @@ class DataExtraction(db.Model):
         return "<DataExtraction(study_id={})>".format(self.id)
 
 
+class DedupeReviewState(db.Model):
+
+    __tablename__ = 'dedupe_review_state'
+
+    # columns
+    review_id = db.Column(
+        db.Integer,
+        ForeignKey('reviews.id', ondelete='CASCADE'),
+        primary_key=True, nullable=False)
+    last_updated = db.Column(
+        db.TIMESTAMP(timezone=False), nullable=False,
+        server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"),
+        server_onupdate=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    max_citation_id = db.Column(
+        db.BigInteger, nullable=False)
+    threshold = db.Column(
+        db.Float, nullable=True)
+    threshold_sample_size = db.Column(
+        db.Integer, nullable=True)
+    threshold_review_size = db.Column(
+        db.Integer, nullable=True)
+    blocking_engine = db.Column(
+        db.Unicode(length=20), nullable=True)
+
+    def __init__(self, review_id, max_citation_id, threshold=None,
+                 threshold_sample_size=None, threshold_review_size=None,
+                 blocking_engine=None):
+        self.review_id = review_id
+        self.max_citation_id = max_citation_id
+        self.threshold = threshold
+        self.threshold_sample_size = threshold_sample_size
+        self.threshold_review_size = threshold_review_size
+        self.blocking_engine = blocking_engine
+
+    def __repr__(self):
+        return "<DedupeReviewState(review_id={})>".format(self.review_id)
+
+
 # tables for citation deduplication
+# these hold scratch data that can always be rebuilt from citations, so they're
+# UNLOGGED: faster to write, and left out of the WAL (and so replicas and backups)
 
 class DedupeBlockingMap(db.Model):
 
     __tablename__ = 'dedupe_blocking_map'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
 
     # columns
     citation_id = db.Column(
@@ -800,6 +938,7 @@ class DedupePluralKey(db.Model):
     __table_args__ = (
         db.UniqueConstraint('review_id', 'block_key',
                             name='review_id_block_key_uc'),
+        {'prefixes': ['UNLOGGED']},
         )
 
     # columns
@@ -821,6 +960,7 @@ class DedupePluralKey(db.Model):
 class DedupePluralBlock(db.Model):
 
     __tablename__ = 'dedupe_plural_block'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
     # __table_args__ = (
     #     db.UniqueConstraint('block_id', 'citation_id',
     #                         name='block_id_citation_id_uc'),
@@ -846,6 +986,7 @@ class DedupePluralBlock(db.Model):
 class DedupeCoveredBlocks(db.Model):
 
     __tablename__ = 'dedupe_covered_blocks'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
 
     # columns
     citation_id = db.Column(
@@ -867,6 +1008,7 @@ class DedupeCoveredBlocks(db.Model):
 class DedupeSmallerCoverage(db.Model):
 
     __tablename__ = 'dedupe_smaller_coverage'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
 
     # columns
     citation_id = db.Column(
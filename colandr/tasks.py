@@ -1,17 +1,19 @@
+import collections
 import itertools
 import os
-from time import sleep
+from time import sleep, time
 
 import arrow
+from celery.signals import worker_process_init
 from celery.utils.log import get_task_logger
 from flask import current_app
 from flask_mail import Message
 import redis
 import redis_lock
-from sqlalchemy import create_engine, func, types as sqltypes
-from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy import any_, create_engine, func, types as sqltypes
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql import case, delete, exists, select, text, update
+from sqlalchemy.sql import bindparam, case, delete, exists, select, text, update
 
 import numpy as np
 from sklearn.externals import joblib
@@ -20,11 +22,23 @@ import textacy
 
 from . import celery, mail
 from .api.schemas import ReviewPlanSuggestedKeyterms
-from .lib.constants import CITATION_RANKING_MODEL_FNAME
-from .lib.utils import get_console_logger, load_dedupe_model, make_record_immutable
+from .lib.constants import CITATION_RANKING_MODEL_FNAME, MAX_IMPORT_ERRORS_STORED
+from .lib.blocking import MinHashBlocker, get_blocks, iter_candidate_dupes
+from .lib.bulk_load import copy_rows
+from .lib.duplicates import (can_dedupe_incrementally, can_reuse_dedupe_threshold,
+                             get_canonical_citation_id, get_existing_canonical_citation_id)
+from .lib.imports import (get_citations_file, import_citations, iter_batches,
+                           iter_citation_records)
+from .lib.nlp.model_cache import evict_spacy_model, get_spacy_model, preload_spacy_models
+from .lib.nlp.vectorize import (get_vector_space, iter_text_content_langs,
+                                iter_text_content_vectors)
+from .lib.utils import (get_citation_fingerprint, get_console_logger,
+                        get_dedupe_model, get_num_processes, make_record_immutable,
+                        reservoir_sample)
 from .models import (db, Citation, Dedupe, DedupeBlockingMap, DedupeCoveredBlocks,
-                     DedupePluralBlock, DedupePluralKey, DedupeSmallerCoverage,
-                     Fulltext, ReviewPlan, Study, User)
+                     DedupePluralBlock, DedupePluralKey, DedupeReviewState,
+                     DedupeSmallerCoverage, Fulltext, Import, Review, ReviewPlan,
+                     Study, User)
 
 
 REDIS_CONN = redis.StrictRedis()
@@ -46,6 +60,20 @@ def wait_for_lock(name, expire=60):
     return lock
 
 
+@worker_process_init.connect
+def preload_nlp_models(**kwargs):
+    """
+    Load spacy models for ``NLP_PRELOAD_LANGS`` as each worker process starts,
+    so that vectorization tasks don't pay for loading them on first use.
+    """
+    langs = celery.conf.get('NLP_PRELOAD_LANGS')
+    if langs:
+        preload_spacy_models(
+            langs,
+            max_models=celery.conf.get('NLP_MODEL_CACHE_MAX_MODELS'),
+            max_memory_mb=celery.conf.get('NLP_MODEL_CACHE_MAX_MEMORY_MB'))
+
+
 @celery.task
 def send_email(recipients, subject, text_body, html_body):
     msg = Message(current_app.config['MAIL_SUBJECT_PREFIX'] + ' ' + subject,
@@ -64,6 +92,77 @@ def remove_unconfirmed_user(email):
         db.session.commit()
 
 
+@celery.task
+def process_citations_import(import_id, filepath, skip_duplicates=False):
+
+    citations_import = db.session.query(Import).get(import_id)
+    if not citations_import:
+        logger.error('<Import(id=%s)> not found', import_id)
+        return
+    review_id = citations_import.review_id
+    user_id = citations_import.user_id
+    data_source_id = citations_import.data_source_id
+    status = citations_import.status
+
+    engine = create_engine(
+        current_app.config['SQLALCHEMY_DATABASE_URI'], echo=False)
+
+    # job progress is updated outside of the import's transaction,
+    # so that it's visible to clients while the import is still running
+    def update_job(**values):
+        engine.execute(
+            update(Import).where(Import.id == import_id).values(**values))
+
+    errors = []
+    progress = {'num_records_parsed': 0}
+
+    def report_progress(n_parsed, n_inserted):
+        progress['num_records_parsed'] = n_parsed
+        update_job(num_records_parsed=n_parsed,
+                   num_records_inserted=n_inserted,
+                   num_errors=len(errors))
+
+    update_job(job_status='running', num_records_parsed=0,
+               num_records_inserted=0, num_errors=0)
+    logger.info('<Import(id=%s)>: importing citations from %s', import_id, filepath)
+    try:
+        citations_file = get_citations_file(filepath, filepath)
+        records = iter_citation_records(
+            citations_file, review_id, errors=errors,
+            n_jobs=_get_num_processes('CITATION_IMPORT_N_JOBS'),
+            shard_size=current_app.config['CITATION_IMPORT_SHARD_SIZE'])
+        with engine.begin() as conn:
+            n_citations = import_citations(
+                conn, records, user_id, review_id, data_source_id,
+                status=status,
+                chunk_size=current_app.config['CITATION_IMPORT_CHUNK_SIZE'],
+                loader=current_app.config['CITATION_IMPORT_LOADER'],
+                progress_callback=report_progress,
+                skip_duplicates=skip_duplicates)
+    except Exception as e:
+        logger.exception('<Import(id=%s)>: citations import failed', import_id)
+        errors.append(str(e))
+        update_job(job_status='failed', num_records_inserted=0,
+                   num_errors=len(errors),
+                   errors=errors[:MAX_IMPORT_ERRORS_STORED])
+        return
+    finally:
+        os.remove(filepath)
+
+    update_job(job_status='finished', num_records=n_citations,
+               num_records_parsed=progress['num_records_parsed'],
+               num_records_inserted=n_citations,
+               num_errors=len(errors), errors=errors[:MAX_IMPORT_ERRORS_STORED])
+    logger.info(
+        '<Review(id=%s)>: imported %s citations (%s errors) for <Import(id=%s)>',
+        review_id, n_citations, len(errors), import_id)
+
+    # lastly, don't forget to deduplicate the citations and get their word2vecs
+    deduplicate_citations.apply_async(args=[review_id], countdown=60)
+    get_citations_text_content_vectors.apply_async(
+        args=[review_id], countdown=60)
+
+
 def _get_candidate_dupes(results):
     block_id = None
     records = []
@@ -81,14 +180,488 @@ def _get_candidate_dupes(results):
         yield records
 
 
+def _log_stage_time(review_id, stage, start_time):
+    """
+    Log how long a stage of deduplication took, since ``start_time``.
+
+    Returns:
+        float: current time, i.e. the start time of the next stage
+    """
+    end_time = time()
+    logger.info(
+        '<Review(id=%s)>: dedupe %s stage took %.2f seconds',
+        review_id, stage, end_time - start_time)
+    return end_time
+
+
+def _get_num_processes(config_key):
+    """
+    Get the number of processes set by ``config_key`` to use on this worker host,
+    falling back to a single process in daemonic workers; see :func:`get_num_processes()`.
+    """
+    n_processes = current_app.config[config_key]
+    n_usable = get_num_processes(n_processes)
+    if n_usable < n_processes:
+        logger.warning(
+            '%s=%s, but daemonic worker processes can\'t start child processes, '
+            'so using a single process instead; see CELERY_MULTIPROCESS_QUEUE',
+            config_key, n_processes)
+    return n_usable
+
+
+def _refresh_fingerprints(conn, review_id):
+    """
+    (Re-)compute fingerprints for all of a review's citations and update those
+    that have changed, e.g. because the citation was imported before fingerprints
+    existed or has since been edited.
+    """
+    stmt = select([Citation.id, Citation.doi, Citation.title,
+                   Citation.pub_year, Citation.authors, Citation.fingerprint])\
+        .where(Citation.review_id == review_id)
+    updates = []
+    for row in conn.execute(stmt):
+        fingerprint = get_citation_fingerprint(dict(row))
+        if fingerprint != row.fingerprint:
+            updates.append({'citation_id': row.id, 'fingerprint': fingerprint})
+    if updates:
+        stmt = update(Citation)\
+            .where(Citation.id == bindparam('citation_id'))\
+            .values(fingerprint=bindparam('fingerprint'))
+        conn.execute(stmt, updates)
+    logger.debug(
+        '<Review(id=%s)>: refreshed %s citation fingerprints', review_id, len(updates))
+
+
+def _get_exact_duplicates(conn, review_id, incl_excl_cids, max_citation_id=None):
+    """
+    Get a review's citations whose fingerprints exactly match another's,
+    and the citation of which each is a duplicate: an included/excluded citation
+    if there is one with the same fingerprint, otherwise the one with the lowest id.
+
+    Args:
+        conn (:class:`sqlalchemy.engine.Connection`)
+        review_id (int)
+        incl_excl_cids (Set[int]): ids of included/excluded citations
+        max_citation_id (int): if specified, citations with ids up to and including
+            this one have already been deduped, so they're always preferred
+            as canonical and never returned as duplicates
+
+    Returns:
+        Dict[int, int]: mapping of duplicate citation id to canonical citation id
+    """
+    stmt = select([func.array_agg(Citation.id).label('cids')])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.fingerprint != None)\
+        .group_by(Citation.fingerprint)\
+        .having(func.count(1) > 1)
+    exact_dupes = {}
+    for row in conn.execute(stmt):
+        cids = sorted(row.cids)
+        if max_citation_id is not None:
+            candidate_cids = [cid for cid in cids if cid <= max_citation_id] or cids
+        else:
+            candidate_cids = cids
+        canonical_cid = next(
+            (cid for cid in candidate_cids if cid in incl_excl_cids), candidate_cids[0])
+        exact_dupes.update(
+            (cid, canonical_cid) for cid in cids
+            if cid != canonical_cid and (max_citation_id is None or cid > max_citation_id))
+    return exact_dupes
+
+
+def _index_citations(conn, deduper, review_id):
+    """
+    If deduper learned an Index Predicate, we have to take a pass through
+    *all* of a review's citations and create indices.
+    """
+    for field in deduper.blocker.index_fields:
+        col_type = getattr(Citation, field).property.columns[0].type
+        logger.debug(
+            '<Review(id=%s)>: index predicate: %s %s', review_id, field, col_type)
+        stmt = select([getattr(Citation, field)])\
+            .where(Citation.review_id == review_id)\
+            .distinct()
+        results = conn.execute(stmt)
+        if isinstance(col_type, sqltypes.ARRAY):
+            field_data = (tuple(row[0]) for row in results)
+        else:
+            field_data = (row[0] for row in results)
+        deduper.blocker.index(field_data, field)
+
+
+def _write_blocking_map(conn, blocker, review_id, stmt, exact_dupes):
+    """
+    Block the citations selected by ``stmt``, except for exact duplicates, with
+    ``blocker`` (e.g. ``deduper.blocker`` or a :class:`MinHashBlocker`), and
+    stream the resulting (citation_id, review_id, block_key) rows straight into
+    the blocking map table via COPY, in batches of bounded size.
+
+    Returns:
+        int: number of blocking map rows written
+    """
+    n_rows = 0
+    with conn.begin():
+        results = conn.execute(stmt.execution_options(stream_results=True))
+        data = ((row[0], make_record_immutable(dict(row)))
+                for row in results
+                if row[0] not in exact_dupes)
+        b_data = ({'citation_id': citation_id, 'review_id': review_id, 'block_key': block_key}
+                  for block_key, citation_id in blocker(data))
+        for batch in iter_batches(b_data, current_app.config['DEDUPE_BLOCKING_MAP_BATCH_SIZE']):
+            n_rows += copy_rows(
+                conn, DedupeBlockingMap.__table__, batch,
+                columns=['citation_id', 'review_id', 'block_key'])
+    logger.debug(
+        '<Review(id=%s)>: wrote %s rows to %s',
+        review_id, n_rows, DedupeBlockingMap.__tablename__)
+    return n_rows
+
+
+def _get_canonical_citation_ids(conn, review_id, clusters, incl_excl_cids):
+    """
+    Get the canonical citation in each of many clusters of duplicate citation ids:
+    the included/excluded citation with the lowest id, if any, otherwise the one
+    with the fewest null columns (and the lowest id, among ties). Null columns
+    are counted for all clusters' citations at once, in a single query.
+
+    Args:
+        conn (:class:`sqlalchemy.engine.Connection`)
+        review_id (int)
+        clusters (List[List[int]])
+        incl_excl_cids (Set[int]): ids of included/excluded citations
+
+    Returns:
+        List[int]: canonical citation id for each cluster, in order
+    """
+    other_cids = [cid
+                  for cids in clusters
+                  if incl_excl_cids.isdisjoint(cids)
+                  for cid in cids]
+    n_null_cols = {}
+    if other_cids:
+        n_null_cols = _get_num_null_columns(conn, review_id, other_cids)
+    return [get_canonical_citation_id(cids, incl_excl_cids, n_null_cols)
+            for cids in clusters]
+
+
+def _get_num_null_columns(conn, review_id, cids):
+    """
+    Count the null (or empty) columns of each of a review's citations with ids ``cids``.
+
+    Returns:
+        Dict[int, int]
+    """
+    stmt = select([Citation.id,
+                   (case([(Citation.title == None, 1)], else_=0) +
+                    case([(Citation.abstract == None, 1)], else_=0) +
+                    case([(Citation.pub_year == None, 1)], else_=0) +
+                    case([(Citation.pub_month == None, 1)], else_=0) +
+                    case([(Citation.authors == {}, 1)], else_=0) +
+                    case([(Citation.keywords == {}, 1)], else_=0) +
+                    case([(Citation.type_of_reference == None, 1)], else_=0) +
+                    case([(Citation.journal_name == None, 1)], else_=0) +
+                    case([(Citation.issue_number == None, 1)], else_=0) +
+                    case([(Citation.doi == None, 1)], else_=0) +
+                    case([(Citation.issn == None, 1)], else_=0) +
+                    case([(Citation.publisher == None, 1)], else_=0) +
+                    case([(Citation.language == None, 1)], else_=0)
+                    ).label('n_null_cols')])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.id == any_(
+            bindparam('cids', value=cids,
+                      type_=sqltypes.ARRAY(sqltypes.BigInteger))))
+    return {row.id: row.n_null_cols for row in conn.execute(stmt)}
+
+
+def _get_dedupe_threshold(conn, deduper, review_id, state, exact_dupes):
+    """
+    Get the dedupe model's similarity threshold for a review's citations: the one
+    stored in its dedupe ``state``, unless the review has grown too much since it
+    was computed, in which case it's computed anew from a reservoir sample of
+    the review's citations, streamed from the db (rather than randomly sorted).
+
+    Returns:
+        dict: threshold, along with the sample size and review size it came from
+    """
+    stmt = select([func.count(1)]).where(Citation.review_id == review_id)
+    n_citations = conn.execute(stmt).fetchone()[0]
+    max_growth = current_app.config['DEDUPE_THRESHOLD_MAX_GROWTH']
+    if state is not None and can_reuse_dedupe_threshold(
+            state.threshold, state.threshold_review_size, n_citations, max_growth):
+        logger.info(
+            '<Review(id=%s)>: reusing dedupe threshold %s, computed for %s citations',
+            review_id, state.threshold, state.threshold_review_size)
+        return {'threshold': state.threshold,
+                'threshold_sample_size': state.threshold_sample_size,
+                'threshold_review_size': state.threshold_review_size}
+
+    stmt = select([Citation.id, Citation.title, Citation.authors,
+                   Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                   Citation.abstract, Citation.doi])\
+        .where(Citation.review_id == review_id)\
+        .execution_options(stream_results=True)
+    results = conn.execute(stmt)
+    sample = reservoir_sample(
+        ((row.id, make_record_immutable(dict(row))) for row in results
+         if row.id not in exact_dupes),
+        current_app.config['DEDUPE_THRESHOLD_SAMPLE_SIZE'])
+    results.close()
+    dupe_threshold = deduper.threshold(dict(sample), recall_weight=0.5)
+    logger.info(
+        '<Review(id=%s)>: computed dedupe threshold %s from %s of %s citations',
+        review_id, dupe_threshold, len(sample), n_citations)
+    return {'threshold': dupe_threshold,
+            'threshold_sample_size': len(sample),
+            'threshold_review_size': n_citations}
+
+
+def _deduplicate_new_citations(conn, deduper, review_id, state, max_citation_id,
+                               incl_excl_cids):
+    """
+    Deduplicate a review's citations added since it was last deduplicated, i.e.
+    those with ids in (``state.max_citation_id``, ``max_citation_id``], against each
+    other and against the review's existing citations. The existing blocking map
+    is extended with just the new citations' block keys, only blocks holding
+    a new citation are scored, and new duplicates are merged into existing
+    clusters without changing their canonical citations.
+
+    Returns:
+        dict: similarity threshold used, as given by :func:`_get_dedupe_threshold()`
+    """
+    prev_max_citation_id = state.max_citation_id
+    start_time = time()
+
+    # clear out anything left over from new citations in a previous, interrupted run
+    for table, id_col in [(Dedupe, Dedupe.id),
+                          (DedupeBlockingMap, DedupeBlockingMap.citation_id),
+                          (DedupePluralBlock, DedupePluralBlock.citation_id)]:
+        stmt = delete(table)\
+            .where(table.review_id == review_id)\
+            .where(id_col > prev_max_citation_id)
+        conn.execute(stmt)
+
+    _refresh_fingerprints(conn, review_id)
+    exact_dupes = _get_exact_duplicates(
+        conn, review_id, incl_excl_cids, max_citation_id=prev_max_citation_id)
+    logger.info(
+        '<Review(id=%s)>: found %s new exact duplicate citations',
+        review_id, len(exact_dupes))
+
+    # block keys depend on indices built from *all* citations, old and new
+    _index_citations(conn, deduper, review_id)
+    start_time = _log_stage_time(review_id, 'index', start_time)
+
+    stmt = select([Citation.id, Citation.title, Citation.authors,
+                   Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                   Citation.abstract, Citation.doi])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.id > prev_max_citation_id)\
+        .where(Citation.id <= max_citation_id)
+    _write_blocking_map(conn, deduper.blocker, review_id, stmt, exact_dupes)
+
+    # add plural keys and blocks for block keys that the new citations share
+    # with any other citations, old or new
+    new_block_keys = select([DedupeBlockingMap.block_key])\
+        .where(DedupeBlockingMap.review_id == review_id)\
+        .where(DedupeBlockingMap.citation_id > prev_max_citation_id)
+    stmt = select([DedupeBlockingMap.review_id, DedupeBlockingMap.block_key])\
+        .where(DedupeBlockingMap.review_id == review_id)\
+        .where(DedupeBlockingMap.block_key.in_(new_block_keys))\
+        .where(~exists()
+               .where(DedupePluralKey.review_id == review_id)
+               .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key))\
+        .group_by(DedupeBlockingMap.review_id, DedupeBlockingMap.block_key)\
+        .having(func.count(1) > 1)
+    conn.execute(
+        DedupePluralKey.__table__.insert()\
+            .from_select(['review_id', 'block_key'], stmt))
+    stmt = select([DedupePluralKey.block_id,
+                   DedupeBlockingMap.citation_id,
+                   DedupeBlockingMap.review_id])\
+        .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key)\
+        .where(DedupePluralKey.review_id == review_id)\
+        .where(DedupeBlockingMap.review_id == review_id)\
+        .where(DedupeBlockingMap.block_key.in_(new_block_keys))\
+        .where(~exists()
+               .where(DedupePluralBlock.block_id == DedupePluralKey.block_id)
+               .where(DedupePluralBlock.citation_id == DedupeBlockingMap.citation_id))
+    conn.execute(
+        DedupePluralBlock.__table__.insert()\
+            .from_select(['block_id', 'citation_id', 'review_id'], stmt))
+
+    # gather the blocks holding new citations, and every citation in them
+    new_block_ids = select([DedupePluralBlock.block_id])\
+        .where(DedupePluralBlock.review_id == review_id)\
+        .where(DedupePluralBlock.citation_id > prev_max_citation_id)
+    stmt = select([DedupePluralBlock.block_id, DedupePluralBlock.citation_id])\
+        .where(DedupePluralBlock.review_id == review_id)\
+        .where(DedupePluralBlock.block_id.in_(new_block_ids))\
+        .order_by(DedupePluralBlock.block_id)
+    block_cids = collections.OrderedDict()
+    covered_block_ids = collections.defaultdict(list)
+    for block_id, citation_id in conn.execute(stmt):
+        block_cids.setdefault(block_id, []).append(citation_id)
+        covered_block_ids[citation_id].append(block_id)
+    stmt = select([Citation.id, Citation.title, Citation.authors,
+                   Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                   Citation.abstract, Citation.doi])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.id.in_(
+            select([DedupePluralBlock.citation_id])
+            .where(DedupePluralBlock.review_id == review_id)
+            .where(DedupePluralBlock.block_id.in_(new_block_ids))))
+    records = {row.id: make_record_immutable(dict(row))
+               for row in conn.execute(stmt)}
+    start_time = _log_stage_time(review_id, 'blocking', start_time)
+
+    threshold_values = _get_dedupe_threshold(conn, deduper, review_id, state, exact_dupes)
+    start_time = _log_stage_time(review_id, 'threshold', start_time)
+
+    if block_cids:
+        clustered_dupes = deduper.matchBlocks(
+            iter_candidate_dupes(
+                block_cids, covered_block_ids, records, max_citation_id=prev_max_citation_id),
+            threshold=threshold_values['threshold'])
+    else:
+        clustered_dupes = []
+    logger.info(
+        '<Review(id=%s)>: found %s duplicate clusters among %s blocks with new citations',
+        review_id, len(clustered_dupes), len(block_cids))
+    start_time = _log_stage_time(review_id, 'match', start_time)
+
+    # old citations may already be duplicates, whose canonicals are kept as-is
+    old_cids = {int(cid) for cids, _ in clustered_dupes for cid in cids
+                if int(cid) <= prev_max_citation_id}
+    old_cids.update(cid for cid in exact_dupes.values() if cid <= prev_max_citation_id)
+    existing_canonicals = {}
+    if old_cids:
+        stmt = select([Dedupe.id, Dedupe.duplicate_of])\
+            .where(Dedupe.review_id == review_id)\
+            .where(Dedupe.id.in_(old_cids))
+        existing_canonicals = {row.id: row.duplicate_of for row in conn.execute(stmt)}
+
+    clusters = [[int(cid) for cid in cids] for cids, _ in clustered_dupes]
+    canonical_cids = _get_canonical_citation_ids(
+        conn, review_id,
+        [cids for cids in clusters
+         if all(cid > prev_max_citation_id for cid in cids)],
+        incl_excl_cids)
+    canonical_cids.reverse()
+
+    duplicates = {}
+    cluster_canonicals = {}
+    for int_cids, (_, scores) in zip(clusters, clustered_dupes):
+        cid_scores = {cid: float(score) for cid, score in zip(int_cids, scores)}
+        # join the existing cluster with the most members in this one, if any
+        canonical_citation_id = get_existing_canonical_citation_id(
+            int_cids, prev_max_citation_id, existing_canonicals)
+        if canonical_citation_id is None:
+            canonical_citation_id = canonical_cids.pop()
+        for cid, score in cid_scores.items():
+            if cid > prev_max_citation_id and cid != canonical_citation_id:
+                cluster_canonicals[cid] = canonical_citation_id
+                duplicates[cid] = (canonical_citation_id, score)
+    for cid, canonical_citation_id in exact_dupes.items():
+        canonical_citation_id = existing_canonicals.get(
+            canonical_citation_id,
+            cluster_canonicals.get(canonical_citation_id, canonical_citation_id))
+        duplicates[cid] = (canonical_citation_id, 1.0)
+
+    stmt = select([Citation.id])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.id > prev_max_citation_id)\
+        .where(Citation.id <= max_citation_id)
+    new_cids = {result[0] for result in conn.execute(stmt).fetchall()}
+    studies_to_update = [
+        {'id': cid,
+         'dedupe_status': 'duplicate' if cid in duplicates else 'not_duplicate'}
+        for cid in new_cids]
+    dedupes_to_insert = [
+        {'id': cid,
+         'review_id': review_id,
+         'duplicate_of': canonical_citation_id,
+         'duplicate_score': score}
+        for cid, (canonical_citation_id, score) in duplicates.items()]
+    session = Session(bind=conn)
+    session.bulk_update_mappings(Study, studies_to_update)
+    session.bulk_insert_mappings(Dedupe, dedupes_to_insert)
+    session.commit()
+    logger.info(
+        '<Review(id=%s)>: found %s duplicate and %s non-duplicate new citations',
+        review_id, len(duplicates), len(new_cids) - len(duplicates))
+    _log_stage_time(review_id, 'write', start_time)
+    return threshold_values
+
+
+def _get_blocker(conn, deduper, review_id):
+    """
+    Get the blocker for a review's citations, as specified by the review itself
+    or else by the ``DEDUPE_BLOCKING_ENGINE`` config: either the deduper's own
+    learned predicates, or MinHash-LSH over titles and abstracts.
+
+    Returns:
+        Tuple[str, callable]: name of blocking engine, and its blocker
+    """
+    stmt = select([Review.dedupe_blocking_engine]).where(Review.id == review_id)
+    blocking_engine = (conn.execute(stmt).fetchone()[0] or
+                       current_app.config['DEDUPE_BLOCKING_ENGINE'])
+    if blocking_engine == 'minhash':
+        blocker = MinHashBlocker(
+            num_perm=current_app.config['DEDUPE_MINHASH_NUM_PERM'],
+            num_bands=current_app.config['DEDUPE_MINHASH_NUM_BANDS'],
+            max_block_size=current_app.config['DEDUPE_MINHASH_MAX_BLOCK_SIZE'])
+    else:
+        blocker = deduper.blocker
+    return blocking_engine, blocker
+
+
+def _clean_up_dedupe_tables(conn, review_id):
+    """
+    Delete a review's rows from dedupe's scratch tables once a run is done.
+    The coverage tables are only needed during a run; the blocking map and
+    plural key/block tables are kept for future incremental runs,
+    unless ``DEDUPE_KEEP_BLOCKING_TABLES`` is False.
+    """
+    tables = [DedupeCoveredBlocks, DedupeSmallerCoverage]
+    if current_app.config['DEDUPE_KEEP_BLOCKING_TABLES'] is False:
+        tables.extend([DedupeBlockingMap, DedupePluralKey, DedupePluralBlock])
+    for table in tables:
+        stmt = delete(table).where(table.review_id == review_id)
+        result = conn.execute(stmt)
+        logger.debug(
+            '<Review(id=%s)>: deleted %s rows from %s',
+            review_id, result.rowcount, table.__tablename__)
+
+
+def _save_dedupe_state(conn, review_id, max_citation_id, threshold_values,
+                       blocking_engine):
+    """
+    Record that a review's citations with ids up to and including ``max_citation_id``
+    have been deduped, using the similarity threshold in ``threshold_values``
+    and the blocking engine named ``blocking_engine``.
+    """
+    values = dict(threshold_values,
+                  max_citation_id=max_citation_id,
+                  blocking_engine=blocking_engine,
+                  last_updated=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    stmt = pg_insert(DedupeReviewState.__table__)\
+        .values(review_id=review_id, **values)\
+        .on_conflict_do_update(index_elements=['review_id'], set_=values)
+    conn.execute(stmt)
+
+
 @celery.task
-def deduplicate_citations(review_id):
+def deduplicate_citations(review_id, incremental=None):
 
     lock = wait_for_lock('deduplicate_citations_review_id={}'.format(review_id), expire=60)
 
-    deduper = load_dedupe_model(
+    if incremental is None:
+        incremental = current_app.config['DEDUPE_INCREMENTAL']
+
+    deduper = get_dedupe_model(
         os.path.join(current_app.config['DEDUPE_MODELS_DIR'],
-                     'dedupe_citations_settings'))
+                     'dedupe_citations_settings'),
+        num_cores=_get_num_processes('DEDUPE_NUM_CORES'))
     engine = create_engine(
         current_app.config['SQLALCHEMY_DATABASE_URI'],
         server_side_cursors=True, echo=False)
@@ -112,6 +685,70 @@ def deduplicate_citations(review_id):
                 sleep(10)
             else:
                 break
+        stmt = select([func.max(Citation.id)])\
+            .where(Citation.review_id == review_id)
+        max_citation_id = conn.execute(stmt).fetchone()[0]
+
+        # get included/excluded citations, which are preferred as canonical
+        stmt = select([Study.id])\
+            .where(Study.review_id == review_id)\
+            .where(Study.citation_status.in_(['included', 'excluded']))
+        incl_excl_cids = {result[0] for result in conn.execute(stmt).fetchall()}
+
+        # small reviews are blocked and matched entirely in memory,
+        # rather than via the blocking map and related tables
+        stmt = select([func.count(1)]).where(Citation.review_id == review_id)
+        n_citations = conn.execute(stmt).fetchone()[0]
+        in_memory = n_citations <= current_app.config['DEDUPE_IN_MEMORY_MAX_CITATIONS']
+        blocking_engine, blocker = _get_blocker(conn, deduper, review_id)
+
+        # if review has been deduped before, only dedupe citations added since then,
+        # unless there are so many of them that it's simpler to start from scratch
+        stmt = select([DedupeReviewState.max_citation_id,
+                       DedupeReviewState.threshold,
+                       DedupeReviewState.threshold_sample_size,
+                       DedupeReviewState.threshold_review_size,
+                       DedupeReviewState.blocking_engine])\
+            .where(DedupeReviewState.review_id == review_id)
+        state = conn.execute(stmt).fetchone()
+        if (incremental is True and in_memory is False and blocking_engine == 'dedupe' and
+                state is not None and (state.blocking_engine or 'dedupe') == blocking_engine):
+            # incremental runs extend the blocking map left by a previous run,
+            # which in-memory runs don't leave behind; minhash blocks are bounded
+            # in size by splitting across all citations, so they can't be extended
+            stmt = select([exists().where(DedupeBlockingMap.review_id == review_id)])
+            has_blocking_map = conn.execute(stmt).fetchone()[0]
+        else:
+            has_blocking_map = False
+        if has_blocking_map is True and state is not None and state.threshold is not None:
+            stmt = select([func.count(1)])\
+                .where(Citation.review_id == review_id)\
+                .where(Citation.id > state.max_citation_id)
+            n_new = conn.execute(stmt).fetchone()[0]
+            stmt = select([func.count(1)])\
+                .where(Citation.review_id == review_id)\
+                .where(Citation.id <= state.max_citation_id)
+            n_old = conn.execute(stmt).fetchone()[0]
+            if n_new == 0:
+                logger.warning('<Review(id=%s)>: all studies already deduped!', review_id)
+                lock.release()
+                return
+            if can_dedupe_incrementally(
+                    n_new, n_old, current_app.config['DEDUPE_INCREMENTAL_MAX_FRACTION']):
+                logger.info(
+                    '<Review(id=%s)>: deduping %s new citations against %s existing',
+                    review_id, n_new, n_old)
+                threshold_values = _deduplicate_new_citations(
+                    conn, deduper, review_id, state, max_citation_id, incl_excl_cids)
+                _save_dedupe_state(
+                    conn, review_id, max_citation_id, threshold_values, blocking_engine)
+                _clean_up_dedupe_tables(conn, review_id)
+                deduper.blocker.resetIndices()
+                lock.release()
+                return
+            logger.info(
+                '<Review(id=%s)>: too many new citations (%s) for incremental dedupe, '
+                'so deduping all citations', review_id, n_new)
 
         # if studies have been deduped since most recent import, cancel
         # stmt = select(
@@ -127,7 +764,7 @@ def deduplicate_citations(review_id):
         # remove rows for this review
         # which we'll add back with the latest citations included
         for table in [Dedupe, DedupeBlockingMap, DedupePluralKey, DedupePluralBlock,
-                      DedupeCoveredBlocks, DedupeSmallerCoverage]:
+                      DedupeCoveredBlocks, DedupeSmallerCoverage, DedupeReviewState]:
             stmt = delete(table).where(getattr(table, 'review_id') == review_id)
             result = conn.execute(stmt)
             rows_deleted = result.rowcount
@@ -135,154 +772,136 @@ def deduplicate_citations(review_id):
                 '<Review(id=%s)>: deleted %s rows from %s',
                 review_id, rows_deleted, table.__tablename__)
 
-        # if deduper learned an Index Predicate
-        # we have to take a pass through the data and create indices
-        for field in deduper.blocker.index_fields:
-            col_type = getattr(Citation, field).property.columns[0].type
-            # print('index predicate: {} {}'.format(field, col_type))
-            logger.debug(
-                '<Review(id=%s)>: index predicate: %s %s', review_id, field, col_type)
-            stmt = select([getattr(Citation, field)])\
-                .where(Citation.review_id == review_id)\
-                .distinct()
-            results = conn.execute(stmt)
-            if isinstance(col_type, sqltypes.ARRAY):
-                field_data = (tuple(row[0]) for row in results)
-            else:
-                field_data = (row[0] for row in results)
-            deduper.blocker.index(field_data, field)
+        start_time = time()
 
-        # now we're ready to write our blocking map table by creating a generator
-        # that yields unique (block_key, citation_id, review_id) tuples
-        stmt = select([Citation.id, Citation.title, Citation.authors,
-                       Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
-                       Citation.abstract, Citation.doi])\
-            .where(Citation.review_id == review_id)
-        results = conn.execute(stmt)
-        data = ((row[0], make_record_immutable(dict(row)))
-                for row in results)
-        b_data = ((citation_id, review_id, block_key)
-                  for block_key, citation_id in deduper.blocker(data))
-        conn.execute(
-            DedupeBlockingMap.__table__.insert(),
-            [{'citation_id': row[0], 'review_id': row[1], 'block_key': row[2]}
-             for row in b_data])
-
-        # now fill review rows back in
-        stmt = select([DedupeBlockingMap.review_id, DedupeBlockingMap.block_key])\
-            .where(DedupeBlockingMap.review_id == review_id)\
-            .group_by(DedupeBlockingMap.review_id, DedupeBlockingMap.block_key)\
-            .having(func.count(1) > 1)
-        conn.execute(
-            DedupePluralKey.__table__.insert()\
-                .from_select(['review_id', 'block_key'], stmt))
-
-        stmt = select([DedupePluralKey.block_id,
-                       DedupeBlockingMap.citation_id,
-                       DedupeBlockingMap.review_id])\
-            .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key)\
-            .where(DedupeBlockingMap.review_id == review_id)
-        conn.execute(
-            DedupePluralBlock.__table__.insert()\
-                .from_select(['block_id', 'citation_id', 'review_id'], stmt))
-
-        # To use Kolb, et. al's Redundant Free Comparison scheme, we need to
-        # keep track of all the block_ids that are associated with particular
-        # citation records
-        stmt = select([DedupePluralBlock.citation_id,
-                       DedupePluralBlock.review_id,
-                       func.array_agg(aggregate_order_by(DedupePluralBlock.block_id,
-                                                         DedupePluralBlock.block_id.desc()),
-                                      type_=sqltypes.ARRAY(sqltypes.BigInteger)).label('sorted_ids')])\
-            .where(DedupePluralBlock.review_id == review_id)\
-            .group_by(DedupePluralBlock.citation_id, DedupePluralBlock.review_id)
-        conn.execute(
-            DedupeCoveredBlocks.__table__.insert()\
-                .from_select(['citation_id', 'review_id', 'sorted_ids'], stmt))
-
-        # for every block of records, we need to keep track of a citation records's
-        # associated block_ids that are SMALLER than the current block's id
-        ugh = 'dedupe_covered_blocks.sorted_ids[0: array_position(dedupe_covered_blocks.sorted_ids, dedupe_plural_block.block_id) - 1] AS smaller_ids'
-        stmt = select([DedupePluralBlock.citation_id,
-                       DedupePluralBlock.review_id,
-                       DedupePluralBlock.block_id,
-                       text(ugh)])\
-            .where(DedupePluralBlock.citation_id == DedupeCoveredBlocks.citation_id)\
-            .where(DedupePluralBlock.review_id == review_id)
-        conn.execute(
-            DedupeSmallerCoverage.__table__.insert()\
-                .from_select(['citation_id', 'review_id', 'block_id', 'smaller_ids'], stmt))
+        # citations with identical fingerprints are certainly duplicates,
+        # so set them aside rather than running them through the dedupe model
+        _refresh_fingerprints(conn, review_id)
+        exact_dupes = _get_exact_duplicates(conn, review_id, incl_excl_cids)
+        logger.info(
+            '<Review(id=%s)>: found %s exact duplicate citations',
+            review_id, len(exact_dupes))
+
+        if blocking_engine == 'dedupe':
+            _index_citations(conn, deduper, review_id)
+        start_time = _log_stage_time(review_id, 'index', start_time)
 
-        # set dedupe model similarity threshold from the data
         stmt = select([Citation.id, Citation.title, Citation.authors,
                        Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
                        Citation.abstract, Citation.doi])\
-            .where(Citation.review_id == review_id)\
-            .order_by(func.random())\
-            .limit(20000)
-        results = conn.execute(stmt)
-        dupe_threshold = deduper.threshold(
-            {row.id: make_record_immutable(dict(row)) for row in results},
-            recall_weight=0.5)
-
-        # apply dedupe model to get clusters of duplicate records
-        stmt = select([Citation.id.label('citation_id'), Citation.title, Citation.authors,
-                       Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
-                       Citation.abstract, Citation.doi,
-                       DedupeSmallerCoverage.block_id, DedupeSmallerCoverage.smaller_ids])\
-            .where(Citation.id == DedupeSmallerCoverage.citation_id)\
-            .where(Citation.review_id == review_id)\
-            .order_by(DedupeSmallerCoverage.block_id)
-        results = conn.execute(stmt)
+            .where(Citation.review_id == review_id)
+        if in_memory is True:
+            records = {row.id: make_record_immutable(dict(row))
+                       for row in conn.execute(stmt)
+                       if row.id not in exact_dupes}
+            block_cids, covered_block_ids = get_blocks(blocker, records)
+        else:
+            # now we're ready to write our blocking map table by creating a generator
+            # that yields unique (block_key, citation_id, review_id) tuples
+            _write_blocking_map(conn, blocker, review_id, stmt, exact_dupes)
+
+            # now fill review rows back in
+            stmt = select([DedupeBlockingMap.review_id, DedupeBlockingMap.block_key])\
+                .where(DedupeBlockingMap.review_id == review_id)\
+                .group_by(DedupeBlockingMap.review_id, DedupeBlockingMap.block_key)\
+                .having(func.count(1) > 1)
+            conn.execute(
+                DedupePluralKey.__table__.insert()\
+                    .from_select(['review_id', 'block_key'], stmt))
+
+            stmt = select([DedupePluralKey.block_id,
+                           DedupeBlockingMap.citation_id,
+                           DedupeBlockingMap.review_id])\
+                .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key)\
+                .where(DedupePluralKey.review_id == review_id)\
+                .where(DedupeBlockingMap.review_id == review_id)
+            conn.execute(
+                DedupePluralBlock.__table__.insert()\
+                    .from_select(['block_id', 'citation_id', 'review_id'], stmt))
+
+            # To use Kolb, et. al's Redundant Free Comparison scheme, we need to
+            # keep track of all the block_ids that are associated with particular
+            # citation records
+            stmt = select([DedupePluralBlock.citation_id,
+                           DedupePluralBlock.review_id,
+                           func.array_agg(aggregate_order_by(DedupePluralBlock.block_id,
+                                                             DedupePluralBlock.block_id.desc()),
+                                          type_=sqltypes.ARRAY(sqltypes.BigInteger)).label('sorted_ids')])\
+                .where(DedupePluralBlock.review_id == review_id)\
+                .group_by(DedupePluralBlock.citation_id, DedupePluralBlock.review_id)
+            conn.execute(
+                DedupeCoveredBlocks.__table__.insert()\
+                    .from_select(['citation_id', 'review_id', 'sorted_ids'], stmt))
+
+            # for every block of records, we need to keep track of a citation records's
+            # associated block_ids that are SMALLER than the current block's id
+            ugh = 'dedupe_covered_blocks.sorted_ids[0: array_position(dedupe_covered_blocks.sorted_ids, dedupe_plural_block.block_id) - 1] AS smaller_ids'
+            stmt = select([DedupePluralBlock.citation_id,
+                           DedupePluralBlock.review_id,
+                           DedupePluralBlock.block_id,
+                           text(ugh)])\
+                .where(DedupePluralBlock.citation_id == DedupeCoveredBlocks.citation_id)\
+                .where(DedupePluralBlock.review_id == review_id)
+            conn.execute(
+                DedupeSmallerCoverage.__table__.insert()\
+                    .from_select(['citation_id', 'review_id', 'block_id', 'smaller_ids'], stmt))
+        start_time = _log_stage_time(review_id, 'blocking', start_time)
+
+        # set dedupe model similarity threshold from the data, unless it's
+        # been set before and the review hasn't grown much since then
+        threshold_values = _get_dedupe_threshold(conn, deduper, review_id, state, exact_dupes)
+        start_time = _log_stage_time(review_id, 'threshold', start_time)
+
+        # apply dedupe model to get clusters of duplicate records;
+        # blocks are streamed from the db a bounded number of rows at a time,
+        # and scored in parallel if the deduper has multiple cores available
+        if in_memory is True:
+            candidate_dupes = iter_candidate_dupes(
+                block_cids, covered_block_ids, records)
+        else:
+            stmt = select([Citation.id.label('citation_id'), Citation.title, Citation.authors,
+                           Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                           Citation.abstract, Citation.doi,
+                           DedupeSmallerCoverage.block_id, DedupeSmallerCoverage.smaller_ids])\
+                .where(Citation.id == DedupeSmallerCoverage.citation_id)\
+                .where(Citation.review_id == review_id)\
+                .order_by(DedupeSmallerCoverage.block_id)\
+                .execution_options(
+                    stream_results=True,
+                    max_row_buffer=current_app.config['DEDUPE_MATCH_CHUNK_SIZE'])
+            results = conn.execute(stmt)
+            candidate_dupes = _get_candidate_dupes(results)
 
-        clustered_dupes = deduper.matchBlocks(
-            _get_candidate_dupes(results),
-            threshold=dupe_threshold)
+        if in_memory is True and not block_cids:
+            clustered_dupes = []
+        else:
+            clustered_dupes = deduper.matchBlocks(
+                candidate_dupes, threshold=threshold_values['threshold'])
         logger.info(
             '<Review(id=%s)>: found %s duplicate clusters',
             review_id, len(clustered_dupes))
+        start_time = _log_stage_time(review_id, 'match', start_time)
 
-        # get *all* citation ids for this review, as well as included/excluded
+        # get *all* citation ids for this review
         stmt = select([Citation.id]).where(Citation.review_id == review_id)
         all_cids = {result[0] for result in conn.execute(stmt).fetchall()}
-        stmt = select([Study.id])\
-            .where(Study.review_id == review_id)\
-            .where(Study.citation_status.in_(['included', 'excluded']))
-        incl_excl_cids = {result[0] for result in conn.execute(stmt).fetchall()}
 
         duplicate_cids = set()
+        cluster_canonicals = {}
+
+        # pick every cluster's canonical citation in one go
+        clusters = [[int(cid) for cid in cids] for cids, _ in clustered_dupes]
+        canonical_cids = _get_canonical_citation_ids(
+            conn, review_id, clusters, incl_excl_cids)
 
         studies_to_update = []
         dedupes_to_insert = []
-        for cids, scores in clustered_dupes:
-            int_cids = [int(cid) for cid in cids]
+        for int_cids, (_, scores), canonical_citation_id in zip(
+                clusters, clustered_dupes, canonical_cids):
             cid_scores = {cid: float(score) for cid, score in zip(int_cids, scores)}
-            if any(cid in incl_excl_cids for cid in int_cids):
-                canonical_citation_id = sorted(set(int_cids).intersection(incl_excl_cids))[0]
-            else:
-                stmt = select([Citation.id,
-                               (case([(Citation.title == None, 1)]) +
-                                case([(Citation.abstract == None, 1)]) +
-                                case([(Citation.pub_year == None, 1)]) +
-                                case([(Citation.pub_month == None, 1)]) +
-                                case([(Citation.authors == {}, 1)]) +
-                                case([(Citation.keywords == {}, 1)]) +
-                                case([(Citation.type_of_reference == None, 1)]) +
-                                case([(Citation.journal_name == None, 1)]) +
-                                case([(Citation.issue_number == None, 1)]) +
-                                case([(Citation.doi == None, 1)]) +
-                                case([(Citation.issn == None, 1)]) +
-                                case([(Citation.publisher == None, 1)]) +
-                                case([(Citation.language == None, 1)])
-                                ).label('n_null_cols')])\
-                    .where(Citation.review_id == review_id)\
-                    .where(Citation.id.in_(int_cids))\
-                    .order_by(text('n_null_cols ASC'))\
-                    .limit(1)
-                result = conn.execute(stmt).fetchone()
-                canonical_citation_id = result.id
             for cid, score in cid_scores.items():
                 if cid != canonical_citation_id:
+                    cluster_canonicals[cid] = canonical_citation_id
                     duplicate_cids.add(cid)
                     studies_to_update.append(
                         {'id': cid,
@@ -292,6 +911,19 @@ def deduplicate_citations(review_id):
                          'review_id': review_id,
                          'duplicate_of': canonical_citation_id,
                          'duplicate_score': score})
+        # exact duplicates point at their canonical citation's canonical, if it too
+        # turned out to be a duplicate of some other citation
+        for cid, canonical_citation_id in exact_dupes.items():
+            duplicate_cids.add(cid)
+            studies_to_update.append(
+                {'id': cid,
+                 'dedupe_status': 'duplicate'})
+            dedupes_to_insert.append(
+                {'id': cid,
+                 'review_id': review_id,
+                 'duplicate_of': cluster_canonicals.get(canonical_citation_id,
+                                                        canonical_citation_id),
+                 'duplicate_score': 1.0})
         non_duplicate_cids = all_cids - duplicate_cids
         studies_to_update.extend(
             {'id': cid, 'dedupe_status': 'not_duplicate'}
@@ -303,7 +935,13 @@ def deduplicate_citations(review_id):
         logger.info(
             '<Review(id=%s)>: found %s duplicate and %s non-duplicate citations',
             review_id, len(duplicate_cids), len(non_duplicate_cids))
+        _save_dedupe_state(
+            conn, review_id, max_citation_id, threshold_values, blocking_engine)
+        _clean_up_dedupe_tables(conn, review_id)
+        _log_stage_time(review_id, 'write', start_time)
 
+    # free up memory held by this review's indices, since the model is cached
+    deduper.blocker.resetIndices()
     lock.release()
 
 
@@ -313,8 +951,6 @@ def get_citations_text_content_vectors(review_id):
     lock = wait_for_lock(
         'get_citations_text_content_vectors_review_id={}'.format(review_id), expire=60)
 
-    en_nlp = textacy.load_spacy(
-        'en', tagger=False, parser=False, entity=False, matcher=False)
     engine = create_engine(
         current_app.config['SQLALCHEMY_DATABASE_URI'],
         server_side_cursors=True, echo=False)
@@ -339,44 +975,88 @@ def get_citations_text_content_vectors(review_id):
             else:
                 break
 
-        stmt = select([Citation.id, Citation.text_content])\
-            .where(Citation.review_id == review_id)\
-            .where(Citation.text_content_vector_rep == [])\
-            .order_by(Citation.id)
-        results = conn.execute(stmt)
-        citations_to_update = []
-        for id_, text_content in results:
-            lang = textacy.text_utils.detect_language(text_content)
-            if lang == 'en':
-                try:
-                    spacy_doc = en_nlp(text_content)
-                except Exception as e:
-                    logger.exception(
-                        'unable to tokenize text content for <Citation(study_id=%s)>', id_)
-                    continue
-                citations_to_update.append(
-                    {'id': id_, 'text_content_vector_rep': spacy_doc.vector.tolist()})
-            else:
-                logger.warning(
-                    'lang "%s" detected for <Citation(study_id=%s)>', lang, id_)
-
-        # TODO: collect (id, lang) pairs for those that aren't lang == 'en'
-        # filter to those that can be tokenized and word2vec-torized
-        # group by lang, then load the necessary models to do this for groups
-
-        if not citations_to_update:
+        n_citations = conn.execute(
+            select([func.count(Citation.id)])
+            .where(Citation.review_id == review_id)
+            .where(Citation.text_content_vector_rep.is_(None))).scalar()
+        if not n_citations:
             logger.warning(
                 '<Review(id=%s)>: no citation text_content_vector_reps to update',
                 review_id)
             lock.release()
             return
 
-        session = Session(bind=conn)
-        session.bulk_update_mappings(Citation, citations_to_update)
-        session.commit()
+        chunk_size = current_app.config['NLP_VECTORIZE_CHUNK_SIZE']
+        n_jobs = _get_num_processes('NLP_VECTORIZE_N_JOBS')
+        stmt = select([Citation.id, Citation.text_content])\
+            .where(Citation.review_id == review_id)\
+            .where(Citation.text_content_vector_rep.is_(None))\
+            .order_by(Citation.id)\
+            .execution_options(stream_results=True, max_row_buffer=chunk_size)
+        results = conn.execute(stmt)
+
+        # detect languages up front, so each language's model is loaded just once
+        start_time = time()
+        lang_cids = collections.defaultdict(list)
+        for id_langs in iter_text_content_langs(
+                ((id_, text_content) for id_, text_content in results),
+                chunk_size=chunk_size, n_jobs=n_jobs):
+            for id_, lang in id_langs:
+                lang_cids[lang].append(id_)
+        logger.info(
+            '<Review(id=%s)>: detected langs %s',
+            review_id, {lang: len(cids) for lang, cids in lang_cids.items()})
+        _log_stage_time(review_id, 'language detection', start_time)
+
+        # vectors are written on a separate connection as each chunk is done,
+        # so commits don't close the server-side cursor that's still being read
+        n_updated = 0
+        start_time = time()
+        preload_langs = current_app.config['NLP_PRELOAD_LANGS']
+        with engine.connect() as write_conn:
+            session = Session(bind=write_conn)
+            for lang, cids in sorted(lang_cids.items(), key=lambda item: len(item[1]), reverse=True):
+                stmt = select([Citation.id, Citation.text_content])\
+                    .where(Citation.id == any_(bindparam('cids', value=cids, type_=sqltypes.ARRAY(sqltypes.BigInteger))))\
+                    .order_by(Citation.id)\
+                    .execution_options(stream_results=True, max_row_buffer=chunk_size)
+                results = conn.execute(stmt)
+                # each language's vectors are a separate space, as are fallback vectors;
+                # the space is stored alongside, so models only mix vectors from one
+                vector_space = get_vector_space(
+                    lang, current_app.config['NLP_VECTOR_DIM'],
+                    max_models=current_app.config['NLP_MODEL_CACHE_MAX_MODELS'],
+                    max_memory_mb=current_app.config['NLP_MODEL_CACHE_MAX_MEMORY_MB'])
+                vectorized_chunks = iter_text_content_vectors(
+                    ((id_, text_content) for id_, text_content in results),
+                    vector_space=vector_space,
+                    batch_size=current_app.config['NLP_VECTORIZE_BATCH_SIZE'],
+                    chunk_size=chunk_size, n_jobs=n_jobs,
+                    vector_dim=current_app.config['NLP_VECTOR_DIM'],
+                    max_models=current_app.config['NLP_MODEL_CACHE_MAX_MODELS'],
+                    max_memory_mb=current_app.config['NLP_MODEL_CACHE_MAX_MEMORY_MB'])
+                for vectors in vectorized_chunks:
+                    if vectors:
+                        session.bulk_update_mappings(
+                            Citation,
+                            [{'id': id_, 'text_content_vector_rep': vector,
+                              'text_content_vector_space': vector_space}
+                             for id_, vector in vectors])
+                        session.commit()
+                    n_updated += len(vectors)
+                    logger.info(
+                        '<Review(id=%s)>: vectorized %s of %s citations (%.1f per sec)',
+                        review_id, n_updated, n_citations,
+                        n_updated / max(time() - start_time, 1e-6))
+                # this run is done with lang, so free up its model's memory
+                if lang not in preload_langs:
+                    evict_spacy_model(lang)
+            session.close()
+        _log_stage_time(review_id, 'vectorization', start_time)
+
         logger.info(
             '<Review(id=%s)>: %s citation text_content_vector_reps updated',
-            review_id, len(citations_to_update))
+            review_id, n_updated)
 
     lock.release()
 
@@ -410,8 +1090,10 @@ def get_fulltext_text_content_vector(review_id, fulltext_id):
 
         lang = textacy.text_utils.detect_language(text_content)
         try:
-            nlp = textacy.load_spacy(
-                lang, tagger=False, parser=False, entity=False, matcher=False)
+            nlp = get_spacy_model(
+                lang,
+                max_models=current_app.config['NLP_MODEL_CACHE_MAX_MODELS'],
+                max_memory_mb=current_app.config['NLP_MODEL_CACHE_MAX_MEMORY_MB'])
         except RuntimeError:
             logger.warning(
                 'unable to load spacy lang "%s" for <Fulltext(study_id=%s)>',
@@ -420,7 +1102,7 @@ def get_fulltext_text_content_vector(review_id, fulltext_id):
             return
         spacy_doc = nlp(text_content)
         try:
-            text_content_vector_rep = spacy_doc.vector.tolist()
+            text_content_vector_rep = spacy_doc.vector
         except ValueError:
             logger.warning(
                 'unable to get lang "%s" word vectors for <Fulltext(study_id=%s)>',
@@ -430,7 +1112,8 @@ def get_fulltext_text_content_vector(review_id, fulltext_id):
 
         stmt = update(Fulltext)\
             .where(Fulltext.id == fulltext_id)\
-            .values(text_content_vector_rep=text_content_vector_rep)
+            .values(text_content_vector_rep=text_content_vector_rep,
+                    text_content_vector_space=lang)
         conn.execute(stmt)
 
         lock.release()
@@ -515,7 +1198,7 @@ def train_citation_ranking_model(review_id):
         n_iters = 1
         while True:
             stmt = select(
-                [exists().where(Citation.review_id == review_id).where(Citation.text_content_vector_rep != [])])
+                [exists().where(Citation.review_id == review_id).where(Citation.text_content_vector_rep.isnot(None))])
             citations_ready = conn.execute(stmt).fetchone()[0]
             if citations_ready is True:
                 break
@@ -533,26 +1216,45 @@ def train_citation_ranking_model(review_id):
             n_iters += 1
 
         # get random sample of included citations
-        stmt = select([Citation.text_content_vector_rep, Study.citation_status])\
+        stmt = select([Citation.text_content_vector_rep,
+                       Citation.text_content_vector_space,
+                       Study.citation_status])\
             .where(Study.id == Citation.id)\
             .where(Study.review_id == review_id)\
             .where(Study.dedupe_status == 'not_duplicate')\
             .where(Study.citation_status.in_(['included', 'excluded']))\
-            .where(Citation.text_content_vector_rep != [])
+            .where(Citation.text_content_vector_rep.isnot(None))
         results = conn.execute(stmt).fetchall()
 
-    # build features matrix and labels vector
-    X = np.vstack(tuple(result[0] for result in results))
-    y = np.array(tuple(1 if result[1] == 'included' else 0 for result in results))
-
-    # train the classifier
-    clf = SGDClassifier(class_weight='balanced').fit(X, y)
+    # vectors in different spaces (languages, or fallback) aren't comparable,
+    # so a separate classifier is trained for each space with both labels
+    space_results = collections.defaultdict(list)
+    for result in results:
+        space_results[result[1]].append(result)
+    clfs = {}
+    for vector_space, space_rows in space_results.items():
+        # build features matrix and labels vector
+        X = np.vstack(tuple(row[0] for row in space_rows))
+        y = np.array(tuple(1 if row[2] == 'included' else 0 for row in space_rows))
+        if len(np.unique(y)) < 2:
+            logger.info(
+                '<Review(id=%s)>: not enough labeled citations in vector space "%s" '
+                'to train a ranking model', review_id, vector_space)
+            continue
+        # train the classifier
+        clfs[vector_space] = SGDClassifier(class_weight='balanced').fit(X, y)
+    if not clfs:
+        logger.warning(
+            '<Review(id=%s)>: no vector space with both included and excluded citations',
+            review_id)
+        lock.release()
+        return
 
     # save to disk!
     fname = CITATION_RANKING_MODEL_FNAME.format(review_id=review_id)
     filepath = os.path.join(
         current_app.config['RANKING_MODELS_DIR'], str(review_id), fname)
-    joblib.dump(clf, filepath)
+    joblib.dump(clfs, filepath)
     logger.info(
         '<Review(id=%s)>: citation ranking model saved to %s', review_id, filepath)
 
@@ -0,0 +1,31 @@
+"""empty message
+
+Revision ID: c2e8a5d4f6b1
+Revises: b7d3f1a9c2e5
+Create Date: 2026-10-17 17:24:08.173590
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8a5d4f6b1'
+down_revision = 'b7d3f1a9c2e5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+SCRATCH_TABLES = ['dedupe_blocking_map', 'dedupe_plural_key', 'dedupe_plural_block',
+                  'dedupe_covered_blocks', 'dedupe_smaller_coverage']
+
+
+def upgrade():
+    # purge leftover scratch rows, which are rebuilt on the next dedupe of each review,
+    # then stop writing these tables to the WAL
+    op.execute('TRUNCATE TABLE {}'.format(', '.join(SCRATCH_TABLES)))
+    for table in SCRATCH_TABLES:
+        op.execute('ALTER TABLE {} SET UNLOGGED'.format(table))
+
+
+def downgrade():
+    for table in SCRATCH_TABLES:
+        op.execute('ALTER TABLE {} SET LOGGED'.format(table))
@@ -5,6 +5,10 @@ echo "working in $bin_dir"
 cd $bin_dir
 
 celery multi restart worker -A "celery_worker.celery"
+if [ -n "$COLANDR_CELERY_MULTIPROCESS_QUEUE" ];
+then
+  celery multi restart multiprocess_worker -A "celery_worker.celery" -Q "$COLANDR_CELERY_MULTIPROCESS_QUEUE" -P solo
+fi
 
 pid_file="colandr.pid"
 #echo $pid_file
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Compare the wall time of loading synthetic citations into the database via
+Postgres' COPY versus parameter-bound INSERTs. All loads are rolled back, so
+no data is actually added to the specified review.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import logging
+import os
+import random
+import string
+import sys
+import time
+
+from colandr import create_app, db
+from colandr.lib.imports import CITATION_LOADERS, import_citations
+
+LOGGER = logging.getLogger('benchmark_bulk_load')
+LOGGER.setLevel(logging.INFO)
+if len(LOGGER.handlers) == 0:
+    _handler = logging.StreamHandler()
+    _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _handler.setFormatter(_formatter)
+    LOGGER.addHandler(_handler)
+
+
+def _random_words(rand, n):
+    return ' '.join(
+        ''.join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(2, 10)))
+        for _ in range(n))
+
+
+def generate_citations(n, review_id, seed=42):
+    """
+    Generate ``n`` synthetic, already-validated citation records, lazily.
+
+    Args:
+        n (int)
+        review_id (int)
+        seed (int)
+
+    Yields:
+        dict
+    """
+    rand = random.Random(seed)
+    for i in range(n):
+        yield {
+            'review_id': review_id,
+            'type_of_reference': 'journal',
+            'title': _random_words(rand, rand.randint(5, 20)).capitalize()[:300],
+            'abstract': _random_words(rand, rand.randint(100, 300)),
+            'pub_year': rand.randint(1950, 2017),
+            'authors': sorted(
+                '{}, {}.'.format(_random_words(rand, 1).capitalize(),
+                                 rand.choice(string.ascii_uppercase))
+                for _ in range(rand.randint(1, 8))),
+            'keywords': sorted(_random_words(rand, 2) for _ in range(rand.randint(0, 6))),
+            'journal_name': _random_words(rand, 3).title(),
+            'volume': str(rand.randint(1, 100)),
+            'doi': '10.{}/{}'.format(rand.randint(1000, 9999), i),
+            'other_fields': {'accession_number': 'WOS:{:015d}'.format(i),
+                             'times_cited': str(rand.randint(0, 500))},
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark COPY vs INSERT bulk loading of citations.')
+    parser.add_argument(
+        '--config', type=str, default=os.getenv('COLANDR_FLASK_CONFIG', 'dev'),
+        help='name of app configuration whose database will be used')
+    parser.add_argument(
+        '--review_id', type=int, required=True,
+        help='unique identifier of an existing review, to which citations are loaded')
+    parser.add_argument(
+        '--user_id', type=int, required=True,
+        help='unique identifier of an existing user, who "imports" the citations')
+    parser.add_argument(
+        '--data_source_id', type=int, required=True,
+        help='unique identifier of an existing data source for the citations')
+    parser.add_argument(
+        '--n_records', type=int, nargs='+', default=[10000, 100000, 500000],
+        help='number(s) of synthetic citation records to load')
+    parser.add_argument(
+        '--loaders', type=str, nargs='+', default=sorted(CITATION_LOADERS.keys()),
+        choices=sorted(CITATION_LOADERS.keys()),
+        help='loading method(s) to benchmark')
+    parser.add_argument(
+        '--chunk_size', type=int, default=1000,
+        help='max number of records loaded per batch')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        results = []
+        for n_records in args.n_records:
+            for loader in args.loaders:
+                with db.engine.connect() as conn:
+                    trans = conn.begin()
+                    start_time = time.time()
+                    n_loaded = import_citations(
+                        conn, generate_citations(n_records, args.review_id),
+                        args.user_id, args.review_id, args.data_source_id,
+                        chunk_size=args.chunk_size, loader=loader)
+                    elapsed_time = time.time() - start_time
+                    trans.rollback()
+                LOGGER.info(
+                    'loader=%s: loaded %s records in %.2f sec (%.0f records/sec)',
+                    loader, n_loaded, elapsed_time, n_loaded / elapsed_time)
+                results.append((n_records, loader, elapsed_time))
+
+    print('\n{:>10}  {:>8}  {:>10}  {:>12}'.format('n_records', 'loader', 'seconds', 'records/sec'))
+    for n_records, loader, elapsed_time in results:
+        print('{:>10}  {:>8}  {:>10.2f}  {:>12.0f}'.format(
+            n_records, loader, elapsed_time, n_records / elapsed_time))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Benchmark citation deduplication's throughput and accuracy on synthetic reviews
+with known, injected duplicates: typos, missing DOIs, reordered authors, and so on.
+Blocking, thresholding, and matching are run in memory with the shipped dedupe
+settings, and wall time, peak RSS, pairwise comparisons, and precision/recall
+against the injected duplicates are reported for each review size.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+from colandr.lib.blocking import (MinHashBlocker, count_comparisons, get_blocks,
+                                  index_records, iter_candidate_dupes)
+from colandr.lib.utils import load_dedupe_model, make_record_immutable, reservoir_sample
+
+LOGGER = logging.getLogger('benchmark_dedupe')
+LOGGER.setLevel(logging.INFO)
+if len(LOGGER.handlers) == 0:
+    _handler = logging.StreamHandler()
+    _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _handler.setFormatter(_formatter)
+    LOGGER.addHandler(_handler)
+
+SETTINGS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'colandr_data', 'dedupe', 'dedupe_citations_settings')
+VOCAB_SIZE = 20000
+DUPE_KINDS = ('typo', 'missing_doi', 'author_order', 'truncated_abstract', 'missing_year')
+
+
+def _make_vocab(rand):
+    consonants, vowels = 'bcdfghjklmnprstvwz', 'aeiou'
+    return sorted({''.join(rand.choice(consonants) + rand.choice(vowels)
+                           for _ in range(rand.randint(2, 5)))
+                   for _ in range(VOCAB_SIZE)})
+
+
+def _words(rand, vocab, n):
+    # skew word choice toward the start of the vocab, as in real text
+    return ' '.join(vocab[min(int(rand.paretovariate(1.0)) - 1, len(vocab) - 1)
+                          if rand.random() < 0.3 else rand.randrange(len(vocab))]
+                    for _ in range(n))
+
+
+def _add_typos(rand, text, n_typos):
+    chars = list(text)
+    for _ in range(n_typos):
+        idx = rand.randrange(len(chars))
+        op = rand.choice(('swap', 'delete', 'replace'))
+        if op == 'swap' and idx < len(chars) - 1:
+            chars[idx], chars[idx + 1] = chars[idx + 1], chars[idx]
+        elif op == 'delete':
+            del chars[idx]
+        else:
+            chars[idx] = rand.choice('abcdefghijklmnopqrstuvwxyz')
+    return ''.join(chars)
+
+
+def _make_duplicate(rand, record, kind):
+    dupe = dict(record)
+    if kind == 'typo':
+        dupe['title'] = _add_typos(rand, record['title'], rand.randint(1, 3))
+    elif kind == 'missing_doi':
+        dupe['doi'] = None
+    elif kind == 'author_order':
+        authors = list(record['authors'])
+        rand.shuffle(authors)
+        dupe['authors'] = tuple(authors)
+    elif kind == 'truncated_abstract':
+        if record['abstract']:
+            dupe['abstract'] = record['abstract'][:rand.randint(50, 500)]
+    elif kind == 'missing_year':
+        dupe['publication_year'] = None
+    return dupe
+
+
+def generate_review(n_records, dupe_fraction=0.1, seed=42):
+    """
+    Generate a synthetic review's citation records, a fraction of which are
+    duplicates of others with one or two kinds of controlled differences.
+
+    Args:
+        n_records (int)
+        dupe_fraction (float)
+        seed (int)
+
+    Returns:
+        Tuple[dict, List[set]]: mapping of citation id to immutable record,
+        and sets of citation ids that are truly duplicates of each other
+    """
+    rand = random.Random(seed)
+    vocab = _make_vocab(rand)
+    n_dupes = int(n_records * dupe_fraction)
+    n_originals = n_records - n_dupes
+    records = {}
+    for cid in range(1, n_originals + 1):
+        records[cid] = {
+            'title': _words(rand, vocab, rand.randint(5, 20)),
+            'authors': tuple('{}, {}.'.format(_words(rand, vocab, 1).title(),
+                                             rand.choice('ABCDEFGHJKLMNPRSTW'))
+                             for _ in range(rand.randint(1, 8))),
+            'publication_year': rand.randint(1950, 2017) if rand.random() < 0.95 else None,
+            'abstract': _words(rand, vocab, rand.randint(100, 300)) if rand.random() < 0.9 else None,
+            'doi': '10.{}/j.{}'.format(rand.randint(1000, 9999), cid) if rand.random() < 0.8 else None,
+            }
+    clusters = {}
+    for cid in range(n_originals + 1, n_records + 1):
+        original_cid = rand.randint(1, n_originals)
+        dupe = records[original_cid]
+        for kind in rand.sample(DUPE_KINDS, rand.randint(1, 2)):
+            dupe = _make_duplicate(rand, dupe, kind)
+        records[cid] = dupe
+        clusters.setdefault(original_cid, {original_cid}).add(cid)
+    records = {cid: make_record_immutable(record) for cid, record in records.items()}
+    return records, list(clusters.values())
+
+
+def _get_pairs(clusters):
+    return {frozenset(pair)
+            for cluster in clusters
+            for pair in itertools.combinations(sorted(cluster), 2)}
+
+
+def benchmark_dedupe(n_records, settings_path, dupe_fraction, sample_size, num_cores,
+                     blocking_engine='dedupe'):
+    """
+    Run in-memory blocking, thresholding, and matching on a synthetic review
+    of ``n_records``. Meant to be run in a fresh process, so peak RSS is its own.
+
+    Returns:
+        dict
+    """
+    records, true_clusters = generate_review(n_records, dupe_fraction=dupe_fraction)
+    deduper = load_dedupe_model(settings_path, num_cores=num_cores)
+    timings = {}
+
+    start_time = time.time()
+    if blocking_engine == 'minhash':
+        blocker = MinHashBlocker()
+    else:
+        index_records(deduper, records)
+        blocker = deduper.blocker
+    block_cids, covered_block_ids = get_blocks(blocker, records)
+    timings['blocking'] = time.time() - start_time
+
+    start_time = time.time()
+    sample = reservoir_sample(records.items(), sample_size, random_state=random.Random(42))
+    dupe_threshold = deduper.threshold(dict(sample), recall_weight=0.5)
+    timings['threshold'] = time.time() - start_time
+
+    start_time = time.time()
+    if block_cids:
+        clustered_dupes = deduper.matchBlocks(
+            iter_candidate_dupes(block_cids, covered_block_ids, records),
+            threshold=dupe_threshold)
+    else:
+        clustered_dupes = []
+    timings['match'] = time.time() - start_time
+
+    n_comparisons = count_comparisons(
+        iter_candidate_dupes(block_cids, covered_block_ids, records))
+    true_pairs = _get_pairs(true_clusters)
+    pred_pairs = _get_pairs({int(cid) for cid in cids} for cids, _ in clustered_dupes)
+    n_true_positives = len(true_pairs & pred_pairs)
+    return {
+        'n_records': n_records,
+        'timings': timings,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'n_blocks': len(block_cids),
+        'max_block_size': max((len(cids) for cids in block_cids.values()), default=0),
+        'n_comparisons': n_comparisons,
+        'threshold': dupe_threshold,
+        'precision': n_true_positives / len(pred_pairs) if pred_pairs else 1.0,
+        'recall': n_true_positives / len(true_pairs) if true_pairs else 1.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark citation deduplication on synthetic reviews with known duplicates.')
+    parser.add_argument(
+        '--n_records', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='number(s) of citation records in each synthetic review')
+    parser.add_argument(
+        '--dupe_fraction', type=float, default=0.1,
+        help='fraction of records that are injected duplicates of others')
+    parser.add_argument(
+        '--settings_path', type=str, default=SETTINGS_PATH,
+        help='path to trained dedupe settings file')
+    parser.add_argument(
+        '--sample_size', type=int, default=20000,
+        help='number of records sampled to set the similarity threshold')
+    parser.add_argument(
+        '--num_cores', type=int, default=1,
+        help='number of processes used by dedupe to score candidate pairs')
+    parser.add_argument(
+        '--blocking_engine', type=str, default='dedupe', choices=['dedupe', 'minhash'],
+        help="blocking engine: dedupe's learned predicates, or MinHash-LSH")
+    args = parser.parse_args()
+
+    logging.getLogger('dedupe').setLevel(logging.WARNING)
+
+    results = []
+    for n_records in args.n_records:
+        LOGGER.info('deduping synthetic review with %s records', n_records)
+        # each run gets its own process, so that its peak RSS is measured separately
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(
+                benchmark_dedupe, n_records, args.settings_path,
+                args.dupe_fraction, args.sample_size, args.num_cores,
+                args.blocking_engine).result()
+        LOGGER.info(
+            'deduped %s records in %.2f sec', n_records, sum(result['timings'].values()))
+        results.append(result)
+
+    print('\n{:>10}  {:>9}  {:>9}  {:>9}  {:>9}  {:>12}  {:>9}  {:>9}  {:>9}  {:>9}'.format(
+        'n_records', 'block_sec', 'thres_sec', 'match_sec', 'peak_MB',
+        'comparisons', 'max_block', 'threshold', 'precision', 'recall'))
+    for result in results:
+        timings = result['timings']
+        print('{:>10}  {:>9.2f}  {:>9.2f}  {:>9.2f}  {:>9.0f}  {:>12}  {:>9}  {:>9.3f}  {:>9.3f}  {:>9.3f}'.format(
+            result['n_records'], timings['blocking'], timings['threshold'], timings['match'],
+            result['peak_rss_mb'], result['n_comparisons'], result['max_block_size'],
+            result['threshold'],
+            result['precision'], result['recall']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
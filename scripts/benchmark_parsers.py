@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Benchmark citation file parsing throughput on large exports, either real files
+given on the command line or synthetic Scopus-style (RIS), Web of Science-style
+(tagged), and PubMed XML exports generated on the fly. Exits with a non-zero status if any file
+parses slower than ``--min_records_per_sec``, so that regressions show up.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from colandr.lib.parsers import BibTexFile, EndNoteXmlFile, PubMedXmlFile, RisFile
+
+LOGGER = logging.getLogger('benchmark_parsers')
+LOGGER.setLevel(logging.INFO)
+if len(LOGGER.handlers) == 0:
+    _handler = logging.StreamHandler()
+    _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _handler.setFormatter(_formatter)
+    LOGGER.addHandler(_handler)
+
+
+def _words(rand, n):
+    return ' '.join('w{}'.format(rand.randint(0, 50000)) for _ in range(n))
+
+
+def write_scopus_export(filepath, n_records, seed=42):
+    """Write a synthetic Scopus-style RIS export with ``n_records`` to ``filepath``."""
+    rand = random.Random(seed)
+    with io.open(filepath, mode='wt', encoding='utf-8') as f:
+        for i in range(n_records):
+            f.write('TY  - JOUR\n')
+            f.write('TI  - {}\n'.format(_words(rand, rand.randint(5, 20))))
+            for _ in range(rand.randint(1, 8)):
+                f.write('AU  - {}, {}.\n'.format(_words(rand, 1), 'A'))
+            f.write('PY  - {}\n'.format(rand.randint(1950, 2017)))
+            f.write('DA  - {}/{:02d}/{:02d}\n'.format(
+                rand.randint(1950, 2017), rand.randint(1, 12), rand.randint(1, 28)))
+            f.write('T2  - {}\n'.format(_words(rand, 3)))
+            f.write('VL  - {}\nIS  - {}\nSP  - {}\nEP  - {}\n'.format(
+                rand.randint(1, 99), rand.randint(1, 12), i, i + 10))
+            f.write('DO  - 10.1016/j.{}\n'.format(i))
+            f.write('AB  - {}\n'.format(_words(rand, rand.randint(100, 300))))
+            for _ in range(rand.randint(0, 6)):
+                f.write('KW  - {}\n'.format(_words(rand, 2)))
+            f.write('SN  - {:04d}-{:04d}\n'.format(rand.randint(0, 9999), rand.randint(0, 9999)))
+            f.write('LA  - English\nDB  - Scopus\nER  - \n\n')
+
+
+def write_wos_export(filepath, n_records, seed=42):
+    """Write a synthetic Web of Science-style tagged export with ``n_records`` to ``filepath``."""
+    rand = random.Random(seed)
+    with io.open(filepath, mode='wt', encoding='utf-8') as f:
+        f.write('FN Clarivate Analytics Web of Science\nVR 1.0\n')
+        for i in range(n_records):
+            f.write('PT J\n')
+            authors = ['{}, {}'.format(_words(rand, 1), 'A') for _ in range(rand.randint(1, 8))]
+            f.write('AU ' + '\n   '.join(authors) + '\n')
+            f.write('TI {}\n'.format(_words(rand, rand.randint(5, 20))))
+            f.write('SO {}\n'.format(_words(rand, 3).upper()))
+            f.write('LA English\nDT Article\n')
+            f.write('DE {}\n'.format('; '.join(_words(rand, 2) for _ in range(5))))
+            f.write('AB {}\n'.format(_words(rand, rand.randint(100, 300))))
+            f.write('SC Environmental Sciences & Ecology; Biodiversity & Conservation\n')
+            f.write('TC {}\nZ9 {}\n'.format(rand.randint(0, 500), rand.randint(0, 500)))
+            f.write('SN {:04d}-{:04d}\n'.format(rand.randint(0, 9999), rand.randint(0, 9999)))
+            f.write('PD {}\nPY {}\n'.format(
+                rand.choice(['JAN', 'FEB', 'MAR', 'APR 15', 'SPR']), rand.randint(1950, 2017)))
+            f.write('DI 10.1111/j.{}\nUT WOS:{:015d}\nER\n\n'.format(i, i))
+        f.write('EF\n')
+
+
+def write_pubmed_export(filepath, n_records, seed=42):
+    """Write a synthetic PubMed XML export with ``n_records`` to ``filepath``."""
+    rand = random.Random(seed)
+    with io.open(filepath, mode='wt', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" ?>\n<!DOCTYPE PubmedArticleSet>\n<PubmedArticleSet>\n')
+        for i in range(n_records):
+            f.write('<PubmedArticle>\n<MedlineCitation Status="MEDLINE" Owner="NLM">\n')
+            f.write('<PMID Version="1">{}</PMID>\n<Article PubModel="Print">\n'.format(i + 1))
+            f.write('<Journal>\n<ISSN IssnType="Print">{:04d}-{:04d}</ISSN>\n'.format(
+                rand.randint(0, 9999), rand.randint(0, 9999)))
+            f.write('<JournalIssue CitedMedium="Print">\n<Volume>{}</Volume>\n<Issue>{}</Issue>\n'.format(
+                rand.randint(1, 99), rand.randint(1, 12)))
+            f.write('<PubDate>\n<Year>{}</Year>\n<Month>{}</Month>\n</PubDate>\n</JournalIssue>\n'.format(
+                rand.randint(1950, 2017), rand.choice(['Jan', 'Feb', 'Mar', 'Apr', '05'])))
+            f.write('<Title>{}</Title>\n</Journal>\n'.format(_words(rand, 3)))
+            f.write('<ArticleTitle>{}</ArticleTitle>\n'.format(_words(rand, rand.randint(5, 20))))
+            f.write('<Pagination><MedlinePgn>{}-{}</MedlinePgn></Pagination>\n'.format(i, i + 10))
+            f.write('<Abstract>\n<AbstractText Label="BACKGROUND">{}</AbstractText>\n'.format(
+                _words(rand, rand.randint(50, 150))))
+            f.write('<AbstractText Label="RESULTS">{}</AbstractText>\n</Abstract>\n'.format(
+                _words(rand, rand.randint(50, 150))))
+            f.write('<AuthorList CompleteYN="Y">\n')
+            for _ in range(rand.randint(1, 8)):
+                f.write('<Author ValidYN="Y"><LastName>{}</LastName><ForeName>A</ForeName></Author>\n'.format(
+                    _words(rand, 1)))
+            f.write('</AuthorList>\n<Language>eng</Language>\n</Article>\n')
+            f.write('<KeywordList Owner="NOTNLM">\n')
+            for _ in range(rand.randint(0, 6)):
+                f.write('<Keyword MajorTopicYN="N">{}</Keyword>\n'.format(_words(rand, 2)))
+            f.write('</KeywordList>\n</MedlineCitation>\n<PubmedData>\n<ArticleIdList>\n')
+            f.write('<ArticleId IdType="pubmed">{}</ArticleId>\n'.format(i + 1))
+            f.write('<ArticleId IdType="doi">10.1016/j.{}</ArticleId>\n'.format(i))
+            f.write('</ArticleIdList>\n</PubmedData>\n</PubmedArticle>\n')
+        f.write('</PubmedArticleSet>\n')
+
+
+def benchmark_file(filepath):
+    """
+    Returns:
+        Tuple[int, float]: number of records parsed, and elapsed time in seconds
+    """
+    if filepath.endswith('.bib'):
+        citations_file = BibTexFile(filepath)
+    elif filepath.endswith('.xml'):
+        with io.open(filepath, mode='rb') as f:
+            head = f.read(64 * 1024).decode('utf-8', errors='ignore')
+        file_cls = PubMedXmlFile if PubMedXmlFile.sniff(head) else EndNoteXmlFile
+        citations_file = file_cls(filepath)
+    else:
+        citations_file = RisFile(filepath)
+    start_time = time.time()
+    n_records = sum(1 for _ in citations_file.parse())
+    return n_records, time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing throughput for large citation files.')
+    parser.add_argument(
+        'filepaths', type=str, nargs='*', metavar='filepath',
+        help='citation files to parse; if none, synthetic exports are generated')
+    parser.add_argument(
+        '--n_records', type=int, default=100000,
+        help='number of records in each generated synthetic export')
+    parser.add_argument(
+        '--min_records_per_sec', type=float, default=None,
+        help='fail if any file parses slower than this rate')
+    args = parser.parse_args()
+
+    logging.getLogger('colandr').setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepaths = args.filepaths
+        if not filepaths:
+            filepaths = [os.path.join(tmpdir, 'scopus.ris'),
+                         os.path.join(tmpdir, 'wos.txt'),
+                         os.path.join(tmpdir, 'pubmed.xml')]
+            LOGGER.info('generating synthetic exports with %s records each', args.n_records)
+            write_scopus_export(filepaths[0], args.n_records)
+            write_wos_export(filepaths[1], args.n_records)
+            write_pubmed_export(filepaths[2], args.n_records)
+
+        results = []
+        for filepath in filepaths:
+            n_records, elapsed_time = benchmark_file(filepath)
+            size_mb = os.path.getsize(filepath) / (1024 * 1024)
+            results.append((os.path.basename(filepath), n_records, size_mb, elapsed_time))
+            LOGGER.info('parsed %s records from %s in %.2f sec', n_records, filepath, elapsed_time)
+
+    print('\n{:<24}  {:>10}  {:>8}  {:>8}  {:>12}  {:>8}'.format(
+        'file', 'n_records', 'MB', 'seconds', 'records/sec', 'MB/sec'))
+    failed = False
+    for fname, n_records, size_mb, elapsed_time in results:
+        records_per_sec = n_records / elapsed_time
+        print('{:<24}  {:>10}  {:>8.1f}  {:>8.2f}  {:>12.0f}  {:>8.1f}'.format(
+            fname, n_records, size_mb, elapsed_time, records_per_sec, size_mb / elapsed_time))
+        if args.min_records_per_sec and records_per_sec < args.min_records_per_sec:
+            LOGGER.error(
+                '%s parsed at %.0f records/sec, below minimum of %.0f',
+                fname, records_per_sec, args.min_records_per_sec)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
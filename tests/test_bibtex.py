@@ -0,0 +1,39 @@
+import io
+
+from colandr.lib.parsers.bibtex import BibTexFile
+
+
+ENTRY_WITH_AT_LINES = """
+@article{smith2001,
+  title = {First Title},
+  abstract = {Contact the authors at
+@example.com for data},
+  note = "quoted note
+@ starting a line",
+  year = {2001}
+}
+@article{jones2002,
+  title = {Second Title},
+  year = {2002}
+}
+"""
+
+
+def test_at_line_inside_field_value():
+    for chunk_size in (16, 1024 * 1024):
+        records = list(BibTexFile(io.StringIO(ENTRY_WITH_AT_LINES), chunk_size=chunk_size).parse())
+        assert [record['reference_id'] for record in records] == ['smith2001', 'jones2002']
+        assert records[0]['abstract'] == 'Contact the authors at @example.com for data'
+        assert '@ starting a line' in records[0]['notes']
+
+
+def test_at_line_inside_field_value_shards():
+    citations_file = BibTexFile(io.StringIO(ENTRY_WITH_AT_LINES))
+    shards = list(citations_file.iter_shards(1))
+    assert len(shards) == 2
+    errors = []
+    records = [record
+               for shard in shards
+               for _, record in citations_file.parse_shard(*shard, errors=errors)]
+    assert [record['reference_id'] for record in records] == ['smith2001', 'jones2002']
+    assert errors == []
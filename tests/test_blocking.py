@@ -0,0 +1,44 @@
+import numpy as np
+
+from colandr.lib.blocking import MinHashBlocker
+
+
+RECORD_PAIRS = [
+    ({'title': 'Effects of marine protected areas on coral reef fish biomass',
+      'abstract': 'We measured fish biomass inside and outside of protected areas.'},
+     {'title': 'Effects of marine protected areas on coral reef fish biomass',
+      'abstract': 'We measured fish biomass inside and outside of protected areas.'}),
+    ({'title': 'Effects of marine protected areas on coral reef fish biomass',
+      'abstract': 'We measured fish biomass inside and outside of protected areas.'},
+     {'title': 'Effects of marine protected area on coral reef fish biomas',
+      'abstract': 'We measured fish biomass inside and outside of protected areas.'}),
+    ({'title': 'Community forest management and deforestation in Nepal',
+      'abstract': 'Forest cover change was compared across community forests and state forests.'},
+     {'title': 'Community forestry and deforestation in the Nepalese hills',
+      'abstract': 'Forest cover change was compared across community forests.'}),
+    ({'title': 'Payments for ecosystem services and household income',
+      'abstract': None},
+     {'title': 'Wetland restoration improves downstream water quality',
+      'abstract': None}),
+    ]
+
+
+def _jaccard(set1, set2):
+    return len(set1 & set2) / len(set1 | set2)
+
+
+def test_minhash_estimates_jaccard():
+    blocker = MinHashBlocker(num_perm=512, num_bands=64)
+    for record1, record2 in RECORD_PAIRS:
+        exact = _jaccard(set(blocker.get_shingles(record1).tolist()),
+                         set(blocker.get_shingles(record2).tolist()))
+        estimated = np.mean(blocker.get_signature(record1) == blocker.get_signature(record2))
+        assert abs(estimated - exact) < 0.1, (exact, estimated)
+
+
+def test_minhash_signature_values():
+    blocker = MinHashBlocker()
+    signature = blocker.get_signature(RECORD_PAIRS[0][0])
+    assert signature.dtype == np.uint32
+    assert signature.shape == (blocker.num_perm,)
+    assert int(signature.max()) < 2 ** 31 - 1
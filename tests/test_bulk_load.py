@@ -0,0 +1,175 @@
+import datetime
+import os
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from colandr.lib.bulk_load import (NULL, _format_array, _format_value,
+                                   _get_literal_server_default, copy_rows)
+
+
+TEST_DATABASE_URI = os.environ.get('COLANDR_TEST_DATABASE_URI')
+
+ROWS = [
+    {'id': 1,
+     'title': 'tab\there, newline\nthere, carriage return\rand backslash \\ too',
+     'authors': ['Smith, J.', 'O"Brien, \\P.', '{braces}', 'x,y', ' padded ', 'NULL'],
+     'other_fields': {'note': 'line one\nline two\t"quoted" \\ end', 'n': 1},
+     'flag': True,
+     'pub_date': datetime.date(2016, 2, 29)},
+    {'id': 2,
+     'title': None,
+     'authors': ['Doe, Jane', None, ''],
+     'other_fields': {},
+     'flag': False,
+     'notes': 'explicit'},
+    {'id': 3,
+     'authors': [],
+     'other_fields': {'nested': {'list': [1, None, 'a\nb']}}},
+    ]
+
+
+def make_table(metadata, name):
+    return sa.Table(
+        name, metadata,
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('title', sa.UnicodeText),
+        sa.Column('authors', postgresql.ARRAY(sa.Unicode(length=100))),
+        sa.Column('other_fields', postgresql.JSONB, server_default='{}'),
+        sa.Column('flag', sa.Boolean, server_default='false'),
+        sa.Column('pub_date', sa.Date),
+        sa.Column('notes', sa.UnicodeText, server_default='n/a'),
+        prefixes=['TEMPORARY'])
+
+
+class FakeCursor(object):
+
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, stmt, buf):
+        self.copies.append((stmt, buf.read()))
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.cursor_ = FakeCursor()
+        self.connection = self
+
+    def cursor(self):
+        return self.cursor_
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('plain', 'plain'),
+    ('a\tb', 'a\\tb'),
+    ('a\nb', 'a\\nb'),
+    ('a\rb', 'a\\rb'),
+    ('a\\b', 'a\\\\b'),
+    ('\\N', '\\\\N'),
+    (None, NULL),
+    (True, 't'),
+    (False, 'f'),
+    (0, '0'),
+    (1.5, '1.5'),
+    (datetime.date(2016, 2, 29), '2016-02-29'),
+    (datetime.datetime(2016, 2, 29, 12, 30), '2016-02-29T12:30:00'),
+    ])
+def test_format_value_escaping(value, expected):
+    assert _format_value(value) == expected
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([], '{}'),
+    (['a', 'b'], '{"a","b"}'),
+    (['x,y', '{z}', ' padded '], '{"x,y","{z}"," padded "}'),
+    (['say "hi"'], '{"say \\"hi\\""}'),
+    (['back\\slash'], '{"back\\\\slash"}'),
+    ([None, 'a', None], '{NULL,"a",NULL}'),
+    (['NULL'], '{"NULL"}'),
+    ([['a', None], ['b', 'c']], '{{"a",NULL},{"b","c"}}'),
+    ((1, 2), '{"1","2"}'),
+    ])
+def test_format_array_quoting(values, expected):
+    assert _format_array(values) == expected
+
+
+def test_format_value_array_escaping():
+    # array quoting's backslashes are themselves escaped for the COPY field
+    assert _format_value(['a\\b', 'c\td']) == '{"a\\\\\\\\b","c\\td"}'
+    assert _format_value(['x', None]) == '{"x",NULL}'
+
+
+def test_format_value_json():
+    assert _format_value({}) == '{}'
+    assert _format_value({'a': 'x\ny'}) == '{"a": "x\\\\ny"}'
+    assert _format_value({'a': None, 'b': [1, True]}) == '{"a": null, "b": [1, true]}'
+
+
+def test_literal_server_defaults():
+    table = make_table(sa.MetaData(), 'bulk_load_defaults')
+    assert _get_literal_server_default(table.columns['other_fields']) == '{}'
+    assert _get_literal_server_default(table.columns['notes']) == 'n/a'
+    assert _get_literal_server_default(table.columns['flag']) == 'false'
+    # non-literal defaults (i.e. sql expressions) and missing defaults fall back to NULL
+    assert _get_literal_server_default(table.columns['title']) == NULL
+    created_at = sa.Column('created_at', sa.DateTime, server_default=sa.func.now())
+    assert _get_literal_server_default(created_at) == NULL
+    escaped = sa.Column('escaped', sa.UnicodeText, server_default='a\tb')
+    assert _get_literal_server_default(escaped) == 'a\\tb'
+
+
+def test_copy_rows_text():
+    table = make_table(sa.MetaData(), 'bulk_load_text')
+    conn = FakeConnection()
+    n_rows = copy_rows(
+        conn, table,
+        [{'id': 1, 'title': 'a\tb'},
+         {'id': 2, 'notes': None}])
+    assert n_rows == 2
+    [(stmt, data)] = conn.cursor_.copies
+    assert stmt == 'COPY bulk_load_text (id, title, notes) FROM STDIN'
+    assert data == '1\ta\\tb\tn/a\n2\t\\N\t\\N\n'
+
+
+def test_copy_rows_no_rows():
+    table = make_table(sa.MetaData(), 'bulk_load_empty')
+    conn = FakeConnection()
+    assert copy_rows(conn, table, [], columns=['id']) == 0
+    assert conn.cursor_.copies == []
+
+
+@pytest.mark.skipif(
+    TEST_DATABASE_URI is None,
+    reason='set COLANDR_TEST_DATABASE_URI to a Postgres database to run')
+def test_copy_rows_round_trip():
+    metadata = sa.MetaData()
+    copied = make_table(metadata, 'bulk_load_copied')
+    inserted = make_table(metadata, 'bulk_load_inserted')
+    engine = sa.create_engine(TEST_DATABASE_URI)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            copied.create(conn)
+            inserted.create(conn)
+            assert copy_rows(conn, copied, ROWS) == len(ROWS)
+            # rows are inserted one at a time, so missing values get server defaults
+            for row in ROWS:
+                conn.execute(inserted.insert(), row)
+            copied_rows = conn.execute(
+                sa.select([copied]).order_by(copied.c.id)).fetchall()
+            inserted_rows = conn.execute(
+                sa.select([inserted]).order_by(inserted.c.id)).fetchall()
+            assert [tuple(row) for row in copied_rows] == [tuple(row) for row in inserted_rows]
+            assert copied_rows[0].title == ROWS[0]['title']
+            assert copied_rows[0].authors == ROWS[0]['authors']
+            assert copied_rows[1].authors == ROWS[1]['authors']
+            assert copied_rows[2].notes == 'n/a'
+            assert copied_rows[2].flag is False
+        finally:
+            trans.rollback()
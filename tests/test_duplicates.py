@@ -0,0 +1,125 @@
+import pytest
+
+from colandr.lib.duplicates import (can_dedupe_incrementally, can_reuse_dedupe_threshold,
+                                    get_canonical_citation_id,
+                                    get_existing_canonical_citation_id)
+from colandr.lib.utils import get_citation_fingerprint
+
+
+RECORD = {
+    'doi': '10.1111/cobi.12345',
+    'title': 'Effects of Marine Protected Areas on Coral Reef Fish Biomass',
+    'pub_year': 2014,
+    'authors': ['Smith, Jane', 'Doe, John'],
+    }
+
+
+@pytest.mark.parametrize('changes', [
+    {},
+    {'doi': 'https://doi.org/10.1111/COBI.12345'},
+    {'doi': 'http://dx.doi.org/10.1111/cobi.12345'},
+    {'doi': 'doi: 10.1111/cobi.12345 '},
+    {'title': 'effects of marine protected areas on coral reef fish biomass.'},
+    {'title': '  Effects of marine-protected areas on coral reef fish  biomass '},
+    {'authors': ['SMITH, J.', 'Someone, Else']},
+    {'abstract': 'Abstracts, keywords, and other fields are ignored.', 'keywords': ['mpa']},
+    ])
+def test_fingerprint_same(changes):
+    assert get_citation_fingerprint(dict(RECORD, **changes)) == get_citation_fingerprint(RECORD)
+
+
+@pytest.mark.parametrize('changes', [
+    {'doi': '10.1111/cobi.12346'},
+    {'doi': None},
+    {'title': 'Effects of marine protected areas on coral reef fish abundance'},
+    {'pub_year': 2015},
+    {'pub_year': None},
+    {'authors': ['Jones, Jane']},
+    {'authors': []},
+    ])
+def test_fingerprint_different(changes):
+    assert get_citation_fingerprint(dict(RECORD, **changes)) != get_citation_fingerprint(RECORD)
+
+
+def test_fingerprint_accents():
+    record = dict(RECORD, doi=None, title='Évaluation des aires marines protégées',
+                  authors=['Müller, Jürgen'])
+    unaccented = dict(record, title='Evaluation des aires marines protegees',
+                      authors=['Muller, Jurgen'])
+    assert get_citation_fingerprint(record) == get_citation_fingerprint(unaccented)
+
+
+def test_fingerprint_stable():
+    # fingerprints are stored in the db, so must not change across processes or releases
+    fingerprint = get_citation_fingerprint(RECORD)
+    assert isinstance(fingerprint, int)
+    assert -2 ** 63 <= fingerprint < 2 ** 63
+    assert fingerprint == get_citation_fingerprint(dict(RECORD))
+
+
+@pytest.mark.parametrize('record', [
+    {},
+    {'title': None, 'doi': None, 'pub_year': 2014, 'authors': ['Smith, Jane']},
+    {'title': 'Untitled', 'pub_year': 2014},
+    {'title': ' ?! ', 'doi': ''},
+    ])
+def test_fingerprint_none(record):
+    assert get_citation_fingerprint(record) is None
+
+
+@pytest.mark.parametrize('cids, incl_excl_cids, n_null_cols, expected', [
+    # included/excluded citations win, lowest id first, regardless of null columns
+    ([5, 3, 8], {8}, {3: 0, 5: 0}, 8),
+    ([5, 3, 8], {8, 5}, {3: 0}, 5),
+    # otherwise, fewest null columns win
+    ([5, 3, 8], set(), {3: 4, 5: 1, 8: 2}, 5),
+    ([5, 3, 8], {1, 2}, {3: 4, 5: 1, 8: 2}, 5),
+    # with the lowest id among ties, and missing counts taken as zero
+    ([5, 3, 8], set(), {3: 2, 5: 2, 8: 2}, 3),
+    ([5, 3, 8], set(), {3: 1}, 5),
+    ([5, 3, 8], set(), {}, 3),
+    ])
+def test_canonical_citation_id(cids, incl_excl_cids, n_null_cols, expected):
+    assert get_canonical_citation_id(cids, incl_excl_cids, n_null_cols) == expected
+
+
+@pytest.mark.parametrize('cids, existing_canonicals, expected', [
+    # all citations are new
+    ([11, 12], {}, None),
+    # a single existing citation is its own canonical, unless it's a duplicate
+    ([4, 11], {}, 4),
+    ([4, 11], {4: 2}, 2),
+    # the existing cluster with the most members wins
+    ([3, 4, 6, 11], {4: 6}, 6),
+    ([3, 4, 6, 11], {3: 1, 4: 6}, 6),
+    # with the lowest canonical id among ties
+    ([3, 6, 11], {}, 3),
+    ([3, 6, 11], {3: 7}, 6),
+    ])
+def test_existing_canonical_citation_id(cids, existing_canonicals, expected):
+    assert get_existing_canonical_citation_id(cids, 10, existing_canonicals) == expected
+
+
+@pytest.mark.parametrize('threshold, threshold_review_size, n_citations, expected', [
+    (0.5, 1000, 1000, True),
+    (0.5, 1000, 1250, True),
+    (0.5, 1000, 1251, False),
+    (0.5, 1000, 800, True),
+    (None, 1000, 1000, False),
+    (0.5, None, 1000, False),
+    (0.5, 0, 0, False),
+    (0.0, 1000, 1000, True),
+    ])
+def test_can_reuse_dedupe_threshold(threshold, threshold_review_size, n_citations, expected):
+    assert can_reuse_dedupe_threshold(
+        threshold, threshold_review_size, n_citations, 0.25) is expected
+
+
+@pytest.mark.parametrize('n_new, n_old, expected', [
+    (1, 1000, True),
+    (500, 1000, True),
+    (501, 1000, False),
+    (1, 0, False),
+    ])
+def test_can_dedupe_incrementally(n_new, n_old, expected):
+    assert can_dedupe_incrementally(n_new, n_old, 0.5) is expected
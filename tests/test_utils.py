@@ -0,0 +1,30 @@
+import multiprocessing
+
+import pytest
+
+from colandr.lib.utils import get_num_processes
+
+
+def _put_num_processes(queue, n_processes):
+    queue.put(get_num_processes(n_processes))
+
+
+def _get_num_processes_in_child(n_processes, daemon):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(
+        target=_put_num_processes, args=(queue, n_processes), daemon=daemon)
+    proc.start()
+    result = queue.get(timeout=10)
+    proc.join()
+    return result
+
+
+@pytest.mark.parametrize('n_processes', [1, 4])
+def test_get_num_processes_non_daemonic(n_processes):
+    assert get_num_processes(n_processes) == n_processes
+    assert _get_num_processes_in_child(n_processes, False) == n_processes
+
+
+@pytest.mark.parametrize('n_processes, expected', [(1, 1), (4, 1)])
+def test_get_num_processes_daemonic_fallback(n_processes, expected):
+    assert _get_num_processes_in_child(n_processes, True) == expected
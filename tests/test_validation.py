@@ -0,0 +1,141 @@
+import copy
+import io
+import os
+import random
+
+import pytest
+
+from colandr.api.schemas import CitationSchema
+from colandr.lib.imports import get_citations_file, iter_batches, iter_citation_records
+from colandr.lib.parsers import RisFile
+from colandr.lib.validation import CitationBatchValidator
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CORPORA = sorted(
+    os.path.join(DATA_DIR, fname) for fname in os.listdir(DATA_DIR)
+    if os.path.splitext(fname)[1] in ('.ris', '.bib'))
+
+BAD_VALUES = {
+    'review_id': [0, -1, None, 'abc', 2 ** 40],
+    'title': [None, 'x' * 500, 123, ('a', 'b')],
+    'pub_year': [None, 0, 'nineteen', 99999, 1999.5, True, '2001'],
+    'pub_month': [0, 13, 'jan', None],
+    'authors': ['Smith, J.', ['y' * 200], [None], None, ('a', 'b'), 5],
+    'keywords': [[], ['kw'] * 3, 'not a list', None],
+    'doi': ['10.' + 'z' * 200, None, 10],
+    'status': ['included', None],
+    'screenings': [[{'status': 'included'}]],
+    'id': [123],
+    'other_fields': [{'a': 1}],
+    'notes': [None, 1, ['a']],
+    }
+
+GOOD_RECORD = {
+    'review_id': 1,
+    'title': 'A perfectly fine title',
+    'authors': ('Doe, Jane', 'Smith, John'),
+    'pub_year': 2016,
+    }
+
+BAD_RIS_RECORD = """TY  - JOUR
+AU  - Nobody, Anne
+TI  - A record whose publication year is out of range
+PY  - 99999
+ER  -
+
+"""
+
+
+def iter_file_records(filepath, review_id=1):
+    citations_file = get_citations_file(filepath, filepath)
+    for record in citations_file.parse():
+        record['review_id'] = review_id
+        yield record
+
+
+def generate_bad_records(n, seed=42):
+    """Generate ``n`` synthetic records, each with a few badly-formed or edge-case values."""
+    rand = random.Random(seed)
+    keys = sorted(BAD_VALUES.keys())
+    for _ in range(n):
+        record = dict(GOOD_RECORD)
+        for key in rand.sample(keys, rand.randint(1, 3)):
+            record[key] = rand.choice(BAD_VALUES[key])
+        yield record
+
+
+def load_with_schema(records):
+    schema = CitationSchema()
+    results = []
+    for record in records:
+        try:
+            results.append(('ok', schema.load(copy.deepcopy(record)).data))
+        except Exception as e:
+            results.append(('error', str(e)))
+    return results
+
+
+def load_with_validator(records, batch_size=500):
+    validator = CitationBatchValidator()
+    results = []
+    for batch in iter_batches(copy.deepcopy(records), batch_size):
+        validated_records, errors = validator.validate(batch)
+        errors = dict(errors)
+        validated_records = iter(validated_records)
+        for idx in range(len(batch)):
+            if idx in errors:
+                results.append(('error', errors[idx]))
+            else:
+                results.append(('ok', next(validated_records)))
+    return results
+
+
+@pytest.mark.parametrize(
+    'filepath', CORPORA, ids=[os.path.basename(filepath) for filepath in CORPORA])
+def test_validator_matches_schema_on_corpus(filepath):
+    records = list(iter_file_records(filepath))
+    assert len(records) > 0
+    assert load_with_validator(records) == load_with_schema(records)
+
+
+@pytest.mark.parametrize(
+    'key, value',
+    [(key, value) for key, values in sorted(BAD_VALUES.items()) for value in values])
+def test_validator_matches_schema_on_bad_value(key, value):
+    record = dict(GOOD_RECORD)
+    record[key] = value
+    assert load_with_validator([record]) == load_with_schema([record])
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 500])
+def test_validator_matches_schema_on_synthetic_records(batch_size):
+    records = list(generate_bad_records(1000))
+    expected = load_with_schema(records)
+    assert any(status == 'error' for status, _ in expected)
+    assert load_with_validator(records, batch_size=batch_size) == expected
+
+
+def test_bad_record_errors_match_across_paths():
+    with io.open(os.path.join(DATA_DIR, 'citations.ris'), mode='rt') as f:
+        good_text = f.read()
+    text = good_text + BAD_RIS_RECORD + good_text
+    bad_lineno = good_text.count('\n') + 1
+    n_good_records = len(list(RisFile(io.StringIO(good_text)).parse()))
+
+    bad_records = [dict(record, review_id=1)
+                   for record in RisFile(io.StringIO(BAD_RIS_RECORD)).parse()]
+    [(status, msg)] = load_with_schema(bad_records)
+    assert status == 'error'
+
+    # the same bad record gives the same error, at the same line,
+    # whether records are loaded in this process or in a pool
+    results = []
+    for n_jobs in (1, 2):
+        errors = []
+        records = list(iter_citation_records(
+            RisFile(io.StringIO(text)), 1, errors=errors, n_jobs=n_jobs, shard_size=3))
+        assert errors == ['line {}: {}'.format(bad_lineno, msg)]
+        assert len(records) == 2 * n_good_records
+        results.append((records, errors))
+    assert results[0] == results[1]
@@ -0,0 +1,59 @@
+import io
+
+from defusedxml import DefusedXmlException
+import pytest
+
+from colandr.lib.parsers import PubMedXmlFile
+
+
+PUBMED_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2019//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_190101.dtd">
+<PubmedArticleSet>
+<PubmedArticle>
+  <MedlineCitation>
+    <PMID>12345</PMID>
+    <Article>
+      <ArticleTitle>Effects of marine protected areas on coral reef fish biomass</ArticleTitle>
+    </Article>
+  </MedlineCitation>
+</PubmedArticle>
+</PubmedArticleSet>
+"""
+
+ENTITIES_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE PubmedArticleSet [
+  <!ENTITY lol "lol">
+  <!ENTITY lol2 "&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;">
+  <!ENTITY lol3 "&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;">
+]>
+<PubmedArticleSet>
+<PubmedArticle>
+  <MedlineCitation>
+    <PMID>12345</PMID>
+    <Article>
+      <ArticleTitle>&lol3;</ArticleTitle>
+    </Article>
+  </MedlineCitation>
+</PubmedArticle>
+</PubmedArticleSet>
+"""
+
+
+def test_doctype_without_entities():
+    records = list(PubMedXmlFile(io.BytesIO(PUBMED_XML.encode('utf-8'))).parse())
+    assert len(records) == 1
+
+
+def test_entity_declarations_rejected():
+    with pytest.raises(DefusedXmlException):
+        list(PubMedXmlFile(io.BytesIO(ENTITIES_XML.encode('utf-8'))).parse())
+
+
+def test_entity_references_in_shards_rejected():
+    citations_file = PubMedXmlFile(io.BytesIO(ENTITIES_XML.encode('utf-8')))
+    errors = []
+    records = [record
+               for shard in citations_file.iter_shards(10)
+               for _, record in citations_file.parse_shard(*shard, errors=errors)]
+    assert records == []
+    assert len(errors) == 1